@@ -0,0 +1,243 @@
+"""Async serving mode for the read-heavy API endpoints.
+
+/api/search_trains, /api/pnr_status and /api/check_seats are served by an
+asyncio app (Quart). It waits on MySQL through an aiomysql pool instead of
+holding a worker thread for the whole request. Every other path, sessions
+and logins included, goes to the Flask app in main.py unchanged, in the
+same server:
+
+    hypercorn async_api:app --bind 0.0.0.0:5000 --workers 4
+
+Needs quart (which brings hypercorn) and aiomysql.
+
+The responses are built by the same main.py helpers as the Flask routes
+and go through the same response cache; only the waiting differs. C++
+engine calls run on a bounded thread pool (CORE_THREADS). ctypes releases
+the GIL for them, so they run alongside the event loop. Identical requests
+in flight at the same moment share one computation (SingleFlight).
+
+Each process imports main.py and is one more worker of it, so with several
+workers set CACHE_URL (and ROUTE_SNAPSHOT, to share one graph) as for
+gunicorn.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import aiomysql
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, g, jsonify, request
+from quart.json.provider import DefaultJSONProvider
+
+import main
+import metrics
+from cache import CACHE_URL
+from db import DB_CONFIG
+
+log = logging.getLogger(__name__)
+
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', '20'))
+CORE_THREADS = int(os.getenv('CORE_THREADS', str(os.cpu_count() or 4)))
+ASYNC_PATHS = {'/api/search_trains', '/api/pnr_status', '/api/check_seats'}
+
+SHARED_RESULTS = metrics.Counter("railway_single_flight_total",
+                                 "Async requests that ran their computation (leader) or joined one in flight (shared)",
+                                 ("route", "outcome"))
+
+api = Quart(__name__)
+core_executor = ThreadPoolExecutor(max_workers=CORE_THREADS, thread_name_prefix='core')
+db = {'pool': None}
+
+class EngineError(Exception):
+    """The C++ engine failed a query."""
+
+# --- 1. SINGLE-FLIGHT ---
+class SingleFlight:
+    """Concurrent calls with the same key share one run of the work.
+
+    The first caller starts it as a task; callers arriving before it ends
+    await that task instead of starting their own. A caller that goes away
+    (client disconnect) doesn't cancel it for the others. Results are
+    shared, so callers must not modify them.
+    """
+
+    def __init__(self):
+        self.calls = {} # key -> task
+
+    async def do(self, key, work):
+        """Result of `await work()`, or of the same call already in flight."""
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+            SHARED_RESULTS.inc(key[0], "leader")
+        else:
+            SHARED_RESULTS.inc(key[0], "shared")
+        return await asyncio.shield(task)
+
+flights = SingleFlight()
+
+# --- 2. I/O ---
+@api.before_serving
+async def open_pool():
+    db['pool'] = await aiomysql.create_pool(
+        host=DB_CONFIG['host'], user=DB_CONFIG['user'], password=DB_CONFIG['password'] or '',
+        db=DB_CONFIG['database'], maxsize=ASYNC_DB_POOL_SIZE,
+        autocommit=True, # Reads only: no snapshot kept between them
+        cursorclass=aiomysql.DictCursor
+    )
+
+@api.after_serving
+async def close_pool():
+    db['pool'].close()
+    await db['pool'].wait_closed()
+    core_executor.shutdown()
+
+# Phases are kept per request in g: requests interleave on the event loop
+# thread, so metrics.timed()'s per-thread totals would mix them. Queries
+# run side by side (asyncio.gather) each count in full, as in the sync app.
+def add_phase(phase, seconds):
+    phases = g.get('phases')
+    if phases is not None: phases[phase] += seconds
+
+async def fetch_all(query, params):
+    metrics.DB_QUERIES.inc()
+    started = time.perf_counter()
+    try:
+        async with db['pool'].acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(query, params)
+                return await cursor.fetchall()
+    finally:
+        add_phase('db', time.perf_counter() - started)
+
+async def cache_io(call, *args):
+    # The Redis backend is a blocking client; the local one is a dict lookup
+    if CACHE_URL: return await asyncio.to_thread(call, *args)
+    return call(*args)
+
+async def run_core(call, *args):
+    # The db.py and ffi_call timers inside the call add to its own totals
+    phases = defaultdict(float)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(core_executor, metrics.run_timed, phases, call, *args)
+    finally:
+        for phase, seconds in phases.items(): add_phase(phase, seconds)
+
+# --- 3. ENDPOINTS ---
+# Same arguments, responses and errors as the Flask routes in main.py, and
+# the same db / ffi / serialize / other split in the request metrics
+class TimedJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            add_phase('serialize', time.perf_counter() - started)
+
+api.json = TimedJSONProvider(api)
+
+@api.before_request
+async def start_timer():
+    g.started = time.perf_counter()
+    g.phases = defaultdict(float)
+
+@api.after_request
+async def record_request(response):
+    metrics.record_phases(request.endpoint, response.status_code, time.perf_counter() - g.started, g.phases)
+    return response
+
+async def load_pnr_details(pnr):
+    rows = await cache_io(main.response_cache.get, 'pnr', pnr)
+    if rows is None:
+        stamp = await cache_io(main.response_cache.stamp, 'pnr', main.pnr_tag(pnr))
+        rows = await fetch_all(main.PNR_DETAILS_QUERY, (pnr,))
+        await cache_io(main.response_cache.put, 'pnr', pnr, rows, stamp, main.PNR_CACHE_TTL)
+    return rows
+
+@api.route("/api/pnr_status")
+async def api_pnr_status():
+    pnr = request.args.get('pnr', '').strip()
+    if not pnr:
+        return jsonify({"success": False, "message": "PNR number is required."}), 400
+    try:
+        rows = await flights.do(('pnr_status', pnr), lambda: load_pnr_details(pnr))
+    except Exception as e:
+        log.error("PNR Status Error: %s", e)
+        return jsonify({"success": False, "message": "Database error."}), 500
+    results = main.pnr_status_rows([dict(row) for row in rows])
+    if not results:
+        return jsonify({"success": False, "message": "PNR not found."}), 404
+    return jsonify({"success": True, "details": results})
+
+@api.route("/api/check_seats")
+async def api_check_seats():
+    stretch, seat_class, error = main.parse_check_seats_args(request.args)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+    try:
+        rows = await flights.do(('check_seats', *stretch),
+                                lambda: fetch_all(main.availability_query(1), main.availability_params([stretch])))
+    except Exception as e:
+        log.error("Check Seats Error: %s", e)
+        return jsonify({"success": False, "message": "Database error."}), 500
+    by_class = main.availability_from_rows(rows).get(stretch, {})
+    return jsonify({"success": True, "available_seats": by_class.get(seat_class, {}).get("available", 0)})
+
+async def run_search(search, engine, cache_key):
+    cached = await cache_io(main.response_cache.get, 'search', cache_key)
+    if cached is not None: return cached
+    stamp = await cache_io(main.response_cache.stamp, 'search', main.ROUTES_TAG)
+    try:
+        itineraries = await run_core(main.search_itineraries, engine, search)
+    except Exception as e:
+        raise EngineError(e) from e
+
+    train_numbers, stretches = main.search_lookups(itineraries, search['journey_dates'])
+    await cache_io(stamp.add, *sorted({main.availability_tag(t, d) for t, d, _, _ in stretches}))
+    trains, availability = {}, {}
+    if train_numbers:
+        train_rows, availability_rows = await asyncio.gather(
+            fetch_all(main.trains_query(len(train_numbers)), train_numbers),
+            fetch_all(main.availability_query(len(stretches)), main.availability_params(stretches))
+        )
+        trains = {t['train_number']: t for t in train_rows}
+        availability = main.availability_from_rows(availability_rows)
+    results = main.search_results(itineraries, trains, availability, search['journey_dates'])
+    await cache_io(main.response_cache.put, 'search', cache_key, results, stamp, main.SEARCH_CACHE_TTL)
+    return results
+
+@api.route("/api/search_trains")
+async def api_search_trains():
+    search, error = main.parse_search_args(request.args)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+    if not main.core_lib:
+        return jsonify({"success": False, "message": "C++ Module is OFFLINE"}), 500
+    try:
+        # Runs in the executor: the periodic version check (or a rebuild) waits on MySQL
+        engine = await run_core(main.get_route_engine)
+        cache_key = main.search_cache_key(search, engine.version)
+        results = await flights.do(('search_trains', cache_key), lambda: run_search(search, engine, cache_key))
+    except EngineError as e:
+        log.error("C++ Graph Error: %s", e)
+        return jsonify({"success": False, "message": f"C++ Error: {e}"}), 500
+    except Exception as e:
+        log.error("Search Error: %s", e)
+        return jsonify({"success": False, "message": "Database error."}), 500
+    return jsonify(results)
+
+# --- 4. ASGI ENTRY POINT ---
+# Flask views run on the event loop's default thread pool
+flask_app = AsyncioWSGIMiddleware(main.app)
+
+async def app(scope, receive, send):
+    """The async endpoints above; every other request goes to Flask."""
+    if scope['type'] == 'lifespan' or scope.get('path') in ASYNC_PATHS:
+        await api(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
@@ -0,0 +1,172 @@
+"""Micro-benchmarks of the C++ core through its ctypes interface.
+
+Times the calls the app makes, across coach and graph sizes:
+  find_best_seat        one call per seat request, coach sizes x occupancy
+  build_graph_with_time building a whole graph edge by edge (per build)
+  find_fastest_path     queries against that global graph
+  engine_create_bulk    building the RouteEngine the app keeps resident
+  engine_open_snapshot  opening the same graph from a published snapshot
+  engine.fastest_path   queries against the RouteEngine
+  find_itineraries      K alternative itineraries over train runs, per K
+
+Latencies include the ctypes call overhead (about a microsecond), which is
+what the app pays too; bench_pathfinding.cpp measures the C++ alone.
+
+From the repo root, after build.sh:
+    python benchmarks/bench_core.py --save-baseline /tmp/core.json
+    ... change something, rebuild ...
+    python benchmarks/bench_core.py --baseline /tmp/core.json
+"""
+import argparse
+import ctypes
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from core_bridge import core_lib, RouteEngine
+from bench_stats import summarize, add_baseline_args, finish
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def bench_find_best_seat(results, rng, coach_sizes, occupancies, calls):
+    for seats in coach_sizes:
+        for occupancy in occupancies:
+            taken = rng.sample(range(1, seats + 1), int(seats * occupancy))
+            occupied = (ctypes.c_int * max(len(taken), 1))(*taken)
+            latencies = []
+            started = time.perf_counter()
+            for i in range(calls):
+                t0 = time.perf_counter()
+                core_lib.find_best_seat(occupied, len(taken), seats, 1, b"LOWER" if i % 2 else b"ANY")
+                latencies.append(time.perf_counter() - t0)
+            results[f"find_best_seat[seats={seats},taken={occupancy:.0%}]"] = summarize(latencies, time.perf_counter() - started)
+
+def synthetic_network(rng, stations, edges_per_station):
+    """Same shape as bench_pathfinding.cpp: mostly-nearby links, one ring edge
+    per station so every query has an answer."""
+    codes = [f"S{i}" for i in range(stations)]
+    from_ids, to_ids, dep, arr = [], [], [], []
+    for u in range(stations):
+        for k in range(edges_per_station):
+            v = (u + 1) % stations if k == 0 else (u + 1 + rng.randrange(20)) % stations
+            d = rng.randrange(1440)
+            from_ids.append(u); to_ids.append(v)
+            dep.append(d); arr.append((d + 30 + rng.randrange(300)) % 1440)
+    return codes, from_ids, to_ids, dep, arr
+
+def synthetic_trains(rng, stations, trains, stops):
+    """Train runs of `stops` stops wandering between nearby stations, one
+    departure a day each; legs in the layout RouteEngine takes."""
+    legs = ([], [], [], [], [])
+    for t in range(trains):
+        station = rng.randrange(stations)
+        clock = rng.randrange(1440)
+        for _ in range(stops - 1):
+            nxt = (station + 1 + rng.randrange(10)) % stations
+            arrival = clock + 20 + rng.randrange(120)
+            for column, value in zip(legs, (t, station, nxt, clock, arrival)):
+                column.append(value)
+            station, clock = nxt, arrival + 5
+    return [f"T{t}" for t in range(trains)], legs
+
+def bench_itineraries(results, rng, graph_sizes, stops, queries, alternatives):
+    for stations in graph_sizes:
+        trains, legs = synthetic_trains(rng, stations, stations // 2, stops)
+        codes = [f"S{i}" for i in range(stations)]
+        engine = RouteEngine(codes, [], [], [], [], 0, trains, legs)
+        pairs = [(rng.randrange(stations), rng.randrange(stations), rng.randrange(1440)) for _ in range(queries)]
+        for k in alternatives:
+            latencies = []
+            started = time.perf_counter()
+            for a, b, depart in pairs:
+                t0 = time.perf_counter()
+                engine.find_itineraries(codes[a], codes[b], depart, k)
+                latencies.append(time.perf_counter() - t0)
+            results[f"find_itineraries[stations={stations},legs={len(legs[0])},k={k}]"] = summarize(latencies, time.perf_counter() - started)
+
+def bench_graphs(results, rng, graph_sizes, edges_per_station, builds, queries):
+    for stations in graph_sizes:
+        codes, from_ids, to_ids, dep, arr = synthetic_network(rng, stations, edges_per_station)
+        encoded = [c.encode() for c in codes]
+        pairs = [(rng.randrange(stations), rng.randrange(stations)) for _ in range(queries)]
+        label = f"stations={stations},edges={len(from_ids)}"
+
+        # Global graph, edge by edge (the original interface)
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(builds):
+            t0 = time.perf_counter()
+            core_lib.clear_graph()
+            for a, b, d, r in zip(from_ids, to_ids, dep, arr):
+                core_lib.build_graph_with_time(encoded[a], encoded[b], d, r)
+            core_lib.find_fastest_path(encoded[0], encoded[1]) # The CSR is built lazily by the first query
+            latencies.append(time.perf_counter() - t0)
+        results[f"build_graph_with_time[{label}]"] = summarize(latencies, time.perf_counter() - started)
+
+        latencies = []
+        started = time.perf_counter()
+        for a, b in pairs:
+            t0 = time.perf_counter()
+            core_lib.find_fastest_path(encoded[a], encoded[b])
+            latencies.append(time.perf_counter() - t0)
+        results[f"find_fastest_path[{label}]"] = summarize(latencies, time.perf_counter() - started)
+
+        # RouteEngine, as main.py uses it
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(builds):
+            t0 = time.perf_counter()
+            engine = RouteEngine(codes, from_ids, to_ids, dep, arr)
+            latencies.append(time.perf_counter() - t0)
+        results[f"engine_create_bulk[{label}]"] = summarize(latencies, time.perf_counter() - started)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = os.path.join(tmp, "routes.snap")
+            engine.publish_snapshot(snapshot)
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(builds):
+                t0 = time.perf_counter()
+                RouteEngine.open_snapshot(snapshot)
+                latencies.append(time.perf_counter() - t0)
+            results[f"engine_open_snapshot[{label}]"] = summarize(latencies, time.perf_counter() - started)
+
+        latencies = []
+        started = time.perf_counter()
+        for a, b in pairs:
+            t0 = time.perf_counter()
+            engine.fastest_path(codes[a], codes[b])
+            latencies.append(time.perf_counter() - t0)
+        results[f"engine.fastest_path[{label}]"] = summarize(latencies, time.perf_counter() - started)
+    core_lib.clear_graph()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--coach-sizes", type=int_list, default=[24, 72, 512])
+    parser.add_argument("--occupancy", type=lambda v: [float(x) for x in v.split(",")], default=[0.0, 0.5, 0.95])
+    parser.add_argument("--seat-calls", type=int, default=20000)
+    parser.add_argument("--graph-sizes", type=int_list, default=[1000, 5000, 20000])
+    parser.add_argument("--edges-per-station", type=int, default=4)
+    parser.add_argument("--builds", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--train-stops", type=int, default=12)
+    parser.add_argument("--alternatives", type=int_list, default=[1, 3, 10])
+    parser.add_argument("--seed", type=int, default=42)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+    if not core_lib:
+        raise SystemExit("core_logic library not loaded; run build.sh first")
+
+    rng = random.Random(args.seed)
+    results = {}
+    bench_find_best_seat(results, rng, args.coach_sizes, args.occupancy, args.seat_calls)
+    bench_graphs(results, rng, args.graph_sizes, args.edges_per_station, args.builds, args.queries)
+    bench_itineraries(results, rng, args.graph_sizes, args.train_stops, args.queries, args.alternatives)
+    finish(args, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+// Pathfinding benchmark: interned IDs + CSR (core_logic.cpp) vs. the old
+// std::map<std::string, ...> Dijkstra, on a synthetic timetable.
+//
+// Build & run from the repo root:
+//   g++ -O2 -std=c++17 -o benchmarks/bench_pathfinding benchmarks/bench_pathfinding.cpp core_logic/core_logic.cpp
+//   ./benchmarks/bench_pathfinding [stations] [edges_per_station] [queries]
+//
+// Both engines are fed the same edges and asked the same queries; the
+// total times they report must agree, otherwise the run fails.
+
+#include "../core_logic/core_logic.h"
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <limits>
+#include <map>
+#include <queue>
+#include <random>
+#include <sstream>
+#include <string>
+#include <unordered_set>
+#include <vector>
+
+// --- LEGACY ENGINE (the string-keyed implementation this replaced) ---
+namespace legacy {
+
+struct Edge {
+    std::string to_station;
+    int departure_time;
+    int arrival_time;
+    int travel_time;
+};
+
+static std::map<std::string, std::vector<Edge>> adj;
+static std::string path_result_str;
+
+using PII = std::pair<int, std::string>;
+struct CompareDist {
+    bool operator()(const PII& a, const PII& b) {
+        return a.first > b.first;
+    }
+};
+
+void build_graph_with_time(const char* station_a, const char* station_b, int departure_minutes, int arrival_minutes) {
+    int duration = arrival_minutes - departure_minutes;
+    if (duration < 0) duration += 1440;
+    adj[station_a].push_back({station_b, departure_minutes, arrival_minutes, duration});
+}
+
+const char* find_fastest_path(const char* from_station, const char* to_station) {
+    std::string start(from_station);
+    std::string end(to_station);
+    std::priority_queue<PII, std::vector<PII>, CompareDist> pq;
+    std::map<std::string, int> dist;
+    std::map<std::string, std::string> prev;
+    std::map<std::string, int> arrival_at_node;
+
+    std::unordered_set<std::string> stations;
+    for (auto const& [station, edges] : adj) {
+        stations.insert(station);
+        for (auto const& edge : edges) stations.insert(edge.to_station);
+    }
+    for (const auto& station : stations) dist[station] = std::numeric_limits<int>::max();
+
+    if (dist.find(start) == dist.end()) {
+        path_result_str = "Error: Starting station '" + start + "' not found in routes.";
+        return path_result_str.c_str();
+    }
+    dist[start] = 0;
+    arrival_at_node[start] = 0;
+    pq.push({0, start});
+
+    while (!pq.empty()) {
+        int d = pq.top().first;
+        std::string u = pq.top().second;
+        pq.pop();
+        if (d > dist[u]) continue;
+        if (u == end) break;
+        int u_arrival_time = arrival_at_node[u];
+        if (adj.find(u) != adj.end()) {
+            for (auto const& edge : adj[u]) {
+                std::string v = edge.to_station;
+                int wait_time = 0;
+                if (u != start) {
+                    wait_time = edge.departure_time - u_arrival_time;
+                    if (wait_time < 0) wait_time += 1440;
+                }
+                int total_time = dist[u] + edge.travel_time + wait_time;
+                if (total_time < dist[v]) {
+                    dist[v] = total_time;
+                    prev[v] = u;
+                    arrival_at_node[v] = edge.arrival_time;
+                    pq.push({total_time, v});
+                }
+            }
+        }
+    }
+
+    if (dist.find(end) == dist.end() || dist[end] == std::numeric_limits<int>::max()) {
+        path_result_str = "No path found from " + start + " to " + end + ".";
+    } else {
+        std::string path = "";
+        std::string curr = end;
+        while (curr != start) {
+            path = " -> " + curr + path;
+            curr = prev[curr];
+        }
+        path = start + path;
+        std::stringstream ss;
+        int total_mins = dist[end];
+        ss << "Fastest Path: " << path << " (Total time: " << total_mins / 60 << "h " << total_mins % 60 << "m)";
+        path_result_str = ss.str();
+    }
+    return path_result_str.c_str();
+}
+
+} // namespace legacy
+
+// --- HELPERS ---
+
+// "... (Total time: 12h 5m)" -> "12h 5m"; paths may differ on ties, times may not
+static std::string total_time_of(const std::string& result) {
+    size_t at = result.find("(Total time: ");
+    return at == std::string::npos ? result : result.substr(at);
+}
+
+template <typename F>
+static double time_queries(F query, const std::vector<std::pair<std::string, std::string>>& queries, std::vector<std::string>& out) {
+    auto t0 = std::chrono::steady_clock::now();
+    for (const auto& q : queries) {
+        out.push_back(query(q.first.c_str(), q.second.c_str()));
+    }
+    auto t1 = std::chrono::steady_clock::now();
+    return std::chrono::duration<double, std::milli>(t1 - t0).count();
+}
+
+int main(int argc, char** argv) {
+    int station_count = argc > 1 ? atoi(argv[1]) : 5000;
+    int edges_per_station = argc > 2 ? atoi(argv[2]) : 4;
+    int query_count = argc > 3 ? atoi(argv[3]) : 200;
+
+    // 1. Deterministic synthetic network
+    std::mt19937 rng(42);
+    std::vector<std::string> codes;
+    for (int i = 0; i < station_count; ++i) {
+        codes.push_back("S" + std::to_string(i));
+    }
+    std::vector<int> from_ids, to_ids, dep, arr;
+    for (int u = 0; u < station_count; ++u) {
+        for (int k = 0; k < edges_per_station; ++k) {
+            // Mostly "nearby" stations, so paths are long like a real network
+            int v = (u + 1 + (int)(rng() % 20)) % station_count;
+            if (k == 0) v = (u + 1) % station_count; // keeps it strongly connected
+            int d = (int)(rng() % 1440);
+            from_ids.push_back(u);
+            to_ids.push_back(v);
+            dep.push_back(d);
+            arr.push_back((d + 30 + (int)(rng() % 300)) % 1440);
+        }
+    }
+    std::vector<std::pair<std::string, std::string>> queries;
+    for (int i = 0; i < query_count; ++i) {
+        queries.push_back({codes[rng() % station_count], codes[rng() % station_count]});
+    }
+
+    // 2. Load both engines
+    std::string joined;
+    for (int i = 0; i < station_count; ++i) {
+        if (i) joined += '\n';
+        joined += codes[i];
+    }
+    auto t0 = std::chrono::steady_clock::now();
+    load_graph_bulk(joined.c_str(), station_count, from_ids.data(), to_ids.data(), dep.data(), arr.data(), (int)from_ids.size());
+    auto t1 = std::chrono::steady_clock::now();
+    for (size_t i = 0; i < from_ids.size(); ++i) {
+        legacy::build_graph_with_time(codes[from_ids[i]].c_str(), codes[to_ids[i]].c_str(), dep[i], arr[i]);
+    }
+    auto t2 = std::chrono::steady_clock::now();
+
+    // 3. Query both
+    std::vector<std::string> new_results, old_results;
+    find_fastest_path(queries[0].first.c_str(), queries[0].second.c_str()); // warm-up (CSR already built)
+    double new_ms = time_queries(find_fastest_path, queries, new_results);
+    double old_ms = time_queries(legacy::find_fastest_path, queries, old_results);
+
+    int mismatches = 0;
+    for (size_t i = 0; i < queries.size(); ++i) {
+        if (total_time_of(new_results[i]) != total_time_of(old_results[i])) {
+            if (++mismatches <= 5) {
+                printf("MISMATCH %s -> %s\n  new: %s\n  old: %s\n", queries[i].first.c_str(), queries[i].second.c_str(),
+                       new_results[i].c_str(), old_results[i].c_str());
+            }
+        }
+    }
+
+    printf("stations=%d edges=%zu queries=%d\n", station_count, from_ids.size(), query_count);
+    printf("load:  bulk/CSR %8.2f ms   legacy %8.2f ms\n",
+           std::chrono::duration<double, std::milli>(t1 - t0).count(),
+           std::chrono::duration<double, std::milli>(t2 - t1).count());
+    printf("query: CSR %8.3f ms/q   legacy %8.3f ms/q   speedup %.1fx\n",
+           new_ms / query_count, old_ms / query_count, old_ms / new_ms);
+    printf("results: %d mismatches\n", mismatches);
+    return mismatches == 0 ? 0 : 1;
+}
@@ -0,0 +1,76 @@
+"""Latency summaries and baseline comparison shared by the benchmark scripts.
+
+Every benchmark produces {name: summary} where a summary holds the sample
+count, p50/p95/p99/mean latency in milliseconds and throughput in ops/s.
+--save-baseline writes that to a JSON file; --baseline compares a run with
+one and exits 1 if any benchmark got slower than --tolerance allows.
+Baselines are machine-specific: save and compare them on the same box.
+"""
+import json
+
+DEFAULT_TOLERANCE = 0.15
+
+def percentile(sorted_values, q):
+    # Nearest rank; q in [0, 100]
+    if not sorted_values: return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+def summarize(latencies, elapsed, errors=0):
+    """latencies and elapsed in seconds; throughput counts successful ops only."""
+    ordered = sorted(latencies)
+    ms = lambda s: round(s * 1000, 4)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "ops_per_s": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+def print_report(results):
+    width = max([len(name) for name in results] + [9])
+    print(f"{'benchmark':<{width}}  {'count':>8}  {'p50 ms':>10}  {'p95 ms':>10}  {'p99 ms':>10}  {'ops/s':>10}  errors")
+    for name, r in results.items():
+        print(f"{name:<{width}}  {r['count']:>8}  {r['p50_ms']:>10.4f}  {r['p95_ms']:>10.4f}  {r['p99_ms']:>10.4f}  {r['ops_per_s']:>10.1f}  {r['errors']}")
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions against a baseline: p50/p95 latency up, or throughput
+    down, by more than `tolerance` (a fraction). New benchmarks are skipped."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base: continue
+        for key in ("p50_ms", "p95_ms"):
+            if base[key] > 0 and r[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {base[key]} -> {r[key]} (+{(r[key] / base[key] - 1) * 100:.0f}%)")
+        if base["ops_per_s"] > 0 and r["ops_per_s"] < base["ops_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: ops/s {base['ops_per_s']} -> {r['ops_per_s']} "
+                               f"({(r['ops_per_s'] / base['ops_per_s'] - 1) * 100:.0f}%)")
+        if r["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {r['errors']}")
+    return regressions
+
+def add_baseline_args(parser):
+    parser.add_argument("--save-baseline", metavar="FILE", help="write this run's results to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with a saved run; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"allowed slowdown as a fraction (default {DEFAULT_TOLERANCE})")
+
+def finish(args, results):
+    """Prints the report, saves / compares as asked and exits non-zero on regression."""
+    print_report(results)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"REGRESSION against {args.baseline}:")
+            for line in regressions: print(f"  {line}")
+            raise SystemExit(1)
+        print(f"OK: no regression against {args.baseline} (tolerance {args.tolerance:.0%})")
@@ -0,0 +1,152 @@
+"""End-to-end load scenarios against the Flask API.
+
+Each scenario runs for --duration seconds with --clients concurrent clients
+and reports p50/p95/p99 latency and throughput:
+  search       GET  /api/search_trains between random stations
+  pnr_status   GET  /api/pnr_status for random existing PNRs
+  check_seats  GET  /api/check_seats for random trains and dates
+  book_cancel  POST /api/book_ticket then /api/cancel_ticket, logged in
+               (reported as book_cancel.book and book_cancel.cancel)
+
+Needs the app and a MySQL server it can reach; the script reads stations,
+trains and PNRs to sample from through the same pool (db.py). For a
+repeatable dataset seed a throwaway database first, e.g.
+    python seed_database.py --generate --trains 200 --bookings 50000
+    flask --app main rebuild-availability
+    gunicorn -w 4 -b 127.0.0.1:5000 main:app
+then, from the repo root:
+    python benchmarks/load_test_api.py --date 2027-01-08 --save-baseline /tmp/api.json
+    python benchmarks/load_test_api.py --date 2027-01-08 --baseline /tmp/api.json
+
+book_cancel writes real bookings (and cancels them again) on --date.
+
+Sync vs async serving: the read scenarios are bounded by how many requests
+a server keeps waiting on MySQL at once. Run them with many clients against
+each mode, same worker count, and compare:
+    gunicorn -w 4 --threads 8 -b 127.0.0.1:5000 main:app
+    python benchmarks/load_test_api.py --clients 256 --scenarios search,pnr_status,check_seats \
+        --save-baseline /tmp/sync.json
+    hypercorn -w 4 -b 127.0.0.1:5000 async_api:app
+    python benchmarks/load_test_api.py --clients 256 --scenarios search,pnr_status,check_seats \
+        --baseline /tmp/sync.json
+--hot-pairs N draws searches from N station pairs only, so identical
+searches overlap; railway_single_flight_total on /metrics counts how many
+shared a result.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db import db_pool
+from bench_stats import summarize, add_baseline_args, finish
+from load_test_booking import Client
+
+SCENARIOS = ("search", "pnr_status", "check_seats", "book_cancel")
+SAMPLE_LIMIT = 5000
+
+def load_samples(journey_date):
+    conn = db_pool.connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT station_code FROM Stations LIMIT %s", (SAMPLE_LIMIT,))
+        stations = [row['station_code'] for row in cursor.fetchall()]
+        cursor.execute("SELECT train_number FROM Trains LIMIT %s", (SAMPLE_LIMIT,))
+        trains = [row['train_number'] for row in cursor.fetchall()]
+        cursor.execute("SELECT pnr_number FROM Bookings WHERE journey_date >= %s LIMIT %s", (journey_date, SAMPLE_LIMIT))
+        pnrs = [row['pnr_number'] for row in cursor.fetchall()]
+        return stations, trains, pnrs
+    finally:
+        conn.close()
+
+def run_scenario(clients, duration, operation):
+    """Runs operation(client, rng) -> {step: (seconds, ok)} on every client
+    until the time is up. Returns {step: summary}."""
+    samples = {} # step -> ([latency], errors)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index, client):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            for step, (elapsed, ok) in operation(client, rng).items():
+                with lock:
+                    latencies, errors = samples.setdefault(step, ([], [0]))
+                    if ok: latencies.append(elapsed)
+                    else: errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i, c)) for i, c in enumerate(clients)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - started
+    return {step: summarize(latencies, elapsed, errors[0]) for step, (latencies, errors) in samples.items()}
+
+def timed(call):
+    t0 = time.perf_counter()
+    status, body = call()
+    return time.perf_counter() - t0, status < 500 and body is not None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--date", default=(date.today() + timedelta(days=7)).isoformat(),
+                        help="journey date for seat checks and bookings")
+    parser.add_argument("--seat-class", default="Sleeper")
+    parser.add_argument("--hot-pairs", type=int, default=0, help="search only this many station pairs (0: any)")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown: parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    stations, trains, pnrs = load_samples(args.date)
+    if len(stations) < 2 or not trains:
+        raise SystemExit("Need at least two stations and one train; seed the database first")
+    print(f"Logging in {args.clients} clients...")
+    run_id = int(time.time())
+    clients = [Client(args.url, f"bench{run_id}_{i}@example.com", "bench-password") for i in range(args.clients)]
+
+    pair_rng = random.Random(args.hot_pairs)
+    hot_pairs = [tuple(pair_rng.sample(stations, 2)) for _ in range(args.hot_pairs)]
+
+    def search(client, rng):
+        a, b = rng.choice(hot_pairs) if hot_pairs else rng.sample(stations, 2)
+        return {"search": timed(lambda: client.get_json("/api/search_trains", {"from": a, "to": b, "date": args.date}))}
+
+    def pnr_status(client, rng):
+        return {"pnr_status": timed(lambda: client.get_json("/api/pnr_status", {"pnr": rng.choice(pnrs)}))}
+
+    def check_seats(client, rng):
+        params = {"train": rng.choice(trains), "date": args.date, "class": args.seat_class}
+        return {"check_seats": timed(lambda: client.get_json("/api/check_seats", params))}
+
+    def book_cancel(client, rng):
+        payload = {"train_number": rng.choice(trains), "journey_date": args.date, "seat_class": args.seat_class,
+                   "total_fare": 100.0, "passengers": [{"name": "Bench", "age": 30, "gender": "Other", "preference": "ANY"}]}
+        t0 = time.perf_counter()
+        status, body = client.post_json("/api/book_ticket", payload)
+        steps = {"book_cancel.book": (time.perf_counter() - t0, status < 500 and bool(body.get('success')))}
+        if body.get('pnr'):
+            steps["book_cancel.cancel"] = timed(lambda: client.post_json("/api/cancel_ticket", {"pnr_number": body['pnr']}))
+        return steps
+
+    operations = {"search": search, "pnr_status": pnr_status, "check_seats": check_seats, "book_cancel": book_cancel}
+    results = {}
+    for name in scenarios:
+        if name == "pnr_status" and not pnrs:
+            print("Skipping pnr_status: no bookings to look up")
+            continue
+        print(f"Running {name} for {args.duration:.0f}s...")
+        results.update(run_scenario(clients, args.duration, operations[name]))
+    finish(args, results)
+
+if __name__ == "__main__":
+    main()
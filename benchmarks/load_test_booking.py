@@ -0,0 +1,128 @@
+"""Booking load test: many concurrent clients, then a double-allocation check.
+
+Registers --clients users, logs each one in, and has them all book the same
+train/date/class at once until it is full. Afterwards the database is
+checked for any seat sold twice for the date.
+
+Run the app with several worker processes to exercise the cross-process
+path (each worker has its own seat bitmap cache), e.g.
+    gunicorn -w 4 -b 127.0.0.1:5000 main:app
+then, from the repo root:
+    python benchmarks/load_test_booking.py --train 12951 --date 2026-12-01 --clients 64
+
+Exits non-zero if any seat was double-booked.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db import db_pool
+
+class Client:
+    """One logged-in user with its own session cookie."""
+
+    def __init__(self, base_url, email, password):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.post_json("/api/register", {"username": email, "email": email, "password": password})
+        form = urllib.parse.urlencode({"email": email, "password": password}).encode()
+        self.opener.open(base_url + "/login", form).read()
+
+    def post_json(self, path, payload):
+        req = urllib.request.Request(self.base_url + path, json.dumps(payload).encode(),
+                                     {"Content-Type": "application/json"})
+        return self.send(req)
+
+    def get_json(self, path, params):
+        return self.send(urllib.request.Request(self.base_url + path + "?" + urllib.parse.urlencode(params)))
+
+    def send(self, req):
+        try:
+            with self.opener.open(req) as resp:
+                return resp.status, json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            try: return e.code, json.loads(body or b"{}")
+            except ValueError: return e.code, {} # An HTML error page
+
+def book_until_full(client, args, stats, lock):
+    payload = {"train_number": args.train, "journey_date": args.date, "seat_class": args.seat_class,
+               "total_fare": 100.0, "passengers": [
+                   {"name": "Load Test", "age": 30, "gender": "Other", "preference": "ANY"}
+               ] * args.party_size}
+    while True:
+        started = time.perf_counter()
+        status, body = client.post_json("/api/book_ticket", payload)
+        elapsed = time.perf_counter() - started
+        with lock:
+            stats['latencies'].append(elapsed)
+            if body.get('success'):
+                stats['booked'] += args.party_size
+            elif status == 409:
+                stats['retries_exhausted'] += 1
+                continue
+            else:
+                if status >= 500: stats['errors'] += 1
+                return
+
+def find_double_bookings(train, journey_date):
+    conn = db_pool.connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT ti.seat_id, COUNT(*) AS sold FROM Tickets ti
+        JOIN Passengers p ON ti.passenger_id = p.passenger_id JOIN Bookings b ON p.pnr_number = b.pnr_number
+        WHERE b.train_number = %s AND b.journey_date = %s AND ti.status = 'CNF'
+        GROUP BY ti.seat_id HAVING COUNT(*) > 1
+        """, (train, journey_date))
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--train", required=True)
+    parser.add_argument("--date", required=True, help="journey date, YYYY-MM-DD (use a date with no bookings)")
+    parser.add_argument("--seat-class", default="Sleeper")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--party-size", type=int, default=1)
+    args = parser.parse_args()
+
+    run_id = int(time.time())
+    print(f"Logging in {args.clients} clients...")
+    with ThreadPoolExecutor(args.clients) as pool:
+        clients = list(pool.map(lambda i: Client(args.url, f"load{run_id}_{i}@example.com", "load-test"), range(args.clients)))
+
+    stats = {'booked': 0, 'errors': 0, 'retries_exhausted': 0, 'latencies': []}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        for client in clients:
+            pool.submit(book_until_full, client, args, stats, lock)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats['latencies'])
+    print(f"Seats booked: {stats['booked']} in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} requests/s)")
+    if latencies:
+        print(f"Latency p50: {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"p99: {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.1f} ms")
+    print(f"Server errors: {stats['errors']}, gave up after retries: {stats['retries_exhausted']}")
+
+    doubles = find_double_bookings(args.train, args.date)
+    if doubles:
+        print(f"FAIL: {len(doubles)} seat(s) sold more than once: {doubles[:10]}")
+        raise SystemExit(1)
+    print("OK: no seat was sold twice.")
+
+if __name__ == "__main__":
+    main()
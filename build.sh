@@ -7,6 +7,8 @@ mkdir -p core_logic
 # -fPIC: Position Independent Code (Required for shared libs)
 # -shared: Create the library instead of an executable
 # -o: The output path
-g++ -fPIC -shared -o core_logic/core_logic.so route_brain.cpp booking_brain.cpp
+# (On Windows/MSYS2 build the .dll instead:
+#   g++ -O2 -std=c++17 -shared -o core_logic/core_logic.dll core_logic/core_logic.cpp)
+g++ -O2 -std=c++17 -fPIC -shared -o core_logic/core_logic.so core_logic/core_logic.cpp
 
-echo "Compilation Complete. Library saved to core_logic/core_logic.so"
\ No newline at end of file
+echo "Compilation Complete. Library saved to core_logic/core_logic.so"
@@ -0,0 +1,178 @@
+"""Response cache for read-heavy endpoints (PNR status, train search).
+
+Entries live in a backend: by default an in-process LRU with per-entry TTL
+(LocalBackend); set CACHE_URL=redis://... to share one cache between worker
+processes (RedisBackend, needs the `redis` package). Both have the same
+get_many/set interface, so the local one stands in wherever Redis isn't
+running.
+
+Invalidation is by tag. Every entry is stored with the versions its tags
+had *before* the data was read (a Stamp); invalidate(tag) gives the tag a
+new version, so every entry stamped with an older one becomes a miss on
+its next lookup. A write that commits while a read is in flight therefore
+can't leave the read's stale result behind. Tag versions are kept for
+MAX_TTL and never evicted early, so a forgotten version can only cause a
+miss, never a stale hit.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+CACHE_URL = os.getenv('CACHE_URL')
+MAX_CACHED_RESPONSES = 10000
+# Longest TTL any entry may have; tag versions are kept this long
+MAX_TTL = 600
+
+class LocalBackend:
+    """Thread-safe in-process store; LRU beyond `max_entries`, if given."""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # key -> (expires_at, value)
+        self.lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        values = []
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None or entry[0] <= now:
+                    values.append(None)
+                    continue
+                self.entries.move_to_end(key)
+                values.append(entry[1])
+        return values
+
+    def set(self, key, value, ttl):
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = (now + ttl, value)
+            self.entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            elif len(self.entries) % 1024 == 0:
+                # Unbounded store: drop whatever has expired now and then
+                for k in [k for k, (expires_at, _) in self.entries.items() if expires_at <= now]:
+                    del self.entries[k]
+
+class RedisBackend:
+    """Shared store in Redis; values are pickled."""
+
+    def __init__(self, url, prefix='railway:'):
+        import redis # Optional dependency, only needed with CACHE_URL
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        if not keys: return []
+        raw = self.client.mget([self.prefix + key for key in keys])
+        return [pickle.loads(value) if value is not None else None for value in raw]
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(int(ttl), 1))
+
+class Stamp:
+    """Versions of an entry's tags, read before the data it caches."""
+
+    def __init__(self, cache, tags):
+        self.cache = cache
+        self.versions = {}
+        self.add(*tags)
+
+    def add(self, *tags):
+        # Tags only known part-way through a read (e.g. which trains matched)
+        # must be added before the data they cover is read
+        if self.versions is None: return
+        new = [tag for tag in dict.fromkeys(tags) if tag not in self.versions]
+        try:
+            self.versions.update(zip(new, self.cache.versions(new)))
+        except Exception as e:
+            log.warning("Cache Error: %s", e)
+            self.versions = None # Can't vouch for this read; it won't be cached
+
+class ResponseCache:
+    """Namespaced, tag-invalidated cache with hit/miss counters.
+
+    Every entry is also tagged with its namespace, so invalidate('search')
+    drops the whole namespace.
+    """
+
+    def __init__(self, entries, tags):
+        self.entries = entries
+        self.tags = tags
+        self.lock = threading.Lock()
+        self.counters = {} # namespace -> {'hits', 'misses'}
+        self.invalidations = 0
+
+    @staticmethod
+    def entry_key(namespace, key):
+        return f"{namespace}:{key}"
+
+    @staticmethod
+    def tag_key(tag):
+        return f"tag:{tag}"
+
+    def versions(self, tags):
+        return self.tags.get_many([self.tag_key(tag) for tag in tags])
+
+    def stamp(self, namespace, *tags):
+        return Stamp(self, (namespace,) + tags)
+
+    def get(self, namespace, key):
+        """The cached value, or None on a miss (absent, expired or invalidated)."""
+        value, hit = None, False
+        try:
+            entry = self.entries.get_many([self.entry_key(namespace, key)])[0]
+            if entry is not None:
+                versions, value = entry
+                hit = self.versions(list(versions)) == list(versions.values())
+        except Exception as e:
+            # A cache that's down is a cache that misses
+            log.warning("Cache Error: %s", e)
+        with self.lock:
+            counts = self.counters.setdefault(namespace, {'hits': 0, 'misses': 0})
+            counts['hits' if hit else 'misses'] += 1
+        return value if hit else None
+
+    def put(self, namespace, key, value, stamp, ttl):
+        if stamp.versions is None: return
+        try:
+            self.entries.set(self.entry_key(namespace, key), (dict(stamp.versions), value), min(ttl, MAX_TTL))
+        except Exception as e:
+            log.warning("Cache Error: %s", e)
+
+    def invalidate(self, *tags):
+        # Called after the write commits; never fails the request that made it
+        for tag in dict.fromkeys(tags):
+            try:
+                self.tags.set(self.tag_key(tag), os.urandom(8).hex(), MAX_TTL)
+            except Exception as e:
+                log.warning("Cache Error: could not invalidate %s: %s", tag, e)
+        with self.lock:
+            self.invalidations += len(tags)
+
+    def stats(self):
+        with self.lock:
+            stats = {'invalidations': self.invalidations}
+            for namespace, counts in self.counters.items():
+                lookups = counts['hits'] + counts['misses']
+                stats[namespace] = dict(counts, hit_rate=round(counts['hits'] / lookups, 3) if lookups else None)
+            return stats
+
+def make_response_cache(url=CACHE_URL):
+    if url:
+        try:
+            backend = RedisBackend(url)
+            return ResponseCache(backend, backend)
+        except Exception as e:
+            log.warning("Cache Error: %s; using the in-process cache", e)
+    return ResponseCache(LocalBackend(MAX_CACHED_RESPONSES), LocalBackend())
+
+response_cache = make_response_cache()
@@ -0,0 +1,430 @@
+"""ctypes bridge to the C++ core (core_logic.dll / core_logic.so).
+
+Loads the library, declares every exported function's signature and wraps
+the thread-safe route engine in a small Python class. Kept separate from
+main.py so tools (benchmarks, snapshot builders) can use the core without
+importing Flask.
+"""
+import ctypes
+import logging
+import os
+from array import array
+
+from metrics import ffi_call
+
+log = logging.getLogger(__name__)
+
+# --- 1. LOAD C++ BRAIN (DIAGNOSTIC BLOCK) ---
+base_dir = os.path.abspath(os.path.dirname(__file__))
+
+# .dll on Windows, .so on Linux/Mac (build.sh)
+lib_path_win = os.path.join(base_dir, "core_logic", "core_logic.dll")
+lib_path_nix = os.path.join(base_dir, "core_logic", "core_logic.so")
+
+core_lib = None
+try:
+    log.debug("Attempting to load C++ module from: %s or %s", lib_path_win, lib_path_nix)
+    
+    # A .dll is only ever built on Windows (build.sh), so only try it there
+    on_windows = os.name == 'nt'
+    if on_windows and os.path.exists(lib_path_win):
+        core_lib = ctypes.CDLL(lib_path_win)
+        log.info("C++ Logic Loaded from %s", lib_path_win)
+        
+    elif os.path.exists(lib_path_nix):
+        core_lib = ctypes.CDLL(lib_path_nix)
+        log.info("C++ Logic Loaded from %s", lib_path_nix)
+        
+    else:
+        log.critical("C++ module not found: neither core_logic.dll nor core_logic.so is in the core_logic folder. Build it with build.sh.")
+        
+except OSError as e:
+    # Almost always a 32-bit vs. 64-bit mismatch between Python and G++
+    log.critical("C++ module was found but could not be loaded: %s", e)
+
+except Exception as e:
+    log.critical("C++ module failed to load: %s", e)
+
+# --- 2. DEFINE C++ INTERFACE ---
+class BookingResult(ctypes.Structure):
+    _fields_ = [("seat_id", ctypes.c_int),
+                ("status", ctypes.c_char * 5),
+                ("seat_number", ctypes.c_char * 10),
+                ("berth_type", ctypes.c_char * 15)]
+
+def declare_core_interface(lib):
+    # --- Seat Allocation Logic ---
+    lib.find_best_seat.argtypes = [
+        ctypes.POINTER(ctypes.c_int), 
+        ctypes.c_int, 
+        ctypes.c_int, 
+        ctypes.c_int,
+        ctypes.c_char_p 
+    ]
+    lib.find_best_seat.restype = BookingResult
+
+    # --- Seat Bitmaps (one bit per seat, set = taken) ---
+    lib.allocate_seat_bitmap.restype = BookingResult
+    lib.allocate_seat_bitmap.argtypes = [
+        ctypes.POINTER(ctypes.c_uint64), # occupied_words
+        ctypes.c_int,                    # total_seats
+        ctypes.c_int,                    # seat_id_start
+        ctypes.c_char_p                  # preference
+    ]
+    lib.release_seat_bitmap.restype = None
+    lib.release_seat_bitmap.argtypes = [ctypes.POINTER(ctypes.c_uint64), ctypes.c_int, ctypes.c_int]
+    lib.count_free_seats.restype = ctypes.c_int
+    lib.count_free_seats.argtypes = [ctypes.POINTER(ctypes.c_uint64), ctypes.c_int]
+
+    # --- Segment Occupancy (one uint64 mask over the train's stops per seat) ---
+    seat_masks = ctypes.POINTER(ctypes.c_uint64)
+    coach_args = [
+        ctypes.POINTER(seat_masks),    # coach_seat_masks (one array per coach)
+        ctypes.POINTER(ctypes.c_int),  # total_seats
+        ctypes.POINTER(ctypes.c_int),  # seat_id_starts
+        ctypes.c_int,                  # coach_count
+        ctypes.c_int                   # segment_count
+    ]
+    result_args = [
+        ctypes.c_char_p,                # preferences ('\n'-separated, one per passenger)
+        ctypes.c_int,                   # passenger_count
+        ctypes.POINTER(BookingResult),  # out_results
+        ctypes.POINTER(ctypes.c_int)    # out_coach_index
+    ]
+    lib.allocate_group.restype = ctypes.c_int
+    lib.allocate_group.argtypes = coach_args + [ctypes.c_int, ctypes.c_int] + result_args # from_stop, to_stop
+    lib.allocate_in_order.restype = ctypes.c_int
+    lib.allocate_in_order.argtypes = coach_args + [ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)] + result_args # from_stops, to_stops
+    lib.release_seat_segments.restype = None
+    lib.release_seat_segments.argtypes = [seat_masks, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+    lib.count_free_seats_segments.restype = ctypes.c_int
+    lib.count_free_seats_segments.argtypes = [seat_masks, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+    
+    # --- Pathfinding Logic (NEW SIGNATURES) ---
+    lib.clear_graph.restype = None
+    lib.clear_graph.argtypes = []
+
+    lib.build_graph_with_time.restype = None
+    lib.build_graph_with_time.argtypes = [
+        ctypes.c_char_p, # station_a
+        ctypes.c_char_p, # station_b
+        ctypes.c_int,    # departure_minutes
+        ctypes.c_int     # arrival_minutes
+    ]
+    
+    lib.load_graph_bulk.restype = ctypes.c_int
+    lib.load_graph_bulk.argtypes = [
+        ctypes.c_char_p,               # station_codes ('\n'-separated)
+        ctypes.c_int,                  # station_count
+        ctypes.POINTER(ctypes.c_int),  # from_ids
+        ctypes.POINTER(ctypes.c_int),  # to_ids
+        ctypes.POINTER(ctypes.c_int),  # departure_minutes
+        ctypes.POINTER(ctypes.c_int),  # arrival_minutes
+        ctypes.c_int                   # edge_count
+    ]
+
+    lib.set_graph_version.restype = None
+    lib.set_graph_version.argtypes = [ctypes.c_int]
+    lib.get_graph_version.restype = ctypes.c_int
+    lib.get_graph_version.argtypes = []
+
+    lib.find_fastest_path.restype = ctypes.c_char_p
+    lib.find_fastest_path.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+
+    # --- Batched Queries (one search, many destinations) ---
+    batch_args = [
+        ctypes.POINTER(ctypes.c_int),  # out_duration
+        ctypes.POINTER(ctypes.c_int),  # out_arrival
+        ctypes.POINTER(ctypes.c_int),  # out_path_start
+        ctypes.POINTER(ctypes.c_int),  # out_path_length
+        ctypes.POINTER(ctypes.c_int),  # out_path
+        ctypes.c_int                   # path_capacity
+    ]
+    lib.find_paths_batch.restype = ctypes.c_int
+    lib.find_paths_batch.argtypes = [ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int), ctypes.c_int] + batch_args
+    lib.find_paths_from.restype = ctypes.c_int
+    lib.find_paths_from.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.c_int] + batch_args
+
+    lib.get_station_id.restype = ctypes.c_int
+    lib.get_station_id.argtypes = [ctypes.c_char_p]
+
+    # --- Timetable Routing (Connection Scan) ---
+    lib.find_earliest_arrival.restype = ctypes.c_char_p
+    lib.find_earliest_arrival.argtypes = [
+        ctypes.c_char_p, # from_station
+        ctypes.c_char_p, # to_station
+        ctypes.c_int,    # depart_after (minutes since midnight)
+        ctypes.c_int     # max_transfers
+    ]
+
+    # --- Engine API (thread-safe, caller-owned result buffers) ---
+    lib.engine_create_bulk.restype = ctypes.c_void_p
+    lib.engine_create_bulk.argtypes = lib.load_graph_bulk.argtypes
+    lib.engine_create_timetable.restype = ctypes.c_void_p
+    lib.engine_create_timetable.argtypes = lib.load_graph_bulk.argtypes + [
+        ctypes.c_char_p,               # train_numbers ('\n'-separated)
+        ctypes.c_int,                  # train_count
+        ctypes.POINTER(ctypes.c_int),  # leg_trains
+        ctypes.POINTER(ctypes.c_int),  # leg_from
+        ctypes.POINTER(ctypes.c_int),  # leg_to
+        ctypes.POINTER(ctypes.c_int),  # leg_departure
+        ctypes.POINTER(ctypes.c_int),  # leg_arrival
+        ctypes.c_int                   # leg_count
+    ]
+    lib.engine_destroy.restype = None
+    lib.engine_destroy.argtypes = [ctypes.c_void_p]
+
+    lib.engine_get_station_id.restype = ctypes.c_int
+    lib.engine_get_station_id.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+
+    lib.engine_find_fastest_path.restype = ctypes.c_int
+    lib.engine_find_fastest_path.argtypes = [
+        ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p,
+        ctypes.c_char_p, ctypes.c_int # out, out_size
+    ]
+    lib.engine_find_paths_batch.restype = ctypes.c_int
+    lib.engine_find_paths_batch.argtypes = [ctypes.c_void_p] + lib.find_paths_batch.argtypes
+    lib.engine_find_itineraries.restype = ctypes.c_int
+    lib.engine_find_itineraries.argtypes = [
+        ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p,
+        ctypes.c_int, ctypes.c_int,   # depart_after, max_transfers
+        ctypes.c_int,                 # max_results
+        ctypes.POINTER(ctypes.c_int), # out_itineraries (4 per itinerary)
+        ctypes.POINTER(ctypes.c_int), # out_legs (6 per leg)
+        ctypes.c_int,                 # leg_capacity
+        ctypes.POINTER(ctypes.c_int)  # out_leg_count
+    ]
+    lib.engine_find_earliest_journey.restype = ctypes.c_int
+    lib.engine_find_earliest_journey.argtypes = [
+        ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p,
+        ctypes.c_int, ctypes.c_int,   # depart_after, max_transfers
+        ctypes.POINTER(ctypes.c_int), # out_itinerary (4 ints)
+        ctypes.POINTER(ctypes.c_int), # out_legs (6 per leg)
+        ctypes.c_int,                 # leg_capacity
+        ctypes.POINTER(ctypes.c_int)  # out_leg_count
+    ]
+    lib.engine_station_codes.restype = ctypes.c_int
+    lib.engine_station_codes.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+    lib.engine_train_numbers.restype = ctypes.c_int
+    lib.engine_train_numbers.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+    lib.engine_edge_count.restype = ctypes.c_int
+    lib.engine_edge_count.argtypes = [ctypes.c_void_p]
+
+    # --- Timetable Snapshots (engine <-> mmap-able file) ---
+    lib.engine_write_snapshot.restype = ctypes.c_int
+    lib.engine_write_snapshot.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int64]
+    lib.engine_open_snapshot.restype = ctypes.c_void_p
+    lib.engine_open_snapshot.argtypes = [ctypes.c_char_p]
+    lib.engine_data_version.restype = ctypes.c_int64
+    lib.engine_data_version.argtypes = [ctypes.c_void_p]
+
+if core_lib:
+    try:
+        declare_core_interface(core_lib)
+    except AttributeError as e:
+        # The library loaded, but it was built from an older core_logic.cpp
+        log.critical("C++ module out of date (%s). Rebuild it with build.sh (or the g++ line inside it for the .dll).", e)
+        core_lib = None
+
+
+# --- 3. HELPERS ---
+RESULT_BUFFER_SIZE = 1024
+
+def int_buffer(values):
+    """Packs ints into a contiguous C int array (no per-item Python loop)."""
+    buf = array('i', values)
+    if not buf: return (ctypes.c_int * 0)()
+    return (ctypes.c_int * len(buf)).from_buffer(buf)
+
+def call_with_buffer(fn, *args):
+    """Calls an engine_* string query, growing the result buffer if it was too small."""
+    size = RESULT_BUFFER_SIZE
+    while True:
+        out = ctypes.create_string_buffer(size)
+        with ffi_call(fn.__name__): needed = fn(*args, out, size)
+        if needed < size: return out.value.decode('utf-8')
+        size = needed + 1
+
+def snapshot_stamp(path):
+    """Identifies the file currently at `path` (a publish replaces the inode), or None."""
+    try: st = os.stat(path)
+    except OSError: return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+# --- 4. ROUTE ENGINE ---
+class RouteEngine:
+    """One immutable C++ route graph.
+
+    Safe to query from many threads at once: the C++ side keeps its scratch
+    space per thread and writes results into buffers we own, and ctypes
+    drops the GIL for the call. To change the timetable, build a new
+    RouteEngine and swap the reference; the C++ graph is freed once the
+    last request holding the old one is done with it.
+    """
+
+    def __init__(self, codes, from_ids, to_ids, dep_minutes, arr_minutes, version=0, trains=(), legs=None):
+        """legs, for itinerary queries: (train IDs, from IDs, to IDs,
+        departure minutes, arrival minutes), one entry per hop of a train's
+        run; a train's ID is its position in `trains`."""
+        leg_trains, leg_from, leg_to, leg_dep, leg_arr = legs or ((), (), (), (), ())
+        with ffi_call('engine_create_timetable'):
+            self.handle = core_lib.engine_create_timetable(
+                "\n".join(codes).encode('utf-8'), len(codes),
+                int_buffer(from_ids), int_buffer(to_ids),
+                int_buffer(dep_minutes), int_buffer(arr_minutes),
+                len(from_ids),
+                "\n".join(trains).encode('utf-8'), len(trains),
+                int_buffer(leg_trains), int_buffer(leg_from), int_buffer(leg_to),
+                int_buffer(leg_dep), int_buffer(leg_arr), len(leg_trains)
+            )
+        if not self.handle:
+            raise RuntimeError("engine_create_timetable rejected the route data (bad station or train ID)")
+        self.setup(codes, trains, len(from_ids), version)
+
+    def setup(self, codes, trains, edge_count, version):
+        self.version = version
+        self.edge_count = edge_count
+        self.codes = list(codes)
+        self.trains = list(trains)
+        self.station_ids = {code: i for i, code in enumerate(self.codes)}
+        self.source = None # snapshot_stamp() of the file this engine was opened from or published to
+
+    @classmethod
+    def open_snapshot(cls, path):
+        """Opens a snapshot written by publish_snapshot(). The graph stays in
+        the (shared, read-only) mapped file instead of being rebuilt; its
+        version is the one it was published with."""
+        engine = cls.__new__(cls)
+        with ffi_call('engine_open_snapshot'):
+            engine.handle = core_lib.engine_open_snapshot(path.encode('utf-8'))
+        if not engine.handle:
+            raise RuntimeError(f"{path} is not a usable route snapshot (missing, corrupt or another format version)")
+        codes = call_with_buffer(core_lib.engine_station_codes, engine.handle)
+        trains = call_with_buffer(core_lib.engine_train_numbers, engine.handle)
+        engine.setup(codes.split("\n") if codes else [], trains.split("\n") if trains else [],
+                     core_lib.engine_edge_count(engine.handle), core_lib.engine_data_version(engine.handle))
+        engine.source = snapshot_stamp(path)
+        return engine
+
+    def publish_snapshot(self, path):
+        """Writes the graph to `path` for other processes to open. The file is
+        written under a temporary name and renamed over the old one, so a
+        reader sees either the old snapshot or the new one, never a partial
+        file; processes that have the old one open keep using it. The file
+        records self.version."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with ffi_call('engine_write_snapshot'):
+                failed = core_lib.engine_write_snapshot(self.handle, tmp.encode('utf-8'), self.version)
+            if failed: raise OSError(f"could not write route snapshot {tmp}")
+            with open(tmp, 'rb') as f: os.fsync(f.fileno())
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+        self.source = snapshot_stamp(path)
+
+    def __del__(self):
+        if getattr(self, 'handle', None) and core_lib:
+            core_lib.engine_destroy(self.handle)
+            self.handle = None
+
+    def fastest_path(self, from_code, to_code):
+        return call_with_buffer(core_lib.engine_find_fastest_path, self.handle,
+                                from_code.encode('utf-8'), to_code.encode('utf-8'))
+
+    def find_itineraries(self, from_code, to_code, depart_after, max_results, max_transfers=3):
+        """Alternative journeys leaving after depart_after (minutes since
+        midnight) with at most max_transfers changes, soonest first; see
+        engine_find_itineraries.
+
+        Returns one dict per itinerary: departure/arrival minutes from
+        midnight of the search day, transfers and its legs (train number,
+        run_day = days after the search day the train's run started, from,
+        to, departure and arrival minutes).
+        """
+        itineraries = (ctypes.c_int * (4 * max(max_results, 1)))()
+        leg_count = ctypes.c_int()
+        capacity = max_results * 4
+        while True:
+            legs = (ctypes.c_int * (6 * max(capacity, 1)))()
+            with ffi_call('engine_find_itineraries'):
+                found = core_lib.engine_find_itineraries(self.handle, from_code.encode('utf-8'), to_code.encode('utf-8'),
+                                                         depart_after, max_transfers, max_results,
+                                                         itineraries, legs, capacity,
+                                                         ctypes.byref(leg_count))
+            if leg_count.value <= capacity: break
+            capacity = leg_count.value # Legs were truncated; one retry with the exact size
+        return self.itinerary_dicts(found, itineraries, legs)
+
+    def earliest_journey(self, from_code, to_code, depart_after, max_transfers=3):
+        """The earliest arrival over the Routes connections, as a list of
+        at most one itinerary shaped like find_itineraries'. For timetables
+        without train runs: every leg is one Routes row, its train_number
+        None, and each leg after the first counts as a change."""
+        itinerary = (ctypes.c_int * 4)()
+        leg_count = ctypes.c_int()
+        capacity = 16
+        while True:
+            legs = (ctypes.c_int * (6 * capacity))()
+            with ffi_call('engine_find_earliest_journey'):
+                found = core_lib.engine_find_earliest_journey(self.handle, from_code.encode('utf-8'), to_code.encode('utf-8'),
+                                                              depart_after, max_transfers, itinerary, legs, capacity,
+                                                              ctypes.byref(leg_count))
+            if leg_count.value <= capacity: break
+            capacity = leg_count.value
+        return self.itinerary_dicts(found, itinerary, legs)
+
+    def itinerary_dicts(self, found, itineraries, legs):
+        results = []
+        for i in range(found):
+            departure, arrival, first, count = itineraries[4 * i:4 * i + 4]
+            results.append({
+                "departure_minutes": departure,
+                "arrival_minutes": arrival,
+                "duration_minutes": arrival - departure,
+                "transfers": count - 1,
+                "legs": [{
+                    "train_number": self.trains[legs[6 * j]] if legs[6 * j] >= 0 else None,
+                    "run_day": legs[6 * j + 1],
+                    "from": self.codes[legs[6 * j + 2]],
+                    "to": self.codes[legs[6 * j + 3]],
+                    "departure_minutes": legs[6 * j + 4],
+                    "arrival_minutes": legs[6 * j + 5],
+                } for j in range(first, first + count)]
+            })
+        return results
+
+    def find_paths(self, pairs):
+        """Answers many (from, to) station pairs with one C++ search per distinct origin.
+
+        Returns one dict per pair: arrival time, duration and the path as a
+        list of station codes (empty if unreachable).
+        """
+        count = len(pairs)
+        origins = int_buffer(self.station_ids.get(a, -1) for a, _ in pairs)
+        targets = int_buffer(self.station_ids.get(b, -1) for _, b in pairs)
+        duration, arrival = (ctypes.c_int * count)(), (ctypes.c_int * count)()
+        path_start, path_length = (ctypes.c_int * count)(), (ctypes.c_int * count)()
+
+        capacity = count * 16
+        while True:
+            path = (ctypes.c_int * capacity)()
+            with ffi_call('engine_find_paths_batch'):
+                needed = core_lib.engine_find_paths_batch(self.handle, origins, targets, count, duration, arrival,
+                                                          path_start, path_length, path, capacity)
+            if needed <= capacity: break
+            capacity = needed # Paths were truncated; one retry with the exact size
+
+        results = []
+        for i, (from_code, to_code) in enumerate(pairs):
+            reachable = duration[i] >= 0
+            start = path_start[i]
+            results.append({
+                "from": from_code,
+                "to": to_code,
+                "reachable": reachable,
+                "duration_minutes": duration[i] if reachable else None,
+                "arrival_time": f"{arrival[i] // 60:02d}:{arrival[i] % 60:02d}" if reachable else None,
+                "path": [self.codes[sid] for sid in path[start:start + path_length[i]]]
+            })
+        return results
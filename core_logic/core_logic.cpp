@@ -4,231 +4,1859 @@
 #include <string>
 #include <cstring>
 #include <unordered_map>
-#include <unordered_set>
-#include <map> // Using std::map for Dijkstra's
-#include <queue> // Using priority_queue for Dijkstra's
+#include <algorithm> // push_heap / pop_heap for Dijkstra's
+#include <functional> // std::greater
 #include <limits> // Using std::numeric_limits
 #include <sstream> // To build the result string
-
-// --- Static variables to hold C++ state ---
-static BookingResult last_result;
-static std::string path_result_str;
+#include <cstdint> // uint64_t seat bitmaps
+#include <memory> // std::unique_ptr for the legacy engine
+#include <mutex> // Guards the legacy (global) graph API
+#include <cstdio> // Snapshot files
+#ifndef _WIN32
+#include <fcntl.h> // open / mmap for snapshots
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
 
 // --- Helper for Seat Logic ---
 // (This is a standard Indian Railways 72-seat layout)
-std::string get_berth_type(int seat_num) {
-    int mod = seat_num % 8;
-    if (mod == 1 || mod == 4) return "LOWER";
-    if (mod == 2 || mod == 5) return "MIDDLE";
-    if (mod == 3 || mod == 6) return "UPPER";
-    if (mod == 7) return "SIDE_LOWER";
-    if (mod == 0) return "SIDE_UPPER"; // Seat 8, 16, etc.
-    return "UNKNOWN";
+// The berth type repeats every 8 seats, so a lookup on seat % 8 replaces
+// building a std::string per seat.
+static const char* const BERTH_BY_MOD8[8] = {
+    "SIDE_UPPER", // Seat 8, 16, etc.
+    "LOWER", "MIDDLE", "UPPER",
+    "LOWER", "MIDDLE", "UPPER",
+    "SIDE_LOWER"
+};
+
+const char* get_berth_type(int seat_num) {
+    return BERTH_BY_MOD8[seat_num % 8];
+}
+
+// --- Seat bitmaps ---
+// A coach is a bitmap, one bit per seat: bit i is seat i + 1, set = taken.
+// 64 is a multiple of 8, so bit b of *every* word is seat type (b + 1) % 8,
+// and one 64-bit mask per preference covers the whole coach.
+static uint64_t berth_mask(int mod8_a, int mod8_b, int mod8_c = -1) {
+    uint64_t mask = 0;
+    for (int b = 0; b < 64; ++b) {
+        int mod = (b + 1) % 8;
+        if (mod == mod8_a || mod == mod8_b || mod == mod8_c) mask |= (uint64_t)1 << b;
+    }
+    return mask;
+}
+static const uint64_t MASK_ANY = ~(uint64_t)0;
+static const uint64_t MASK_LOWER = berth_mask(1, 4, 7);  // LOWER + SIDE_LOWER
+static const uint64_t MASK_MIDDLE = berth_mask(2, 5);
+static const uint64_t MASK_UPPER = berth_mask(3, 6, 0);  // UPPER + SIDE_UPPER
+static const uint64_t MASK_SIDE = berth_mask(7, 0);      // SIDE_LOWER + SIDE_UPPER
+
+// Unknown preferences match nothing, which falls through to "any seat"
+static uint64_t preference_mask(const char* preference) {
+    if (strcmp(preference, "ANY") == 0) return MASK_ANY;
+    if (strcmp(preference, "LOWER") == 0) return MASK_LOWER;
+    if (strcmp(preference, "MIDDLE") == 0) return MASK_MIDDLE;
+    if (strcmp(preference, "UPPER") == 0) return MASK_UPPER;
+    if (strcmp(preference, "SIDE") == 0) return MASK_SIDE;
+    return 0;
+}
+
+static inline int lowest_set_bit(uint64_t word) {
+#ifdef _MSC_VER
+    unsigned long index;
+    _BitScanForward64(&index, word);
+    return (int)index;
+#else
+    return __builtin_ctzll(word);
+#endif
+}
+
+static inline int count_bits(uint64_t word) {
+#ifdef _MSC_VER
+    return (int)__popcnt64(word);
+#else
+    return __builtin_popcountll(word);
+#endif
+}
+
+static inline int seat_word_count(int total_seats) {
+    return (total_seats + 63) / 64;
+}
+
+// Bits past total_seats in the last word are never free
+static inline uint64_t valid_seats_in_word(int w, int total_seats) {
+    int remaining = total_seats - w * 64;
+    return remaining >= 64 ? MASK_ANY : (((uint64_t)1 << remaining) - 1);
+}
+
+// Lowest free seat matching 'mask' (word-wise find-first-set), or -1
+static int first_free_seat(const uint64_t* occupied_words, int total_seats, uint64_t mask) {
+    int words = seat_word_count(total_seats);
+    for (int w = 0; w < words; ++w) {
+        uint64_t candidates = ~occupied_words[w] & mask & valid_seats_in_word(w, total_seats);
+        if (candidates) {
+            return w * 64 + lowest_set_bit(candidates) + 1;
+        }
+    }
+    return -1;
+}
+
+// Preferred berth first, then any free seat (same order as always)
+static int pick_seat(const uint64_t* occupied_words, int total_seats, const char* preference) {
+    int found = -1;
+    uint64_t mask = preference_mask(preference);
+    if (mask != MASK_ANY && mask != 0) {
+        found = first_free_seat(occupied_words, total_seats, mask);
+    }
+    if (found == -1) {
+        found = first_free_seat(occupied_words, total_seats, MASK_ANY);
+    }
+    return found;
+}
+
+static BookingResult make_result(int found_seat_num, int seat_id_start) {
+    BookingResult result = {}; // Per call: safe to run from many threads
+    if (found_seat_num != -1) {
+        result.seat_id = seat_id_start + (found_seat_num - 1);
+        strncpy(result.status, "CNF", sizeof(result.status) - 1);
+        snprintf(result.seat_number, sizeof(result.seat_number), "%d", found_seat_num);
+        strncpy(result.berth_type, get_berth_type(found_seat_num), sizeof(result.berth_type) - 1);
+    } else {
+        result.seat_id = -1;
+        strncpy(result.status, "WL", sizeof(result.status) - 1);
+        strncpy(result.seat_number, "WL", sizeof(result.seat_number) - 1);
+        strncpy(result.berth_type, "WL", sizeof(result.berth_type) - 1);
+    }
+    return result;
 }
 
 // --- 1. SEAT LOGIC IMPLEMENTATION (SMART VERSION) ---
-// (This function is unchanged from our last step)
-extern "C" __declspec(dllexport) BookingResult find_best_seat(
+// Kept for callers that pass a list of occupied seat numbers: it is turned
+// into a bitmap once and then searched word by word.
+extern "C" CORE_API BookingResult find_best_seat(
     int* occupied_seats, 
     int occupied_count, 
     int total_seats, 
     int seat_id_start,
     const char* preference
 ) {
-    std::unordered_set<int> booked_set;
-    for(int i = 0; i < occupied_count; ++i) {
-        booked_set.insert(occupied_seats[i]);
-    }
-    std::string pref(preference);
-    int found_seat_num = -1;
-    if (pref != "ANY") {
-        for (int i = 1; i <= total_seats; ++i) {
-            if (booked_set.find(i) == booked_set.end()) {
-                std::string berth_type = get_berth_type(i);
-                bool match = false;
-                if (pref == "LOWER" && (berth_type == "LOWER" || berth_type == "SIDE_LOWER")) match = true;
-                else if (pref == "MIDDLE" && berth_type == "MIDDLE") match = true;
-                else if (pref == "UPPER" && (berth_type == "UPPER" || berth_type == "SIDE_UPPER")) match = true;
-                else if (pref == "SIDE" && (berth_type == "SIDE_LOWER" || berth_type == "SIDE_UPPER")) match = true;
-                if (match) {
-                    found_seat_num = i;
-                    break;
-                }
+    if (total_seats <= 0) return make_result(-1, seat_id_start);
+    std::vector<uint64_t> occupied(seat_word_count(total_seats), 0);
+    for (int i = 0; i < occupied_count; ++i) {
+        int seat = occupied_seats[i];
+        if (seat >= 1 && seat <= total_seats) {
+            occupied[(seat - 1) / 64] |= (uint64_t)1 << ((seat - 1) % 64);
+        }
+    }
+    return make_result(pick_seat(occupied.data(), total_seats, preference), seat_id_start);
+}
+
+// Bitmap version: picks the best free seat and marks it taken in place
+extern "C" CORE_API BookingResult allocate_seat_bitmap(
+    uint64_t* occupied_words,
+    int total_seats,
+    int seat_id_start,
+    const char* preference
+) {
+    int found = total_seats > 0 ? pick_seat(occupied_words, total_seats, preference) : -1;
+    if (found != -1) {
+        occupied_words[(found - 1) / 64] |= (uint64_t)1 << ((found - 1) % 64);
+    }
+    return make_result(found, seat_id_start);
+}
+
+// Frees a seat (cancellation, or a booking that failed to commit)
+extern "C" CORE_API void release_seat_bitmap(uint64_t* occupied_words, int total_seats, int seat_number) {
+    if (seat_number >= 1 && seat_number <= total_seats) {
+        occupied_words[(seat_number - 1) / 64] &= ~((uint64_t)1 << ((seat_number - 1) % 64));
+    }
+}
+
+extern "C" CORE_API int count_free_seats(const uint64_t* occupied_words, int total_seats) {
+    int free_seats = 0;
+    for (int w = 0; w < seat_word_count(total_seats); ++w) {
+        free_seats += count_bits(~occupied_words[w] & valid_seats_in_word(w, total_seats));
+    }
+    return free_seats;
+}
+
+// --- SEGMENT OCCUPANCY ---
+// A train's run is split into segments, stop s -> stop s + 1. Each seat has
+// one 64-bit mask over them (bit s set = segment s sold), so a journey from
+// stop a to stop b needs bits [a, b) clear: one AND per seat, whatever the
+// number of stops. A train without intermediate stops has one segment.
+
+static inline int highest_set_bit(uint64_t word) {
+#ifdef _MSC_VER
+    unsigned long index;
+    _BitScanReverse64(&index, word);
+    return (int)index;
+#else
+    return 63 - __builtin_clzll(word);
+#endif
+}
+
+// Bits [from_stop, to_stop)
+static inline uint64_t segment_range(int from_stop, int to_stop) {
+    uint64_t upto = to_stop >= 64 ? MASK_ANY : (((uint64_t)1 << to_stop) - 1);
+    return upto & ~(((uint64_t)1 << from_stop) - 1);
+}
+
+static inline bool valid_segment_range(int segment_count, int from_stop, int to_stop) {
+    return segment_count >= 1 && segment_count <= 64 && from_stop >= 0 && from_stop < to_stop && to_stop <= segment_count;
+}
+
+// Free segments a booking would strand either side of it on this seat.
+// 0 means it exactly fills a gap between existing bookings (or the ends
+// of the run); lower is a tighter fit.
+static inline int fit_gap(uint64_t seat_mask, int from_stop, int to_stop, int segment_count) {
+    uint64_t below = seat_mask & (((uint64_t)1 << from_stop) - 1);
+    int left = below ? from_stop - (highest_set_bit(below) + 1) : from_stop;
+    uint64_t above = to_stop < 64 ? seat_mask >> to_stop : 0;
+    int right = above ? lowest_set_bit(above) : segment_count - to_stop;
+    return left + right;
+}
+
+// One coach, seen for one requested journey: which seats clash with it
+struct SegmentCoach {
+    uint64_t* seat_masks;
+    int total_seats;
+    int seat_id_start;
+    std::vector<uint64_t> taken; // Seat bitmap: bit set = seat can't take the journey
+
+    void load(uint64_t want) {
+        taken.assign(seat_word_count(total_seats), 0);
+        for (int i = 0; i < total_seats; ++i) {
+            if (seat_masks[i] & want) taken[i / 64] |= (uint64_t)1 << (i % 64);
+        }
+    }
+
+    void sell(int seat, uint64_t want) {
+        seat_masks[seat - 1] |= want;
+        taken[(seat - 1) / 64] |= (uint64_t)1 << ((seat - 1) % 64);
+    }
+};
+
+// Bits [lo, hi) of word w, for seat bit indexes lo..hi-1
+static inline uint64_t bit_range_in_word(int w, int lo, int hi) {
+    int from = std::max(lo - w * 64, 0);
+    int to = std::min(hi - w * 64, 64);
+    if (from >= to) return 0;
+    uint64_t upto = to == 64 ? MASK_ANY : (((uint64_t)1 << to) - 1);
+    return upto & ~(((uint64_t)1 << from) - 1);
+}
+
+// Best-fitting free seat matching 'mask' within seat bits [lo, hi), or -1.
+// Scans only the free candidates and stops at the first perfect fit.
+static int best_fit_seat(const SegmentCoach& coach, uint64_t mask, int lo, int hi,
+                         int from_stop, int to_stop, int segment_count, int& best_gap) {
+    int best = -1;
+    for (int w = lo / 64; w < (int)coach.taken.size() && w * 64 < hi; ++w) {
+        uint64_t candidates = ~coach.taken[w] & mask & valid_seats_in_word(w, coach.total_seats) & bit_range_in_word(w, lo, hi);
+        while (candidates) {
+            int seat = w * 64 + lowest_set_bit(candidates) + 1;
+            int gap = fit_gap(coach.seat_masks[seat - 1], from_stop, to_stop, segment_count);
+            if (best == -1 || gap < best_gap) {
+                best = seat;
+                best_gap = gap;
+                if (gap == 0) return best;
             }
+            candidates &= candidates - 1;
+        }
+    }
+    return best;
+}
+
+// Smallest run of consecutive 8-seat bays in one coach that has 'needed'
+// free seats. Returns the span in bays (or -1) and the seat bit range.
+static int tightest_bay_window(const SegmentCoach& coach, int needed, int& lo, int& hi) {
+    int total_seats = coach.total_seats;
+    int bays = (total_seats + 7) / 8;
+    std::vector<int> free_in_bay(bays);
+    for (int b = 0; b < bays; ++b) {
+        int w = (b * 8) / 64; // 64 % 8 == 0: a bay never straddles two words
+        free_in_bay[b] = count_bits(~coach.taken[w] & valid_seats_in_word(w, total_seats) & bit_range_in_word(w, b * 8, b * 8 + 8));
+    }
+    int best_span = -1;
+    int sum = 0;
+    for (int first = 0, last = 0; last < bays; ++last) {
+        sum += free_in_bay[last];
+        while (first < last && sum - free_in_bay[first] >= needed) {
+            sum -= free_in_bay[first++];
+        }
+        if (sum >= needed && (best_span == -1 || last - first < best_span)) {
+            best_span = last - first;
+            lo = first * 8;
+            hi = std::min((last + 1) * 8, total_seats);
         }
     }
-    if (found_seat_num == -1) {
-        for (int i = 1; i <= total_seats; ++i) {
-            if (booked_set.find(i) == booked_set.end()) {
-                found_seat_num = i;
-                break;
+    return best_span;
+}
+
+// One preference mask per passenger from a '\n'-separated list
+static std::vector<uint64_t> parse_preference_list(const char* preferences, int passenger_count) {
+    std::vector<uint64_t> masks(passenger_count, MASK_ANY);
+    const char* p = preferences;
+    for (int i = 0; i < passenger_count; ++i) {
+        const char* nl = strchr(p, '\n');
+        size_t len = nl ? (size_t)(nl - p) : strlen(p);
+        std::string pref(p, len);
+        masks[i] = preference_mask(pref.c_str());
+        p += len + (nl ? 1 : 0);
+    }
+    return masks;
+}
+
+// Best fit over every coach for one passenger: preferred berth if any is
+// free, else any seat. Ties go to the earlier coach and lower seat.
+static bool seat_best_fit(std::vector<SegmentCoach>& coaches, uint64_t pref_mask, int from_stop, int to_stop,
+                          int segment_count, BookingResult& out_result, int& out_coach) {
+    for (int pass = 0; pass < 2; ++pass) {
+        uint64_t mask = pass == 0 ? pref_mask : MASK_ANY;
+        if (pass == 0 && (mask == MASK_ANY || mask == 0)) continue;
+        int best_coach = -1, best_seat = -1, best_gap = 0;
+        for (int c = 0; c < (int)coaches.size(); ++c) {
+            int gap = 0;
+            int seat = best_fit_seat(coaches[c], mask, 0, coaches[c].total_seats, from_stop, to_stop, segment_count, gap);
+            if (seat != -1 && (best_coach == -1 || gap < best_gap)) {
+                best_coach = c;
+                best_seat = seat;
+                best_gap = gap;
+                if (gap == 0) break;
             }
         }
+        if (best_coach != -1) {
+            coaches[best_coach].sell(best_seat, segment_range(from_stop, to_stop));
+            out_result = make_result(best_seat, coaches[best_coach].seat_id_start);
+            out_coach = best_coach;
+            return true;
+        }
     }
-    if (found_seat_num != -1) {
-        last_result.seat_id = seat_id_start + (found_seat_num - 1);
-        std::string berth_type = get_berth_type(found_seat_num);
-        strncpy(last_result.status, "CNF", sizeof(last_result.status) - 1);
-        snprintf(last_result.seat_number, sizeof(last_result.seat_number), "%d", found_seat_num);
-        strncpy(last_result.berth_type, berth_type.c_str(), sizeof(last_result.berth_type) - 1);
-    } else {
-        last_result.seat_id = -1;
-        strncpy(last_result.status, "WL", sizeof(last_result.status) - 1);
-        strncpy(last_result.seat_number, "WL", sizeof(last_result.seat_number) - 1);
-        strncpy(last_result.berth_type, "WL", sizeof(last_result.berth_type) - 1);
+    return false;
+}
+
+static void clear_group_results(int passenger_count, BookingResult* out_results, int* out_coach_index) {
+    for (int i = 0; i < passenger_count; ++i) {
+        out_results[i] = make_result(-1, 0);
+        out_coach_index[i] = -1;
+    }
+}
+
+// Seats a whole party travelling from from_stop to to_stop in one pass over
+// every coach of a class.
+//
+// coach_seat_masks[c] holds one segment mask per seat of coach c (see
+// SEGMENT OCCUPANCY). A party of two or more goes into the coach where it
+// fits in the fewest consecutive bays; within that window each passenger
+// gets the best-fitting preferred berth if one is free, otherwise the
+// best-fitting seat in the window. A lone passenger, or a party no single
+// coach can hold, gets the best-fitting seat anywhere. Passengers who
+// cannot be seated get a "WL" result and out_coach_index -1.
+//
+// Sold segments are marked on the seats. Returns the number seated.
+extern "C" CORE_API int allocate_group(
+    uint64_t* const* coach_seat_masks,
+    const int* total_seats,
+    const int* seat_id_starts,
+    int coach_count,
+    int segment_count,
+    int from_stop,
+    int to_stop,
+    const char* preferences,
+    int passenger_count,
+    BookingResult* out_results,
+    int* out_coach_index
+) {
+    clear_group_results(passenger_count, out_results, out_coach_index);
+    if (!valid_segment_range(segment_count, from_stop, to_stop)) return 0;
+
+    uint64_t want = segment_range(from_stop, to_stop);
+    std::vector<SegmentCoach> coaches(coach_count);
+    for (int c = 0; c < coach_count; ++c) {
+        coaches[c] = {coach_seat_masks[c], total_seats[c], seat_id_starts[c], {}};
+        coaches[c].load(want);
+    }
+    std::vector<uint64_t> masks = parse_preference_list(preferences, passenger_count);
+
+    // Constrained passengers pick first, so "ANY" doesn't take their berth
+    std::vector<int> order(passenger_count);
+    for (int i = 0; i < passenger_count; ++i) order[i] = i;
+    std::stable_sort(order.begin(), order.end(), [&masks](int a, int b) {
+        return (masks[a] != MASK_ANY) > (masks[b] != MASK_ANY);
+    });
+
+    // 1. Whole party in one coach, tightest window of bays wins (a lone
+    //    passenger has no one to sit near, so goes straight to best fit)
+    int best_coach = -1, best_span = -1, best_lo = 0, best_hi = 0;
+    for (int c = 0; c < coach_count && passenger_count > 1; ++c) {
+        int lo = 0, hi = 0;
+        int span = tightest_bay_window(coaches[c], passenger_count, lo, hi);
+        if (span != -1 && (best_coach == -1 || span < best_span)) {
+            best_coach = c;
+            best_span = span;
+            best_lo = lo;
+            best_hi = hi;
+        }
+    }
+    if (best_coach != -1) {
+        SegmentCoach& coach = coaches[best_coach];
+        for (int i : order) {
+            int gap = 0, seat = -1;
+            if (masks[i] != MASK_ANY && masks[i] != 0) {
+                seat = best_fit_seat(coach, masks[i], best_lo, best_hi, from_stop, to_stop, segment_count, gap);
+            }
+            if (seat == -1) {
+                seat = best_fit_seat(coach, MASK_ANY, best_lo, best_hi, from_stop, to_stop, segment_count, gap);
+            }
+            coach.sell(seat, want); // The window holds enough seats for everyone
+            out_results[i] = make_result(seat, coach.seat_id_start);
+            out_coach_index[i] = best_coach;
+        }
+        return passenger_count;
+    }
+
+    // 2. Spread over the coaches, best fit for each passenger
+    int seated = 0;
+    for (int i : order) {
+        if (seat_best_fit(coaches, masks[i], from_stop, to_stop, segment_count, out_results[i], out_coach_index[i])) seated++;
     }
-    return last_result;
+    return seated;
+}
+
+// Waitlist promotion: walks a queue head first, giving each passenger the
+// best-fitting seat for their own journey (from_stops[i] -> to_stops[i]).
+// Someone whose journey fits nowhere stays "WL" and the walk goes on, so a
+// short hop further back can still use a gap. Same results as
+// allocate_group.
+extern "C" CORE_API int allocate_in_order(
+    uint64_t* const* coach_seat_masks,
+    const int* total_seats,
+    const int* seat_id_starts,
+    int coach_count,
+    int segment_count,
+    const int* from_stops,
+    const int* to_stops,
+    const char* preferences,
+    int passenger_count,
+    BookingResult* out_results,
+    int* out_coach_index
+) {
+    clear_group_results(passenger_count, out_results, out_coach_index);
+    std::vector<uint64_t> masks = parse_preference_list(preferences, passenger_count);
+    std::vector<SegmentCoach> coaches(coach_count);
+    for (int c = 0; c < coach_count; ++c) {
+        coaches[c] = {coach_seat_masks[c], total_seats[c], seat_id_starts[c], {}};
+    }
+
+    int seated = 0;
+    uint64_t loaded_for = 0;
+    for (int i = 0; i < passenger_count; ++i) {
+        if (!valid_segment_range(segment_count, from_stops[i], to_stops[i])) continue;
+        uint64_t want = segment_range(from_stops[i], to_stops[i]);
+        if (want != loaded_for) { // Queues are mostly one journey; rebuild only when it changes
+            for (SegmentCoach& coach : coaches) coach.load(want);
+            loaded_for = want;
+        }
+        if (seat_best_fit(coaches, masks[i], from_stops[i], to_stops[i], segment_count, out_results[i], out_coach_index[i])) seated++;
+    }
+    return seated;
+}
+
+// Frees a seat's segments (cancellation, or a booking that failed to commit)
+extern "C" CORE_API void release_seat_segments(uint64_t* seat_masks, int total_seats, int seat_number, int from_stop, int to_stop) {
+    if (seat_number >= 1 && seat_number <= total_seats && valid_segment_range(64, from_stop, to_stop)) {
+        seat_masks[seat_number - 1] &= ~segment_range(from_stop, to_stop);
+    }
+}
+
+// Seats that could take a journey from from_stop to to_stop
+extern "C" CORE_API int count_free_seats_segments(const uint64_t* seat_masks, int total_seats, int from_stop, int to_stop) {
+    if (!valid_segment_range(64, from_stop, to_stop)) return 0;
+    uint64_t want = segment_range(from_stop, to_stop);
+    int free_seats = 0;
+    for (int i = 0; i < total_seats; ++i) {
+        if (!(seat_masks[i] & want)) free_seats++;
+    }
+    return free_seats;
 }
 
 // --- 2. PATHFINDING IMPLEMENTATION (REAL DIJKSTRA) ---
 
-// Represents an edge in our graph
+// Represents an edge in our graph. Stations are interned to dense integer
+// IDs, so the hot path never hashes or compares strings.
 struct Edge {
-    std::string to_station;
+    int to_station;     // station ID
     int departure_time; // minutes since midnight
     int arrival_time;   // minutes since midnight
     int travel_time;    // duration in minutes
 };
 
-// Our graph: map of "Station Name" -> vector of Edges
-static std::map<std::string, std::vector<Edge>> adj;
+// A timed connection for timetable (CSA) queries. Every edge runs every
+// day, so CSA_DAYS days of copies are kept (absolute minutes from midnight
+// of day 0), sorted by departure. That covers a journey that starts late
+// and runs overnight.
+struct Connection {
+    int from_station;
+    int to_station;
+    int departure;  // absolute minutes
+    int arrival;    // absolute minutes (> departure)
+};
+
+// A connection of one train run, for itinerary (profile) queries. Train
+// runs are read from the stops of each train, so unlike Connection they
+// know which train they belong to: staying on board is not a transfer.
+// `train` indexes the engine's train_numbers; `trip` is one day's run of
+// it (day * train count + train), so the same train on two days is two trips.
+struct TripConnection {
+    int from_station;
+    int to_station;
+    int departure;  // absolute minutes
+    int arrival;    // absolute minutes (>= departure)
+    int trip;
+    int train;
+};
+
+// One hop of a train run as the caller passes it in: minutes are counted
+// from midnight of the day the run starts, so they may pass 1440
+struct TripLeg {
+    int train;
+    int from_station;
+    int to_station;
+    int departure;
+    int arrival;
+};
+static const int CSA_DAYS = 3;
+static const int MAX_TRANSFERS_LIMIT = 10;
+static const int MAX_ITINERARY_LEGS = 64;
+static const int INF = std::numeric_limits<int>::max();
+using PII = std::pair<int, int>; // Pair of (Total Time, Station ID)
+
+// Read-only array that doesn't own its memory: an engine's arrays live
+// either in its own vectors or in a mapped snapshot file
+template <typename T>
+struct ArrayView {
+    const T* data = nullptr;
+    size_t count = 0;
+
+    void assign(const std::vector<T>& v) { data = v.data(); count = v.size(); }
+    const T& operator[](size_t i) const { return data[i]; }
+    const T* begin() const { return data; }
+    const T* end() const { return data + count; }
+    size_t size() const { return count; }
+};
+
+// A snapshot file mapped read-only (POSIX), so every process that opens it
+// shares the page cache's copy. Windows reads it into memory instead.
+struct SnapshotMapping {
+    const char* data = nullptr;
+    size_t size = 0;
+    std::vector<uint64_t> buffer; // Windows only
 
-// Helper: Defines how our priority queue will work
-// We want to pull the *fastest* path (lowest time) first
-using PII = std::pair<int, std::string>; // Pair of (Total Time, Station Name)
-struct CompareDist {
-    bool operator()(const PII& a, const PII& b) {
-        return a.first > b.first;
+    ~SnapshotMapping() {
+#ifndef _WIN32
+        if (data) munmap((void*)data, size);
+#endif
     }
 };
 
-// --- NEW C++ FUNCTIONS ---
+// --- The engine: one immutable, fully built graph ---
+// Nothing in a RouteEngine changes after it is built, so any number of
+// threads can query the same engine at once. A new timetable means a new
+// engine; the old one is destroyed once no query is using it.
+struct RouteEngine {
+    std::vector<std::string> station_codes;              // ID -> code
+    std::unordered_map<std::string, int> station_index;  // code -> ID
+    ArrayView<char> station_in_graph;                    // ID has at least one edge
 
-// Clears the graph for a new search
-extern "C" __declspec(dllexport) void clear_graph() {
-    adj.clear();
+    // Compressed sparse row (CSR) adjacency: edges leaving station u are
+    // csr_edges[csr_offsets[u] .. csr_offsets[u+1])
+    ArrayView<int> csr_offsets;
+    ArrayView<Edge> csr_edges;
+
+    // Connection array, sorted by absolute departure
+    ArrayView<Connection> connections;
+
+    // Train runs: train number per train ID, and their connections sorted
+    // by (departure, arrival), CSA_DAYS days of copies
+    std::vector<std::string> train_numbers;
+    ArrayView<TripConnection> trip_connections;
+
+    // Version of the timetable a snapshot was written from (0 if built here)
+    int64_t data_version = 0;
+
+    // What the views point into: these vectors for an engine built from
+    // routes, the mapping for one opened from a snapshot
+    std::vector<char> in_graph_storage;
+    std::vector<int> offsets_storage;
+    std::vector<Edge> edge_storage;
+    std::vector<Connection> connection_storage;
+    std::vector<TripConnection> trip_connection_storage;
+    SnapshotMapping mapping;
+
+    RouteEngine() = default;
+    RouteEngine(const RouteEngine&) = delete; // The views would point into the original
+    RouteEngine& operator=(const RouteEngine&) = delete;
+
+    int resolve(const std::string& code) const {
+        auto it = station_index.find(code);
+        if (it == station_index.end() || !station_in_graph[it->second]) return -1;
+        return it->second;
+    }
+    int station_count() const { return (int)station_codes.size(); }
+    int trip_count() const { return (int)train_numbers.size() * CSA_DAYS; }
+};
+
+// Splits count entries off a '\n'-separated list (missing ones are empty)
+static std::vector<std::string> split_lines(const char* list, int count) {
+    std::vector<std::string> lines;
+    lines.reserve(count);
+    const char* p = list;
+    for (int i = 0; i < count; ++i) {
+        const char* nl = strchr(p, '\n');
+        size_t len = nl ? (size_t)(nl - p) : strlen(p);
+        lines.emplace_back(p, len);
+        p += len + (nl ? 1 : 0);
+    }
+    return lines;
 }
 
-// Builds the graph with time and duration
-extern "C" __declspec(dllexport) void build_graph_with_time(
-    const char* station_a, 
-    const char* station_b, 
-    int departure_minutes, 
-    int arrival_minutes
-) {
-    std::string from(station_a);
-    std::string to(station_b);
-    int duration = arrival_minutes - departure_minutes;
-    
-    // Handle overnight trains (e.g., depart 23:00, arrive 02:00)
-    if (duration < 0) {
-        duration += 1440; // Add 24 hours in minutes
+static std::string join_lines(const std::vector<std::string>& lines) {
+    std::string joined;
+    for (size_t i = 0; i < lines.size(); ++i) {
+        if (i) joined += '\n';
+        joined += lines[i];
     }
-    
-    adj[from].push_back({to, departure_minutes, arrival_minutes, duration});
+    return joined;
 }
 
-// Runs Dijkstra's algorithm to find the fastest path
-extern "C" __declspec(dllexport) const char* find_fastest_path(
-    const char* from_station, 
-    const char* to_station
-) {
-    std::string start(from_station);
-    std::string end(to_station);
+// --- Builder: station interning + the edge list as added ---
+struct GraphBuilder {
+    std::vector<std::string> station_codes;
+    std::unordered_map<std::string, int> station_index;
+    std::vector<int> edge_from;
+    std::vector<Edge> edge_list;
+    std::vector<std::string> train_numbers;
+    std::vector<TripLeg> trip_legs;
+
+    int intern(const std::string& code) {
+        auto it = station_index.find(code);
+        if (it != station_index.end()) return it->second;
+        int id = (int)station_codes.size();
+        station_codes.push_back(code);
+        station_index.emplace(code, id);
+        return id;
+    }
 
-    // 1. Initialize data structures for Dijkstra's
-    std::priority_queue<PII, std::vector<PII>, CompareDist> pq;
-    std::map<std::string, int> dist;
-    std::map<std::string, std::string> prev; // To reconstruct the path
-    // Store arrival time-of-day for calculating layovers
-    std::map<std::string, int> arrival_at_node; 
+    void add_edge(int from, int to, int departure_minutes, int arrival_minutes) {
+        int duration = arrival_minutes - departure_minutes;
 
-    // Set all distances to "infinity"
-    std::unordered_set<std::string> stations;
-    for (auto const& [station, edges] : adj) {
-        stations.insert(station);
-        for (auto const& edge : edges) {
-            stations.insert(edge.to_station);
+        // Handle overnight trains (e.g., depart 23:00, arrive 02:00)
+        if (duration < 0) {
+            duration += 1440; // Add 24 hours in minutes
         }
+
+        edge_from.push_back(from);
+        edge_list.push_back({to, departure_minutes, arrival_minutes, duration});
     }
-    for (const auto& station : stations) {
-        dist[station] = std::numeric_limits<int>::max();
+
+    void clear() {
+        station_codes.clear();
+        station_index.clear();
+        edge_from.clear();
+        edge_list.clear();
+        train_numbers.clear();
+        trip_legs.clear();
     }
 
+    // Interns station_count codes from a '\n'-separated list. The codes'
+    // positions become their IDs, so a repeated code is an error.
+    bool intern_list(const char* list, int station_count) {
+        std::vector<std::string> codes = split_lines(list, station_count);
+        for (int i = 0; i < station_count; ++i) {
+            if (intern(codes[i]) != i) return false;
+        }
+        return true;
+    }
+
+    // Freezes the builder's contents into a new engine
+    RouteEngine* build() const {
+        RouteEngine* g = new RouteEngine();
+        size_t n = station_codes.size();
+        g->station_codes = station_codes;
+        g->station_index = station_index;
+        std::vector<char>& in_graph = g->in_graph_storage;
+        std::vector<int>& offsets = g->offsets_storage;
+        std::vector<Edge>& edges = g->edge_storage;
+        std::vector<Connection>& connections = g->connection_storage;
+        in_graph.assign(n, 0);
+
+        // Counting sort of the edge list by origin: O(stations + edges), and
+        // stable, so each station keeps its edges in insertion order
+        offsets.assign(n + 1, 0);
+        for (size_t i = 0; i < edge_list.size(); ++i) {
+            offsets[edge_from[i] + 1]++;
+            in_graph[edge_from[i]] = 1;
+            in_graph[edge_list[i].to_station] = 1;
+        }
+        for (size_t i = 0; i < n; ++i) {
+            offsets[i + 1] += offsets[i];
+        }
+        edges.resize(edge_list.size());
+        std::vector<int> cursor(offsets.begin(), offsets.end() - 1);
+        for (size_t i = 0; i < edge_list.size(); ++i) {
+            edges[cursor[edge_from[i]]++] = edge_list[i];
+        }
+
+        connections.reserve(edge_list.size() * CSA_DAYS);
+        for (int day = 0; day < CSA_DAYS; ++day) {
+            for (size_t i = 0; i < edge_list.size(); ++i) {
+                const Edge& e = edge_list[i];
+                int departure = day * 1440 + e.departure_time;
+                connections.push_back({edge_from[i], e.to_station, departure, departure + e.travel_time});
+            }
+        }
+        std::sort(connections.begin(), connections.end(), [](const Connection& a, const Connection& b) {
+            return a.departure < b.departure;
+        });
+
+        // Train runs: one trip per train per day
+        int train_count = (int)train_numbers.size();
+        g->train_numbers = train_numbers;
+        std::vector<TripConnection>& trips = g->trip_connection_storage;
+        trips.reserve(trip_legs.size() * CSA_DAYS);
+        for (int day = 0; day < CSA_DAYS; ++day) {
+            for (const TripLeg& leg : trip_legs) {
+                trips.push_back({leg.from_station, leg.to_station, day * 1440 + leg.departure,
+                                 day * 1440 + leg.arrival, day * train_count + leg.train, leg.train});
+            }
+        }
+        for (const TripLeg& leg : trip_legs) {
+            in_graph[leg.from_station] = 1;
+            in_graph[leg.to_station] = 1;
+        }
+        // Stable, so a run's zero-minute hops stay in stop order
+        std::stable_sort(trips.begin(), trips.end(), [](const TripConnection& a, const TripConnection& b) {
+            return a.departure != b.departure ? a.departure < b.departure : a.arrival < b.arrival;
+        });
+
+        g->station_in_graph.assign(in_graph);
+        g->csr_offsets.assign(offsets);
+        g->csr_edges.assign(edges);
+        g->connections.assign(connections);
+        g->trip_connections.assign(trips);
+        return g;
+    }
+
+    // Adds the train runs (see engine_create_timetable). Call after
+    // load_bulk. Returns false if an ID is out of range or a hop arrives
+    // before it departs.
+    bool load_trips(
+        const char* train_numbers_list,
+        int train_count,
+        const int* leg_trains,
+        const int* leg_from,
+        const int* leg_to,
+        const int* leg_departure,
+        const int* leg_arrival,
+        int leg_count
+    ) {
+        int n = (int)station_codes.size();
+        for (int i = 0; i < leg_count; ++i) {
+            if (leg_trains[i] < 0 || leg_trains[i] >= train_count ||
+                leg_from[i] < 0 || leg_from[i] >= n || leg_to[i] < 0 || leg_to[i] >= n ||
+                leg_departure[i] < 0 || leg_arrival[i] < leg_departure[i]) {
+                return false;
+            }
+        }
+        train_numbers = split_lines(train_numbers_list, train_count);
+        trip_legs.clear();
+        trip_legs.reserve(leg_count);
+        for (int i = 0; i < leg_count; ++i) {
+            trip_legs.push_back({leg_trains[i], leg_from[i], leg_to[i], leg_departure[i], leg_arrival[i]});
+        }
+        return true;
+    }
+
+    // Fills the builder from the bulk arrays (see engine_create_bulk).
+    // Returns false if any ID is out of range or a code is repeated.
+    bool load_bulk(
+        const char* station_codes_list,
+        int station_count,
+        const int* from_ids,
+        const int* to_ids,
+        const int* departure_minutes,
+        const int* arrival_minutes,
+        int edge_count
+    ) {
+        clear();
+        for (int i = 0; i < edge_count; ++i) {
+            if (from_ids[i] < 0 || from_ids[i] >= station_count ||
+                to_ids[i] < 0 || to_ids[i] >= station_count) {
+                return false;
+            }
+        }
+
+        // Split the '\n'-separated code list once; the caller's IDs are
+        // positions in that list, so they map 1:1 onto our interned IDs
+        if (!intern_list(station_codes_list, station_count)) {
+            clear(); // Duplicate code: IDs would no longer line up
+            return false;
+        }
+
+        edge_from.reserve(edge_count);
+        edge_list.reserve(edge_count);
+        for (int i = 0; i < edge_count; ++i) {
+            add_edge(from_ids[i], to_ids[i], departure_minutes[i], arrival_minutes[i]);
+        }
+        return true;
+    }
+};
+
+// One way to reach the target from a station: board trip connection
+// `enter` (leaving at `departure`), get off after `exit`, and carry on from
+// there as that station's profile one transfer down says; `arrival` at the
+// target
+struct ProfileEntry {
+    int departure;
+    int arrival;
+    int enter;
+    int exit;
+};
+
+// --- Per-thread query scratch space ---
+// Each thread gets its own, so queries never share mutable state. The arrays
+// only grow, and a query resets just the entries it touched, so a query
+// costs O(visited) rather than O(stations) before it even starts.
+struct QueryScratch {
+    // Dijkstra
+    std::vector<int> dist;
+    std::vector<int> prev_station;
+    std::vector<int> arrival_at_node;
+    std::vector<int> touched;
+    std::vector<char> is_target; // stations a search is waiting on
+    std::vector<int> target_list;
+    std::vector<PII> heap;
+
+    // CSA: earliest arrival / last connection per (legs used, station),
+    // flattened as [legs * station_count + station]
+    std::vector<int> csa_arrival;
+    std::vector<int> csa_parent;
+    std::vector<int> csa_touched;
+
+    // Profile scan, one layer per number of transfers allowed: best arrival
+    // at the target per trip (and where to get off for it), flattened as
+    // [transfers * trip_count + trip], and each station's Pareto set of
+    // (departure, arrival), as [transfers * station_count + station]
+    std::vector<int> trip_arrival;
+    std::vector<int> trip_exit;
+    std::vector<int> trips_touched;
+    std::vector<std::vector<ProfileEntry>> profiles;
+    std::vector<int> profiles_touched;
+
+    void ensure_profiles(size_t stations, size_t trips, size_t layers) {
+        if (trip_arrival.size() < trips * layers) {
+            trip_arrival.resize(trips * layers, INF);
+            trip_exit.resize(trips * layers, -1);
+        }
+        if (profiles.size() < stations * layers) profiles.resize(stations * layers);
+    }
+
+    void ensure(size_t n) {
+        if (dist.size() < n) {
+            dist.resize(n, INF);
+            prev_station.resize(n, -1);
+            arrival_at_node.resize(n, 0);
+            is_target.resize(n, 0);
+        }
+        size_t labels = n * (MAX_TRANSFERS_LIMIT + 2);
+        if (csa_arrival.size() < labels) {
+            csa_arrival.resize(labels, INF);
+            csa_parent.resize(labels, -1);
+        }
+    }
+};
+static thread_local QueryScratch scratch;
+
+static std::string format_clock(int absolute_minutes) {
+    char buf[32];
+    int day = absolute_minutes / 1440;
+    int mins = absolute_minutes % 1440;
+    if (day > 0) {
+        snprintf(buf, sizeof(buf), "%02d:%02d +%dd", mins / 60, mins % 60, day);
+    } else {
+        snprintf(buf, sizeof(buf), "%02d:%02d", mins / 60, mins % 60);
+    }
+    return buf;
+}
+
+// Copies a result into a caller-owned buffer, snprintf-style: always
+// NUL-terminated, returns the full length so the caller can retry if short
+static int copy_result(const std::string& result, char* out, int out_size) {
+    if (out && out_size > 0) {
+        size_t n = std::min(result.size(), (size_t)out_size - 1);
+        memcpy(out, result.data(), n);
+        out[n] = '\0';
+    }
+    return (int)result.size();
+}
 
-    // 2. Start at the 'from' station
-    if (dist.find(start) == dist.end()) {
-        path_result_str = "Error: Starting station '" + start + "' not found in routes.";
-        return path_result_str.c_str();
+// Runs Dijkstra's algorithm from 'start' until every station in 'targets'
+// has been settled (or, with no targets, until the whole graph is done).
+// Leaves s.dist / s.prev_station / s.arrival_at_node filled in for the
+// caller; reset_dijkstra() must be called before the next search.
+static void run_dijkstra(const RouteEngine& g, QueryScratch& s, int start, const int* targets, int target_count) {
+    s.ensure(g.station_codes.size());
+    int remaining = 0;
+    for (int i = 0; i < target_count; ++i) {
+        int t = targets[i];
+        if (t >= 0 && t < g.station_count() && !s.is_target[t]) {
+            s.is_target[t] = 1;
+            s.target_list.push_back(t);
+            remaining++;
+        }
     }
-    dist[start] = 0;
-    arrival_at_node[start] = 0; // Start at time 0
-    pq.push({0, start}); // {total time, station name}
+    bool stop_when_found = remaining > 0;
 
-    // 3. Run the algorithm
-    while (!pq.empty()) {
-        int d = pq.top().first; // Total travel time so far
-        std::string u = pq.top().second;
-        pq.pop();
+    // 1. Start at the 'from' station
+    s.dist[start] = 0;
+    s.arrival_at_node[start] = 0; // Start at time 0
+    s.touched.push_back(start);
+    s.heap.clear();
+    s.heap.push_back({0, start}); // {total time, station ID}
 
-        if (d > dist[u]) continue;
-        if (u == end) break; // Found the destination
+    // 2. Run the algorithm (min-heap on total time)
+    while (!s.heap.empty()) {
+        std::pop_heap(s.heap.begin(), s.heap.end(), std::greater<PII>());
+        int d = s.heap.back().first; // Total travel time so far
+        int u = s.heap.back().second;
+        s.heap.pop_back();
 
-        int u_arrival_time = arrival_at_node[u]; // Get the time of day we arrived at station 'u'
+        if (d > s.dist[u]) continue;
+        if (s.is_target[u]) {
+            s.is_target[u] = 0;
+            if (--remaining == 0 && stop_when_found) break; // Found every destination
+        }
+
+        int u_arrival_time = s.arrival_at_node[u]; // Get the time of day we arrived at station 'u'
 
         // Look at all neighbors (v) of the current station (u)
-        if (adj.find(u) != adj.end()) {
-            for (auto const& edge : adj[u]) {
-                std::string v = edge.to_station;
-                
-                int travel_duration = edge.travel_time; 
-                int wait_time = 0;
-                
-                if (u != start) {
-                    // Calculate wait time (layover)
-                    wait_time = edge.departure_time - u_arrival_time;
-                    if (wait_time < 0) {
-                        wait_time += 1440; // Wait for the next day
-                    }
-                }
-                
-                int total_time = dist[u] + travel_duration + wait_time;
-
-                if (total_time < dist[v]) {
-                    dist[v] = total_time;
-                    prev[v] = u;
-                    arrival_at_node[v] = edge.arrival_time; // Store the new arrival time
-                    pq.push({total_time, v});
+        for (int e = g.csr_offsets[u]; e < g.csr_offsets[u + 1]; ++e) {
+            const Edge& edge = g.csr_edges[e];
+            int v = edge.to_station;
+
+            int wait_time = 0;
+            if (u != start) {
+                // Calculate wait time (layover)
+                wait_time = edge.departure_time - u_arrival_time;
+                if (wait_time < 0) {
+                    wait_time += 1440; // Wait for the next day
                 }
             }
+
+            int total_time = d + edge.travel_time + wait_time;
+
+            if (total_time < s.dist[v]) {
+                if (s.dist[v] == INF) s.touched.push_back(v);
+                s.dist[v] = total_time;
+                s.prev_station[v] = u;
+                s.arrival_at_node[v] = edge.arrival_time; // Store the new arrival time
+                s.heap.push_back({total_time, v});
+                std::push_heap(s.heap.begin(), s.heap.end(), std::greater<PII>());
+            }
         }
     }
+}
+
+// Resets only what the last search touched
+static void reset_dijkstra(QueryScratch& s) {
+    for (int v : s.touched) {
+        s.dist[v] = INF;
+        s.prev_station[v] = -1;
+    }
+    for (int t : s.target_list) {
+        s.is_target[t] = 0; // Unreachable targets are never touched
+    }
+    s.touched.clear();
+    s.target_list.clear();
+}
+
+static std::string fastest_path(const RouteEngine& g, const std::string& start_code, const std::string& end_code) {
+    QueryScratch& s = scratch;
+
+    // 1. Resolve station codes to IDs (once per query)
+    int start = g.resolve(start_code);
+    if (start == -1) {
+        return "Error: Starting station '" + start_code + "' not found in routes.";
+    }
+    int end = g.resolve(end_code);
 
-    // 4. Reconstruct and return the path
-    if (dist.find(end) == dist.end() || dist[end] == std::numeric_limits<int>::max()) {
-        path_result_str = "No path found from " + start + " to " + end + ".";
+    // 2. Search until the destination is settled
+    run_dijkstra(g, s, start, &end, end == -1 ? 0 : 1);
+
+    // 3. Reconstruct and return the path
+    std::string result;
+    if (end == -1 || s.dist[end] == INF) {
+        result = "No path found from " + start_code + " to " + end_code + ".";
     } else {
-        std::string path = "";
-        std::string curr = end;
-        while (curr != start) {
-            path = " -> " + curr + path;
-            if (prev.find(curr) == prev.end()) {
-                path = "Error: Path reconstruction failed" + path;
-                break;
-            }
-            curr = prev[curr];
+        std::vector<int> hops;
+        for (int curr = end; curr != start; curr = s.prev_station[curr]) {
+            hops.push_back(curr);
         }
-        path = start + path;
-        
+        std::string path = start_code;
+        for (auto it = hops.rbegin(); it != hops.rend(); ++it) {
+            path += " -> " + g.station_codes[*it];
+        }
+
         std::stringstream ss;
-        int total_mins = dist[end];
-        int total_mins = dist[end];
+        int total_mins = s.dist[end];
         int hours = total_mins / 60;
         int mins = total_mins % 60;
         
         ss << "Fastest Path: " << path << " (Total time: " << hours << "h " << mins << "m)";
-        path_result_str = ss.str();
+        result = ss.str();
+    }
+
+    reset_dijkstra(s);
+    return result;
+}
+
+// Answers many (origin, target) pairs with one Dijkstra per distinct origin
+static int paths_batch(
+    const RouteEngine& g,
+    const int* origins,
+    const int* targets,
+    int pair_count,
+    int* out_duration,
+    int* out_arrival,
+    int* out_path_start,
+    int* out_path_length,
+    int* out_path,
+    int path_capacity
+) {
+    QueryScratch& s = scratch;
+    int n = g.station_count();
+    auto valid = [&g, n](int id) { return id >= 0 && id < n && g.station_in_graph[id]; };
+
+    // Group the pairs by origin so each origin is searched exactly once
+    std::vector<int> order(pair_count);
+    for (int i = 0; i < pair_count; ++i) order[i] = i;
+    std::stable_sort(order.begin(), order.end(), [origins](int a, int b) { return origins[a] < origins[b]; });
+
+    int written = 0;
+    std::vector<int> group_targets;
+    std::vector<int> hops;
+    for (int grp = 0; grp < pair_count; ) {
+        int origin = origins[order[grp]];
+        int grp_end = grp;
+        group_targets.clear();
+        while (grp_end < pair_count && origins[order[grp_end]] == origin) {
+            group_targets.push_back(targets[order[grp_end]]);
+            grp_end++;
+        }
+
+        bool searched = valid(origin);
+        if (searched) {
+            run_dijkstra(g, s, origin, group_targets.data(), (int)group_targets.size());
+        }
+        for (int j = grp; j < grp_end; ++j) {
+            int i = order[j];
+            int target = targets[i];
+            out_path_start[i] = written;
+            if (!searched || !valid(target) || s.dist[target] == INF) {
+                out_duration[i] = -1;
+                out_arrival[i] = -1;
+                out_path_length[i] = 0;
+                continue;
+            }
+            out_duration[i] = s.dist[target];
+            out_arrival[i] = s.arrival_at_node[target];
+
+            // Path is written origin first, target last
+            hops.clear();
+            for (int curr = target; curr != origin; curr = s.prev_station[curr]) {
+                hops.push_back(curr);
+            }
+            hops.push_back(origin);
+            out_path_length[i] = (int)hops.size();
+            for (auto it = hops.rbegin(); it != hops.rend(); ++it, ++written) {
+                if (written < path_capacity) out_path[written] = *it;
+            }
+        }
+        if (searched) {
+            reset_dijkstra(s);
+        }
+        grp = grp_end;
+    }
+    return written;
+}
+
+// --- 3. TIMETABLE ROUTING (CONNECTION SCAN) ---
+
+// Earliest arrival leaving `start` no earlier than depart_after, with at
+// most max_transfers changes. Unlike find_fastest_path, every connection
+// is judged by its own departure time, so a later train out of a station is
+// never taken to be catchable from an earlier arrival.
+//
+// One pass over the connections (sorted by departure) with a label per
+// (legs used, station): arrival[k][s] is the earliest time s can be reached
+// with at most k legs, so it is non-increasing in k. Returns the arrival
+// (INF if unreachable) and fills `legs` with the connections ridden, in
+// order. A Routes connection doesn't know its train, so every leg after
+// the first counts as a change.
+static int earliest_journey(
+    const RouteEngine& g,
+    int start,
+    int end,
+    int depart_after,
+    int max_transfers,
+    std::vector<int>& legs
+) {
+    QueryScratch& s = scratch;
+    s.ensure(g.station_codes.size());
+    legs.clear();
+    if (max_transfers < 0) max_transfers = 0;
+    if (max_transfers > MAX_TRANSFERS_LIMIT) max_transfers = MAX_TRANSFERS_LIMIT;
+    depart_after = ((depart_after % 1440) + 1440) % 1440;
+    if (start == end) return depart_after;
+
+    int n = g.station_count();
+    int max_legs = max_transfers + 1;
+    auto label = [n](int legs, int station) { return legs * n + station; };
+    const ArrayView<Connection>& connections = g.connections;
+
+    // 1. We are at the start from depart_after, with any number of legs
+    for (int k = 0; k <= max_legs; ++k) {
+        s.csa_arrival[label(k, start)] = depart_after;
+        s.csa_touched.push_back(label(k, start));
+    }
+
+    // 2. Scan connections departing at or after depart_after
+    auto first = std::lower_bound(connections.begin(), connections.end(), depart_after,
+        [](const Connection& c, int t) { return c.departure < t; });
+    for (auto it = first; it != connections.end(); ++it) {
+        const Connection& c = *it;
+        if (c.departure >= s.csa_arrival[label(max_legs, end)]) break; // Can't improve any more
+        if (c.from_station == start && c.to_station == start) continue;
+
+        for (int k = 1; k <= max_legs; ++k) {
+            if (s.csa_arrival[label(k - 1, c.from_station)] > c.departure) continue; // Not there in time
+            int l = label(k, c.to_station);
+            if (c.arrival < s.csa_arrival[l]) {
+                if (s.csa_arrival[l] == INF) s.csa_touched.push_back(l);
+                s.csa_arrival[l] = c.arrival;
+                s.csa_parent[l] = (int)(it - connections.begin());
+            }
+        }
+    }
+
+    // 3. Walk the parents back from the destination
+    int arrival = s.csa_arrival[label(max_legs, end)];
+    if (arrival != INF) {
+        int k = max_legs;
+        for (int v = end; v != start; --k) {
+            int ci = s.csa_parent[label(k, v)];
+            legs.push_back(ci);
+            v = connections[ci].from_station;
+        }
+        std::reverse(legs.begin(), legs.end());
+    }
+
+    // 4. Reset only what this query touched
+    for (int l : s.csa_touched) {
+        s.csa_arrival[l] = INF;
+        s.csa_parent[l] = -1;
+    }
+    s.csa_touched.clear();
+    return arrival;
+}
+
+// earliest_journey as text, for the legacy API
+static std::string earliest_arrival(
+    const RouteEngine& g,
+    const std::string& start_code,
+    const std::string& end_code,
+    int depart_after,
+    int max_transfers
+) {
+    int start = g.resolve(start_code);
+    if (start == -1) {
+        return "Error: Starting station '" + start_code + "' not found in routes.";
+    }
+    int end = g.resolve(end_code);
+    if (end == -1) {
+        return "No path found from " + start_code + " to " + end_code + ".";
+    }
+    if (start == end) return "Earliest Arrival: " + start_code + " (Total time: 0h 0m)";
+    max_transfers = std::max(0, std::min(max_transfers, MAX_TRANSFERS_LIMIT));
+    depart_after = ((depart_after % 1440) + 1440) % 1440;
+
+    std::vector<int> legs;
+    int arrival = earliest_journey(g, start, end, depart_after, max_transfers, legs);
+    if (arrival == INF) {
+        return "No path found from " + start_code + " to " + end_code +
+            " after " + format_clock(depart_after) + " within " + std::to_string(max_transfers) + " transfer(s).";
+    }
+    std::string path = start_code;
+    for (int ci : legs) path += " -> " + g.station_codes[g.connections[ci].to_station];
+    int departure = g.connections[legs.front()].departure;
+    int total_mins = arrival - departure;
+
+    std::stringstream ss;
+    ss << "Earliest Arrival: " << path
+       << " (Depart " << format_clock(departure) << ", Arrive " << format_clock(arrival)
+       << ", Total time: " << total_mins / 60 << "h " << total_mins % 60 << "m"
+       << ", Transfers: " << legs.size() - 1 << ")";
+    return ss.str();
+}
+
+// --- 3b. ALTERNATIVE ITINERARIES (PROFILE CONNECTION SCAN) ---
+
+// The entry of a station's profile to take when there at `time`: the one
+// leaving first at or after it. Entries were added latest departure first,
+// each arriving sooner than the one before, so it is also the soonest
+// arrival still catchable.
+static const ProfileEntry* profile_at(const std::vector<ProfileEntry>& profile, int time) {
+    auto it = std::partition_point(profile.begin(), profile.end(),
+        [time](const ProfileEntry& p) { return p.departure >= time; });
+    return it == profile.begin() ? nullptr : &*(it - 1);
+}
+
+// Every Pareto-optimal journey from start to end leaving within a day of
+// depart_after, on three criteria: leave later, arrive sooner, change
+// trains fewer times (at most max_transfers). Soonest first, fewest
+// changes first among those leaving together, at most max_results: the
+// next trains worth taking, direct ones included even when a faster
+// journey with a change exists.
+//
+// One backwards pass over the train-run connections that leave after
+// depart_after (Dibbelt et al.'s profile CSA, with a profile per transfer
+// count as in their multi-criteria variant) gives every station its
+// (departure, arrival at end) profiles at once, so all the alternatives
+// come from that single scan; max_results only bounds how many are walked
+// out of the start's profiles. Layer k allows k more changes: staying on
+// the same train keeps the layer, changing (arrival <= departure, as in
+// earliest_arrival) moves down one. Layer k is never worse than layer
+// k - 1, so an entry of layer k only counts if it beats layer k - 1.
+//
+// Fills out_itineraries (4 ints each: departure, arrival, first leg, leg
+// count) and out_legs (6 ints each: train, run day, from station, to
+// station, departure, arrival; times in absolute minutes from midnight of
+// day 0), writing at most leg_capacity legs. *out_leg_count gets the number
+// of legs needed. Returns the number of itineraries.
+static int itineraries(
+    const RouteEngine& g,
+    int start,
+    int end,
+    int depart_after,
+    int max_transfers,
+    int max_results,
+    int* out_itineraries,
+    int* out_legs,
+    int leg_capacity,
+    int* out_leg_count
+) {
+    QueryScratch& s = scratch;
+    *out_leg_count = 0;
+    int n = g.station_count();
+    if (start < 0 || start >= n || end < 0 || end >= n || start == end || max_results <= 0) return 0;
+    if (max_transfers < 0) max_transfers = 0;
+    if (max_transfers > MAX_TRANSFERS_LIMIT) max_transfers = MAX_TRANSFERS_LIMIT;
+    depart_after = ((depart_after % 1440) + 1440) % 1440;
+    int layers = max_transfers + 1;
+    int trip_count = g.trip_count();
+    s.ensure_profiles(n, trip_count, layers);
+    const ArrayView<TripConnection>& trips = g.trip_connections;
+    auto profile = [&](int k, int station) -> std::vector<ProfileEntry>& { return s.profiles[k * n + station]; };
+
+    // 1. Scan connections leaving at or after depart_after, latest first
+    int first = (int)(std::lower_bound(trips.begin(), trips.end(), depart_after,
+        [](const TripConnection& c, int t) { return c.departure < t; }) - trips.begin());
+    for (int ci = (int)trips.size() - 1; ci >= first; --ci) {
+        const TripConnection& c = trips[ci];
+        for (int k = 0; k < layers; ++k) {
+            int t = k * trip_count + c.trip;
+
+            // Best of: get off here at the target, stay on board, change here
+            int arrival = INF;
+            int exit = -1;
+            if (c.to_station == end) {
+                arrival = c.arrival;
+                exit = ci;
+            }
+            if (s.trip_arrival[t] < arrival) {
+                arrival = s.trip_arrival[t];
+                exit = s.trip_exit[t];
+            }
+            if (k > 0) {
+                const ProfileEntry* next = profile_at(profile(k - 1, c.to_station), c.arrival);
+                if (next && next->arrival < arrival) {
+                    arrival = next->arrival;
+                    exit = ci;
+                }
+            }
+            if (arrival == INF) continue;
+
+            if (s.trip_arrival[t] == INF) s.trips_touched.push_back(t);
+            s.trip_arrival[t] = arrival;
+            s.trip_exit[t] = exit;
+
+            // Worth boarding here only if it beats everything leaving later
+            std::vector<ProfileEntry>& options = profile(k, c.from_station);
+            if (!options.empty() && options.back().arrival <= arrival) continue;
+            if (options.empty()) s.profiles_touched.push_back(k * n + c.from_station);
+            if (!options.empty() && options.back().departure == c.departure) options.pop_back();
+            options.push_back({c.departure, arrival, ci, exit});
+        }
+    }
+
+    // 2. The start's entries no journey with fewer changes matches
+    struct Candidate { int departure; int transfers; const ProfileEntry* entry; };
+    std::vector<Candidate> candidates;
+    for (int k = 0; k < layers; ++k) {
+        for (const ProfileEntry& e : profile(k, start)) {
+            if (e.departure >= depart_after + 1440) continue; // Tomorrow's runs of the same trains
+            if (k > 0) {
+                const ProfileEntry* fewer = profile_at(profile(k - 1, start), e.departure);
+                if (fewer && fewer->arrival <= e.arrival) continue;
+            }
+            candidates.push_back({e.departure, k, &e});
+        }
+    }
+    std::sort(candidates.begin(), candidates.end(), [](const Candidate& a, const Candidate& b) {
+        return a.departure != b.departure ? a.departure < b.departure : a.transfers < b.transfers;
+    });
+
+    // 3. Walk them out, soonest first
+    int found = 0;
+    int legs_written = 0;
+    for (const Candidate& option : candidates) {
+        if (found >= max_results) break;
+        int leg_start = legs_written;
+        const ProfileEntry* p = option.entry;
+        int k = option.transfers;
+        bool complete = false;
+        int arrival = INF;
+        for (int hops = 0; p && hops < MAX_ITINERARY_LEGS; ++hops) {
+            const TripConnection& on = trips[p->enter];
+            const TripConnection& off = trips[p->exit];
+            if (legs_written < leg_capacity) {
+                int* leg = out_legs + legs_written * 6;
+                leg[0] = on.train;
+                leg[1] = on.trip / (int)g.train_numbers.size();
+                leg[2] = on.from_station;
+                leg[3] = off.to_station;
+                leg[4] = on.departure;
+                leg[5] = off.arrival;
+            }
+            legs_written++;
+            arrival = off.arrival;
+            if (off.to_station == end) { complete = true; break; }
+            if (--k < 0) break;
+            p = profile_at(profile(k, off.to_station), off.arrival);
+        }
+        if (!complete) { legs_written = leg_start; continue; } // Can't happen with consistent profiles
+        int* out = out_itineraries + found * 4;
+        out[0] = option.departure;
+        out[1] = arrival;
+        out[2] = leg_start;
+        out[3] = legs_written - leg_start;
+        found++;
+    }
+    *out_leg_count = legs_written;
+
+    // 4. Reset only what this query touched
+    for (int t : s.trips_touched) {
+        s.trip_arrival[t] = INF;
+        s.trip_exit[t] = -1;
+    }
+    for (int v : s.profiles_touched) s.profiles[v].clear();
+    s.trips_touched.clear();
+    s.profiles_touched.clear();
+    return found;
+}
+
+// --- 4. ENGINE API (thread-safe) ---
+
+extern "C" CORE_API RouteEngine* engine_create_bulk(
+    const char* station_codes_list,
+    int station_count,
+    const int* from_ids,
+    const int* to_ids,
+    const int* departure_minutes,
+    const int* arrival_minutes,
+    int edge_count
+) {
+    GraphBuilder builder;
+    if (!builder.load_bulk(station_codes_list, station_count, from_ids, to_ids,
+                           departure_minutes, arrival_minutes, edge_count)) {
+        return nullptr;
+    }
+    return builder.build();
+}
+
+extern "C" CORE_API RouteEngine* engine_create_timetable(
+    const char* station_codes_list,
+    int station_count,
+    const int* from_ids,
+    const int* to_ids,
+    const int* departure_minutes,
+    const int* arrival_minutes,
+    int edge_count,
+    const char* train_numbers_list,
+    int train_count,
+    const int* leg_trains,
+    const int* leg_from,
+    const int* leg_to,
+    const int* leg_departure,
+    const int* leg_arrival,
+    int leg_count
+) {
+    GraphBuilder builder;
+    if (!builder.load_bulk(station_codes_list, station_count, from_ids, to_ids,
+                           departure_minutes, arrival_minutes, edge_count) ||
+        !builder.load_trips(train_numbers_list, train_count, leg_trains, leg_from, leg_to,
+                            leg_departure, leg_arrival, leg_count)) {
+        return nullptr;
+    }
+    return builder.build();
+}
+
+extern "C" CORE_API void engine_destroy(RouteEngine* engine) {
+    delete engine;
+}
+
+extern "C" CORE_API int engine_get_station_id(const RouteEngine* engine, const char* station_code) {
+    return engine->resolve(station_code);
+}
+
+extern "C" CORE_API int engine_find_fastest_path(
+    const RouteEngine* engine,
+    const char* from_station,
+    const char* to_station,
+    char* out,
+    int out_size
+) {
+    return copy_result(fastest_path(*engine, from_station, to_station), out, out_size);
+}
+
+extern "C" CORE_API int engine_find_earliest_journey(
+    const RouteEngine* engine,
+    const char* from_station,
+    const char* to_station,
+    int depart_after,
+    int max_transfers,
+    int* out_itinerary,
+    int* out_legs,
+    int leg_capacity,
+    int* out_leg_count
+) {
+    *out_leg_count = 0;
+    int start = engine->resolve(from_station);
+    int end = engine->resolve(to_station);
+    if (start == -1 || end == -1 || start == end) return 0;
+    std::vector<int> legs;
+    int arrival = earliest_journey(*engine, start, end, depart_after, max_transfers, legs);
+    if (arrival == INF) return 0;
+    for (int i = 0; i < (int)legs.size() && i < leg_capacity; ++i) {
+        const Connection& c = engine->connections[legs[i]];
+        int* leg = out_legs + i * 6;
+        leg[0] = -1; // No train: Routes rows don't name one
+        leg[1] = c.departure / 1440;
+        leg[2] = c.from_station;
+        leg[3] = c.to_station;
+        leg[4] = c.departure;
+        leg[5] = c.arrival;
+    }
+    *out_leg_count = (int)legs.size();
+    out_itinerary[0] = engine->connections[legs.front()].departure;
+    out_itinerary[1] = arrival;
+    out_itinerary[2] = 0;
+    out_itinerary[3] = (int)legs.size();
+    return 1;
+}
+
+extern "C" CORE_API int engine_find_paths_batch(
+    const RouteEngine* engine,
+    const int* origins,
+    const int* targets,
+    int pair_count,
+    int* out_duration,
+    int* out_arrival,
+    int* out_path_start,
+    int* out_path_length,
+    int* out_path,
+    int path_capacity
+) {
+    return paths_batch(*engine, origins, targets, pair_count, out_duration, out_arrival,
+                       out_path_start, out_path_length, out_path, path_capacity);
+}
+
+extern "C" CORE_API int engine_station_codes(const RouteEngine* engine, char* out, int out_size) {
+    return copy_result(join_lines(engine->station_codes), out, out_size);
+}
+
+extern "C" CORE_API int engine_edge_count(const RouteEngine* engine) {
+    return (int)engine->csr_edges.size();
+}
+
+extern "C" CORE_API int engine_train_numbers(const RouteEngine* engine, char* out, int out_size) {
+    return copy_result(join_lines(engine->train_numbers), out, out_size);
+}
+
+extern "C" CORE_API int engine_find_itineraries(
+    const RouteEngine* engine,
+    const char* from_station,
+    const char* to_station,
+    int depart_after,
+    int max_transfers,
+    int max_results,
+    int* out_itineraries,
+    int* out_legs,
+    int leg_capacity,
+    int* out_leg_count
+) {
+    return itineraries(*engine, engine->resolve(from_station), engine->resolve(to_station), depart_after,
+                       max_transfers, max_results, out_itineraries, out_legs, leg_capacity, out_leg_count);
+}
+
+// --- 4b. TIMETABLE SNAPSHOTS ---
+// A built engine written to disk exactly as it sits in memory, so opening
+// one is a mmap plus a bounds check, not a rebuild. Layout (native byte
+// order, every section 8-byte aligned):
+//   SnapshotHeader
+//   station codes, '\n'-separated, NUL-terminated (their order is their IDs)
+//   station_in_graph   char[station_count]
+//   csr_offsets        int[station_count + 1]
+//   csr_edges          Edge[edge_count]
+//   connections        Connection[connection_count]
+//   train numbers, '\n'-separated, NUL-terminated (their order is their IDs)
+//   trip_connections   TripConnection[trip_connection_count]
+static const char SNAPSHOT_MAGIC[8] = {'R', 'T', 'S', 'N', 'A', 'P', '\0', '\0'};
+static const uint32_t SNAPSHOT_FORMAT_VERSION = 3; // 2: train runs, 3: data version
+static const uint32_t SNAPSHOT_BYTE_ORDER = 0x01020304;
+
+struct SnapshotHeader {
+    char magic[8];
+    uint32_t format_version;
+    uint32_t byte_order;        // SNAPSHOT_BYTE_ORDER as the writer stored it
+    uint64_t station_count;
+    uint64_t edge_count;
+    uint64_t connection_count;
+    uint64_t codes_offset;
+    uint64_t codes_size;        // including the NUL
+    uint64_t in_graph_offset;
+    uint64_t offsets_offset;
+    uint64_t edges_offset;
+    uint64_t connections_offset;
+    uint64_t train_count;
+    uint64_t trip_connection_count;
+    uint64_t trains_offset;
+    uint64_t trains_size;       // including the NUL
+    uint64_t trip_connections_offset;
+    uint64_t file_size;
+    int64_t data_version;       // Caller's version of the timetable
+};
+static_assert(sizeof(Edge) == 4 * sizeof(int) && sizeof(Connection) == 4 * sizeof(int) &&
+              sizeof(TripConnection) == 6 * sizeof(int), "snapshot sections are written as raw arrays");
+
+
+static inline uint64_t align8(uint64_t n) { return (n + 7) & ~(uint64_t)7; }
+
+// Writes the engine to `path`, stamped with the caller's data_version.
+// Returns 0, or -1 if the file couldn't be written. Write to a temporary
+// name and rename it over the live one, so readers only ever see a
+// complete snapshot.
+extern "C" CORE_API int engine_write_snapshot(const RouteEngine* engine, const char* path, int64_t data_version) {
+    std::string codes = join_lines(engine->station_codes);
+    std::string trains = join_lines(engine->train_numbers);
+
+    SnapshotHeader h = {};
+    memcpy(h.magic, SNAPSHOT_MAGIC, sizeof(h.magic));
+    h.format_version = SNAPSHOT_FORMAT_VERSION;
+    h.byte_order = SNAPSHOT_BYTE_ORDER;
+    h.data_version = data_version;
+    h.station_count = engine->station_codes.size();
+    h.edge_count = engine->csr_edges.size();
+    h.connection_count = engine->connections.size();
+    h.codes_offset = align8(sizeof(SnapshotHeader));
+    h.codes_size = codes.size() + 1;
+    h.in_graph_offset = align8(h.codes_offset + h.codes_size);
+    h.offsets_offset = align8(h.in_graph_offset + h.station_count);
+    h.edges_offset = align8(h.offsets_offset + (h.station_count + 1) * sizeof(int));
+    h.connections_offset = align8(h.edges_offset + h.edge_count * sizeof(Edge));
+    h.train_count = engine->train_numbers.size();
+    h.trip_connection_count = engine->trip_connections.size();
+    h.trains_offset = align8(h.connections_offset + h.connection_count * sizeof(Connection));
+    h.trains_size = trains.size() + 1;
+    h.trip_connections_offset = align8(h.trains_offset + h.trains_size);
+    h.file_size = h.trip_connections_offset + h.trip_connection_count * sizeof(TripConnection);
+
+    FILE* f = fopen(path, "wb");
+    if (!f) return -1;
+    bool ok = true;
+    auto section = [&](uint64_t offset, const void* data, size_t size) {
+        static const char padding[8] = {0};
+        long at = ftell(f);
+        if (at < 0 || (uint64_t)at > offset) { ok = false; return; }
+        if (ok && offset > (uint64_t)at) ok = fwrite(padding, 1, offset - at, f) == offset - at;
+        if (ok && size) ok = fwrite(data, 1, size, f) == size;
+    };
+    section(0, &h, sizeof(h));
+    section(h.codes_offset, codes.c_str(), h.codes_size);
+    section(h.in_graph_offset, engine->station_in_graph.data, h.station_count);
+    section(h.offsets_offset, engine->csr_offsets.data, (h.station_count + 1) * sizeof(int));
+    section(h.edges_offset, engine->csr_edges.data, h.edge_count * sizeof(Edge));
+    section(h.connections_offset, engine->connections.data, h.connection_count * sizeof(Connection));
+    section(h.trains_offset, trains.c_str(), h.trains_size);
+    section(h.trip_connections_offset, engine->trip_connections.data, h.trip_connection_count * sizeof(TripConnection));
+    if (fclose(f) != 0) ok = false;
+    return ok ? 0 : -1;
+}
+
+static bool map_snapshot(const char* path, SnapshotMapping& m) {
+#ifndef _WIN32
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) return false;
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size < (off_t)sizeof(SnapshotHeader)) { close(fd); return false; }
+    void* data = mmap(nullptr, (size_t)st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+    close(fd); // The mapping keeps the file (even once it is replaced) alive
+    if (data == MAP_FAILED) return false;
+    m.data = (const char*)data;
+    m.size = (size_t)st.st_size;
+    return true;
+#else
+    FILE* f = fopen(path, "rb");
+    if (!f) return false;
+    fseek(f, 0, SEEK_END);
+    long size = ftell(f);
+    fseek(f, 0, SEEK_SET);
+    if (size < (long)sizeof(SnapshotHeader)) { fclose(f); return false; }
+    m.buffer.resize(((size_t)size + 7) / 8); // uint64_t words keep the sections aligned
+    bool ok = fread(m.buffer.data(), 1, (size_t)size, f) == (size_t)size;
+    fclose(f);
+    m.data = (const char*)m.buffer.data();
+    m.size = (size_t)size;
+    return ok;
+#endif
+}
+
+// Checks everything a query will index with, so a truncated or corrupt
+// file is refused instead of read out of bounds
+static bool valid_snapshot(const SnapshotMapping& m, const SnapshotHeader& h) {
+    if (memcmp(h.magic, SNAPSHOT_MAGIC, sizeof(h.magic)) != 0 || h.format_version != SNAPSHOT_FORMAT_VERSION ||
+        h.byte_order != SNAPSHOT_BYTE_ORDER || h.file_size != m.size || h.station_count > (uint64_t)INF ||
+        h.edge_count > (uint64_t)INF || h.connection_count > m.size ||
+        h.train_count > (uint64_t)INF / CSA_DAYS || h.trip_connection_count > m.size) {
+        return false;
+    }
+    auto fits = [&m](uint64_t offset, uint64_t size) {
+        return offset % 8 == 0 && offset <= m.size && size <= m.size - offset;
+    };
+    if (!fits(h.codes_offset, h.codes_size) || h.codes_size == 0 || m.data[h.codes_offset + h.codes_size - 1] != '\0' ||
+        !fits(h.in_graph_offset, h.station_count) ||
+        !fits(h.offsets_offset, (h.station_count + 1) * sizeof(int)) ||
+        !fits(h.edges_offset, h.edge_count * sizeof(Edge)) ||
+        !fits(h.connections_offset, h.connection_count * sizeof(Connection)) ||
+        !fits(h.trains_offset, h.trains_size) || h.trains_size == 0 || m.data[h.trains_offset + h.trains_size - 1] != '\0' ||
+        !fits(h.trip_connections_offset, h.trip_connection_count * sizeof(TripConnection))) {
+        return false;
     }
 
+    int n = (int)h.station_count;
+    const int* offsets = (const int*)(m.data + h.offsets_offset);
+    if (offsets[0] != 0 || offsets[n] != (int)h.edge_count) return false;
+    for (int i = 0; i < n; ++i) {
+        if (offsets[i] > offsets[i + 1]) return false;
+    }
+    const Edge* edges = (const Edge*)(m.data + h.edges_offset);
+    for (uint64_t i = 0; i < h.edge_count; ++i) {
+        if (edges[i].to_station < 0 || edges[i].to_station >= n) return false;
+    }
+    const Connection* connections = (const Connection*)(m.data + h.connections_offset);
+    for (uint64_t i = 0; i < h.connection_count; ++i) {
+        const Connection& c = connections[i];
+        if (c.from_station < 0 || c.from_station >= n || c.to_station < 0 || c.to_station >= n) return false;
+        if (i && c.departure < connections[i - 1].departure) return false; // CSA relies on the order
+    }
+    int trains = (int)h.train_count;
+    const TripConnection* trips = (const TripConnection*)(m.data + h.trip_connections_offset);
+    for (uint64_t i = 0; i < h.trip_connection_count; ++i) {
+        const TripConnection& c = trips[i];
+        if (c.from_station < 0 || c.from_station >= n || c.to_station < 0 || c.to_station >= n ||
+            c.train < 0 || c.train >= trains || c.trip < 0 || c.trip >= trains * CSA_DAYS ||
+            c.arrival < c.departure) {
+            return false;
+        }
+        if (i && c.departure < trips[i - 1].departure) return false;
+    }
+    return true;
+}
+
+// Opens a snapshot written by engine_write_snapshot. The arrays stay in the
+// mapped file; only the station code table is rebuilt. Returns NULL if the
+// file is missing, from another format version or corrupt.
+extern "C" CORE_API RouteEngine* engine_open_snapshot(const char* path) {
+    std::unique_ptr<RouteEngine> g(new RouteEngine());
+    SnapshotMapping& m = g->mapping;
+    if (!map_snapshot(path, m)) return nullptr;
+    SnapshotHeader h;
+    memcpy(&h, m.data, sizeof(h));
+    if (!valid_snapshot(m, h)) return nullptr;
+
+    GraphBuilder codes;
+    if (!codes.intern_list(m.data + h.codes_offset, (int)h.station_count)) return nullptr;
+    g->station_codes = std::move(codes.station_codes);
+    g->station_index = std::move(codes.station_index);
+    g->train_numbers = split_lines(m.data + h.trains_offset, (int)h.train_count);
+    g->data_version = h.data_version;
+
+    g->station_in_graph = {m.data + h.in_graph_offset, (size_t)h.station_count};
+    g->csr_offsets = {(const int*)(m.data + h.offsets_offset), (size_t)h.station_count + 1};
+    g->csr_edges = {(const Edge*)(m.data + h.edges_offset), (size_t)h.edge_count};
+    g->connections = {(const Connection*)(m.data + h.connections_offset), (size_t)h.connection_count};
+    g->trip_connections = {(const TripConnection*)(m.data + h.trip_connections_offset), (size_t)h.trip_connection_count};
+    return g.release();
+}
+
+extern "C" CORE_API int64_t engine_data_version(const RouteEngine* engine) {
+    return engine->data_version;
+}
+
+// --- 5. LEGACY GLOBAL GRAPH API ---
+// The original one-graph-per-process functions, kept for existing callers.
+// They share one builder and rebuild the engine lazily on the next query;
+// a mutex keeps them safe (but serialised) across threads, and the string
+// results are per thread.
+
+static std::mutex legacy_mutex;
+static GraphBuilder legacy_builder;
+static std::unique_ptr<RouteEngine> legacy_engine;
+static bool legacy_dirty = true;
+static int graph_version = 0; // Version of the Routes table the graph was built from (0 = not built)
+static thread_local std::string path_result_str;
+static thread_local std::string csa_result_str;
+
+// Caller must hold legacy_mutex
+static const RouteEngine& legacy_graph() {
+    if (legacy_dirty || !legacy_engine) {
+        legacy_engine.reset(legacy_builder.build());
+        legacy_dirty = false;
+    }
+    return *legacy_engine;
+}
+
+// Clears the graph for a new search
+extern "C" CORE_API void clear_graph() {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    legacy_builder.clear();
+    legacy_dirty = true;
+    graph_version = 0;
+}
+
+// Builds the graph with time and duration
+extern "C" CORE_API void build_graph_with_time(
+    const char* station_a, 
+    const char* station_b, 
+    int departure_minutes, 
+    int arrival_minutes
+) {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    int from = legacy_builder.intern(station_a);
+    int to = legacy_builder.intern(station_b);
+    legacy_builder.add_edge(from, to, departure_minutes, arrival_minutes);
+    legacy_dirty = true;
+}
+
+// Loads the whole timetable in one call (see core_logic.h)
+extern "C" CORE_API int load_graph_bulk(
+    const char* station_codes_list,
+    int station_count,
+    const int* from_ids,
+    const int* to_ids,
+    const int* departure_minutes,
+    const int* arrival_minutes,
+    int edge_count
+) {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    graph_version = 0;
+    legacy_dirty = true;
+    if (!legacy_builder.load_bulk(station_codes_list, station_count, from_ids, to_ids,
+                                  departure_minutes, arrival_minutes, edge_count)) {
+        return -1;
+    }
+    legacy_graph();
+    return edge_count;
+}
+
+// Tags the graph with the Routes version it was built from
+extern "C" CORE_API void set_graph_version(int version) {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    graph_version = version;
+}
+
+extern "C" CORE_API int get_graph_version() {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    return graph_version;
+}
+
+// Runs Dijkstra's algorithm to find the fastest path
+extern "C" CORE_API const char* find_fastest_path(
+    const char* from_station, 
+    const char* to_station
+) {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    path_result_str = fastest_path(legacy_graph(), from_station, to_station);
     return path_result_str.c_str();
-}
\ No newline at end of file
+}
+
+extern "C" CORE_API int find_paths_batch(
+    const int* origins,
+    const int* targets,
+    int pair_count,
+    int* out_duration,
+    int* out_arrival,
+    int* out_path_start,
+    int* out_path_length,
+    int* out_path,
+    int path_capacity
+) {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    return paths_batch(legacy_graph(), origins, targets, pair_count, out_duration, out_arrival,
+                       out_path_start, out_path_length, out_path, path_capacity);
+}
+
+// One origin, many destinations: a single Dijkstra serves them all
+extern "C" CORE_API int find_paths_from(
+    int origin,
+    const int* targets,
+    int target_count,
+    int* out_duration,
+    int* out_arrival,
+    int* out_path_start,
+    int* out_path_length,
+    int* out_path,
+    int path_capacity
+) {
+    std::vector<int> origins(target_count, origin);
+    return find_paths_batch(origins.data(), targets, target_count, out_duration, out_arrival,
+                            out_path_start, out_path_length, out_path, path_capacity);
+}
+
+// Looks up the ID a station code was interned as (-1 if not in the graph)
+extern "C" CORE_API int get_station_id(const char* station_code) {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    return legacy_graph().resolve(station_code);
+}
+
+extern "C" CORE_API const char* find_earliest_arrival(
+    const char* from_station,
+    const char* to_station,
+    int depart_after,
+    int max_transfers
+) {
+    std::lock_guard<std::mutex> lock(legacy_mutex);
+    csa_result_str = earliest_arrival(legacy_graph(), from_station, to_station, depart_after, max_transfers);
+    return csa_result_str.c_str();
+}
@@ -1,6 +1,17 @@
 #ifndef CORE_LOGIC_H
 #define CORE_LOGIC_H
 
+#include <stdint.h>
+
+// --- EXPORT MACRO ---
+// MSVC/MinGW need __declspec to export from the .dll; GCC/Clang on
+// Linux/Mac export through default visibility for the .so build.
+#ifdef _WIN32
+#define CORE_API __declspec(dllexport)
+#else
+#define CORE_API __attribute__((visibility("default")))
+#endif
+
 // --- 1. DEFINE THE BOOKING STRUCTURE ---
 // (This part is unchanged)
 struct BookingResult {
@@ -18,7 +29,7 @@ extern "C" {
 
     // --- SEAT LOGIC ---
     // (This part is unchanged)
-    __declspec(dllexport) BookingResult find_best_seat(
+    CORE_API BookingResult find_best_seat(
         int* occupied_seats, 
         int occupied_count, 
         int total_seats, 
@@ -27,27 +38,325 @@ extern "C" {
     );
 
 
+    // --- SEAT BITMAPS ---
+    // A coach's occupancy for one journey date: one bit per seat, bit i is
+    // seat number i + 1, set = taken. occupied_words holds (total_seats + 63)
+    // / 64 words. Allocation is a word-wise find-first-set over
+    // free & preference mask, so it never looks at seats one by one.
+
+    // Picks the best free seat (same rules as find_best_seat) and sets its bit
+    CORE_API BookingResult allocate_seat_bitmap(
+        uint64_t* occupied_words,
+        int total_seats,
+        int seat_id_start,
+        const char* preference
+    );
+
+    // Clears a seat's bit (cancellation, or a booking that was rolled back)
+    CORE_API void release_seat_bitmap(uint64_t* occupied_words, int total_seats, int seat_number);
+
+    CORE_API int count_free_seats(const uint64_t* occupied_words, int total_seats);
+
+    // --- SEGMENT OCCUPANCY ---
+    // A train's run is split into segments (stop s -> stop s + 1, at most
+    // 64). Each seat has a uint64_t mask over them, bit s set = segment s
+    // sold; a coach is an array of total_seats masks. A journey from stop a
+    // to stop b needs bits [a, b) clear. A train without intermediate stops
+    // has segment_count 1 (journey 0 -> 1).
+
+    // Seats a party of passenger_count travelling from_stop -> to_stop
+    // across all coaches of a class in one call. coach_seat_masks[c] is
+    // coach c's seat masks; preferences holds one preference per passenger
+    // separated by '\n'. The party is kept in one coach, in as few
+    // consecutive 8-berth bays as possible, when any coach can hold it;
+    // otherwise it is spread over the coaches. Each passenger gets the seat
+    // whose free stretch fits the journey most tightly. Fills out_results /
+    // out_coach_index per passenger (status "WL" and coach -1 if no seat was
+    // left), marks the segments sold and returns the number seated.
+    CORE_API int allocate_group(
+        uint64_t* const* coach_seat_masks,
+        const int* total_seats,
+        const int* seat_id_starts,
+        int coach_count,
+        int segment_count,
+        int from_stop,
+        int to_stop,
+        const char* preferences,
+        int passenger_count,
+        BookingResult* out_results,
+        int* out_coach_index
+    );
+
+    // Waitlist promotion: walks the queue head first, each passenger with
+    // their own journey (from_stops[i] -> to_stops[i]) and preference, and
+    // seats everyone who fits. Same results as allocate_group.
+    CORE_API int allocate_in_order(
+        uint64_t* const* coach_seat_masks,
+        const int* total_seats,
+        const int* seat_id_starts,
+        int coach_count,
+        int segment_count,
+        const int* from_stops,
+        const int* to_stops,
+        const char* preferences,
+        int passenger_count,
+        BookingResult* out_results,
+        int* out_coach_index
+    );
+
+    // Frees seat_number's segments from_stop -> to_stop.
+    CORE_API void release_seat_segments(uint64_t* seat_masks, int total_seats, int seat_number, int from_stop, int to_stop);
+
+    // Seats in the coach that could take a journey from_stop -> to_stop.
+    CORE_API int count_free_seats_segments(const uint64_t* seat_masks, int total_seats, int from_stop, int to_stop);
+
+
     // --- GRAPH/PATHFINDING LOGIC ---
+    // These work on one process-wide graph. They are mutex-protected, so
+    // concurrent callers are safe but serialised; new code should use the
+    // ENGINE API at the bottom of this file instead.
     
     // !!! NEW FUNCTION: Clears the graph for a new search !!!
-    __declspec(dllexport) void clear_graph();
+    CORE_API void clear_graph();
 
     // !!! UPDATED FUNCTION: Now takes departure and arrival times !!!
     // Times are passed as minutes since midnight (e.g., 10:30 AM = 630)
-    __declspec(dllexport) void build_graph_with_time(
+    CORE_API void build_graph_with_time(
         const char* station_a, 
         const char* station_b, 
         int departure_minutes, 
         int arrival_minutes
     );
 
+    // Bulk loader: replaces the whole graph in one call.
+    // station_codes holds station_count codes separated by '\n'; a station's
+    // ID is its position in that list. Edge i runs from_ids[i] -> to_ids[i],
+    // departing/arriving at the given minutes since midnight.
+    // Returns the number of edges loaded, or -1 if any ID is out of range
+    // (in which case the graph is left empty).
+    CORE_API int load_graph_bulk(
+        const char* station_codes,
+        int station_count,
+        const int* from_ids,
+        const int* to_ids,
+        const int* departure_minutes,
+        const int* arrival_minutes,
+        int edge_count
+    );
+
+    // Graph version stamp. The caller tags the resident graph with the
+    // version of the Routes table it was built from, so it only needs to be
+    // rebuilt when that version changes. clear_graph() resets it to 0.
+    CORE_API void set_graph_version(int version);
+    CORE_API int get_graph_version();
+
     // !!! UPDATED FUNCTION: Now finds the *fastest* path !!!
-    __declspec(dllexport) const char* find_fastest_path(
+    CORE_API const char* find_fastest_path(
         const char* from_station, 
         const char* to_station
     );
 
 
+    // --- BATCHED QUERIES ---
+    // Structured results for many destinations from as few searches as
+    // possible: find_paths_from runs one Dijkstra for all targets, and
+    // find_paths_batch runs one per distinct origin in its (origin, target)
+    // pairs. Stations are IDs (see get_station_id / load_graph_bulk).
+    //
+    // For pair i:
+    //   out_duration[i]  total minutes, or -1 if unreachable
+    //   out_arrival[i]   arrival time of day in minutes, or -1
+    //   the path (station IDs, origin first) is
+    //   out_path[out_path_start[i] .. out_path_start[i] + out_path_length[i])
+    // Returns the number of path entries needed. If that is more than
+    // path_capacity, the paths were truncated: retry with a bigger buffer.
+    CORE_API int find_paths_batch(
+        const int* origins,
+        const int* targets,
+        int pair_count,
+        int* out_duration,
+        int* out_arrival,
+        int* out_path_start,
+        int* out_path_length,
+        int* out_path,
+        int path_capacity
+    );
+
+    CORE_API int find_paths_from(
+        int origin,
+        const int* targets,
+        int target_count,
+        int* out_duration,
+        int* out_arrival,
+        int* out_path_start,
+        int* out_path_length,
+        int* out_path,
+        int path_capacity
+    );
+
+    // ID a station code was interned as, or -1 if it has no routes
+    CORE_API int get_station_id(const char* station_code);
+
+    // --- TIMETABLE ROUTING ---
+
+    // Earliest-arrival query over the timed connections (Connection Scan).
+    // Leaves no earlier than depart_after (minutes since midnight) and changes
+    // trains at most max_transfers times (capped at 10). Trains are assumed
+    // to run daily; the search looks up to three days ahead.
+    CORE_API const char* find_earliest_arrival(
+        const char* from_station,
+        const char* to_station,
+        int depart_after,
+        int max_transfers
+    );
+
+
+
+    // --- ENGINE API (thread-safe) ---
+    // A RouteEngine is an immutable graph built in one call. Any number of
+    // threads may query the same engine at once: scratch space is per thread
+    // and results go into caller-owned buffers. To change the timetable,
+    // build a new engine and destroy the old one once no query is using it.
+    //
+    // The string queries return the full length of the result and write at
+    // most out_size - 1 characters plus a NUL (like snprintf); if the return
+    // value is >= out_size, call again with a bigger buffer.
+    typedef struct RouteEngine RouteEngine;
+
+    // Same inputs as load_graph_bulk. Returns NULL if any ID is out of range.
+    CORE_API RouteEngine* engine_create_bulk(
+        const char* station_codes,
+        int station_count,
+        const int* from_ids,
+        const int* to_ids,
+        const int* departure_minutes,
+        const int* arrival_minutes,
+        int edge_count
+    );
+
+    // Same, plus the train runs that itinerary queries use. train_numbers
+    // holds train_count numbers separated by '\n'; a train's ID is its
+    // position in that list. Leg i is one hop of train leg_trains[i] from
+    // station leg_from[i] to leg_to[i]; its minutes count from midnight of
+    // the day the run starts, so they carry on past 1440 on an overnight
+    // run. Trains are assumed to run daily. Returns NULL if any ID is out
+    // of range or a leg arrives before it departs.
+    CORE_API RouteEngine* engine_create_timetable(
+        const char* station_codes,
+        int station_count,
+        const int* from_ids,
+        const int* to_ids,
+        const int* departure_minutes,
+        const int* arrival_minutes,
+        int edge_count,
+        const char* train_numbers,
+        int train_count,
+        const int* leg_trains,
+        const int* leg_from,
+        const int* leg_to,
+        const int* leg_departure,
+        const int* leg_arrival,
+        int leg_count
+    );
+    CORE_API void engine_destroy(RouteEngine* engine);
+
+    CORE_API int engine_get_station_id(const RouteEngine* engine, const char* station_code);
+
+    CORE_API int engine_find_fastest_path(
+        const RouteEngine* engine,
+        const char* from_station,
+        const char* to_station,
+        char* out,
+        int out_size
+    );
+
+    // Same output layout as find_paths_batch
+    CORE_API int engine_find_paths_batch(
+        const RouteEngine* engine,
+        const int* origins,
+        const int* targets,
+        int pair_count,
+        int* out_duration,
+        int* out_arrival,
+        int* out_path_start,
+        int* out_path_length,
+        int* out_path,
+        int path_capacity
+    );
+
+    // Alternative itineraries over the train runs: every journey leaving
+    // within a day of depart_after (minutes since midnight) with at most
+    // max_transfers changes (capped at 10) that no other journey beats on
+    // departure, arrival and changes together, soonest first, up to
+    // max_results. All of them come from one scan of the connections.
+    // Staying on a train is not a transfer.
+    //
+    // out_itineraries: 4 ints per itinerary (departure, arrival, first leg,
+    // leg count). out_legs: 6 ints per leg (train ID, run day, from station
+    // ID, to station ID, departure, arrival). Times are minutes from
+    // midnight of the search day; run day is the day the train's run
+    // started on. At most leg_capacity legs are written; *out_leg_count gets
+    // the number needed (call again with a bigger buffer if it is larger).
+    // Returns the number of itineraries.
+    CORE_API int engine_find_itineraries(
+        const RouteEngine* engine,
+        const char* from_station,
+        const char* to_station,
+        int depart_after,
+        int max_transfers,
+        int max_results,
+        int* out_itineraries,
+        int* out_legs,
+        int leg_capacity,
+        int* out_leg_count
+    );
+
+    // The find_earliest_arrival journey as one itinerary in the layout of
+    // engine_find_itineraries, over the Routes connections instead of the
+    // train runs: for timetables with no runs loaded. Every leg is one
+    // Routes row and its train ID is -1. Returns 1 if a journey was found,
+    // else 0; out_leg_count may exceed leg_capacity as there.
+    CORE_API int engine_find_earliest_journey(
+        const RouteEngine* engine,
+        const char* from_station,
+        const char* to_station,
+        int depart_after,
+        int max_transfers,
+        int* out_itinerary,
+        int* out_legs,
+        int leg_capacity,
+        int* out_leg_count
+    );
+
+    // The engine's station codes and train numbers, '\n'-separated in ID
+    // order (snprintf-style like the string queries), and its number of edges
+    CORE_API int engine_station_codes(const RouteEngine* engine, char* out, int out_size);
+    CORE_API int engine_train_numbers(const RouteEngine* engine, char* out, int out_size);
+    CORE_API int engine_edge_count(const RouteEngine* engine);
+
+    // --- TIMETABLE SNAPSHOTS ---
+    // An engine saved to a versioned binary file (interned station codes,
+    // CSR edges, the connection array and the train runs, laid out as in
+    // memory) so other processes can open it without a database or a
+    // rebuild. On Linux/Mac the file is mapped read-only: every process that
+    // opens the same snapshot shares one copy in the page cache.
+
+    // Returns 0, or -1 if the file couldn't be written. data_version is the
+    // caller's version of the timetable the engine was built from; engines
+    // opened from the file report it. Write to a temporary path and rename
+    // it into place to publish.
+    CORE_API int engine_write_snapshot(const RouteEngine* engine, const char* path, int64_t data_version);
+
+    // Returns NULL if the file is missing, corrupt or from another format
+    // version. Free it with engine_destroy like any other engine; a
+    // snapshot replaced on disk stays valid for engines that have it open.
+    CORE_API RouteEngine* engine_open_snapshot(const char* path);
+
+    // data_version of the snapshot an engine was opened from (0 if it was
+    // built with engine_create_*)
+    CORE_API int64_t engine_data_version(const RouteEngine* engine);
+
+
 #ifdef __cplusplus
 }
 #endif
@@ -1,3 +1,8 @@
+/*
+ The current schema, for a fresh install. To bring an existing database up
+ to date (missing columns, indexes), run `python migrate.py`.
+*/
+
 /* ---------------------------------- */
 /* --- 1. SETUP & USER TABLES --- */
 /* ---------------------------------- */
@@ -9,7 +14,8 @@ CREATE TABLE IF NOT EXISTS Users (
     username VARCHAR(100) UNIQUE NOT NULL,
     email VARCHAR(100) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
-    is_admin BOOLEAN DEFAULT 0
+    is_admin BOOLEAN DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 /* ---------------------------------- */
@@ -28,11 +34,20 @@ CREATE TABLE IF NOT EXISTS Stations (
 /* This is what your C++ route_brain will use */
 CREATE TABLE IF NOT EXISTS Routes (
     route_id INT AUTO_INCREMENT PRIMARY KEY,
-    station_a_code VARCHAR(10),
-    station_b_code VARCHAR(10),
+    start_station_code VARCHAR(10),
+    end_station_code VARCHAR(10),
+    departure_time TIME, /* NULL = not in the timetable, only used for distances */
+    arrival_time TIME,
     distance_km INT NOT NULL, /* The "weight" for Dijkstra's algorithm */
-    FOREIGN KEY (station_a_code) REFERENCES Stations(station_code),
-    FOREIGN KEY (station_b_code) REFERENCES Stations(station_code)
+    FOREIGN KEY (start_station_code) REFERENCES Stations(station_code),
+    FOREIGN KEY (end_station_code) REFERENCES Stations(station_code)
+);
+
+/* One row: bumped with every change to Routes or Train_Stops */
+/* Each app process rebuilds its route graph when this moves */
+CREATE TABLE IF NOT EXISTS Route_Graph_Version (
+    id TINYINT PRIMARY KEY,
+    version INT NOT NULL
 );
 
 /* ---------------------------------- */
@@ -42,7 +57,8 @@ CREATE TABLE IF NOT EXISTS Routes (
 /* A list of all your trains */
 CREATE TABLE IF NOT EXISTS Trains (
     train_number VARCHAR(10) PRIMARY KEY,
-    train_name VARCHAR(100) NOT NULL
+    train_name VARCHAR(100) NOT NULL,
+    base_fare DECIMAL(10, 2) NOT NULL DEFAULT 0
 );
 
 /* A list of all physical coaches on each train */
@@ -51,6 +67,8 @@ CREATE TABLE IF NOT EXISTS Coaches (
     train_number VARCHAR(10),
     coach_name VARCHAR(10) NOT NULL, /* e.g., "S4", "B1", "A2" */
     coach_class VARCHAR(20) NOT NULL, /* "Sleeper", "AC3", "AC1" */
+    total_berths INT NOT NULL DEFAULT 0,
+    KEY idx_coaches_train_class (train_number, coach_class, total_berths), /* Covers capacity per class */
     FOREIGN KEY (train_number) REFERENCES Trains(train_number)
 );
 
@@ -60,9 +78,27 @@ CREATE TABLE IF NOT EXISTS Seats (
     coach_id INT,
     seat_number VARCHAR(10) NOT NULL, /* e.g., "32" */
     berth_type VARCHAR(20) NOT NULL, /* "Upper", "Middle", "Window" */
+    KEY idx_seats_coach (coach_id, seat_number),
     FOREIGN KEY (coach_id) REFERENCES Coaches(coach_id)
 );
 
+/*
+ The stops each train makes, in order. Segment s of a train's run is
+ stop s -> stop s + 1; seats are sold per segment, so a seat freed at an
+ intermediate stop can be resold from there. At most 65 stops (64 segments).
+ A train with no stops on file is sold for its whole run as one segment.
+*/
+CREATE TABLE IF NOT EXISTS Train_Stops (
+    train_number VARCHAR(10) NOT NULL,
+    stop_sequence INT NOT NULL, /* 0, 1, 2, ... */
+    station_code VARCHAR(10) NOT NULL,
+    arrival_time TIME,
+    departure_time TIME,
+    PRIMARY KEY (train_number, stop_sequence),
+    FOREIGN KEY (train_number) REFERENCES Trains(train_number),
+    FOREIGN KEY (station_code) REFERENCES Stations(station_code)
+);
+
 /* ---------------------------------- */
 /* --- 4. BOOKING & TICKET TABLES --- */
 /* ---------------------------------- */
@@ -73,9 +109,13 @@ CREATE TABLE IF NOT EXISTS Bookings (
     user_id INT,
     train_number VARCHAR(10),
     journey_date DATE NOT NULL,
-    booking_status VARCHAR(20) NOT NULL, /* "CONFIRMED", "CANCELLED" */
+    booking_status VARCHAR(20) NOT NULL, /* "CONFIRMED", "WAITLISTED", "CANCELLED" */
     total_fare DECIMAL(10, 2),
+    from_station_code VARCHAR(10), /* NULL = from the first stop */
+    to_station_code VARCHAR(10),   /* NULL = to the last stop */
     booked_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_bookings_user_date (user_id, journey_date), /* My bookings */
+    KEY idx_bookings_train_date (train_number, journey_date), /* A train's passengers for a date */
     FOREIGN KEY (user_id) REFERENCES Users(user_id),
     FOREIGN KEY (train_number) REFERENCES Trains(train_number)
 );
@@ -87,6 +127,8 @@ CREATE TABLE IF NOT EXISTS Passengers (
     name VARCHAR(100) NOT NULL,
     age INT NOT NULL,
     gender VARCHAR(10) NOT NULL,
+    seat_class VARCHAR(20),
+    KEY idx_passengers_pnr (pnr_number),
     FOREIGN KEY (pnr_number) REFERENCES Bookings(pnr_number)
 );
 
@@ -101,9 +143,83 @@ CREATE TABLE IF NOT EXISTS Tickets (
     seat_id INT, /* This is NULL if status is WL */
     status VARCHAR(10) NOT NULL, /* "CNF", "RAC", "WL" */
     seat_class VARCHAR(20) NOT NULL, /* "Sleeper", "AC3" */
+    berth_type VARCHAR(20),
+    KEY idx_tickets_passenger_status (passenger_id, status),
     FOREIGN KEY (passenger_id) REFERENCES Passengers(passenger_id),
     FOREIGN KEY (seat_id) REFERENCES Seats(seat_id)
 );
+
+/*
+ One row per seat segment sold for a journey date (see Train_Stops).
+ The primary key is what stops two bookings (from any worker process)
+ getting the same seat over the same stretch: the second INSERT fails and
+ that booking retries.
+*/
+CREATE TABLE IF NOT EXISTS Seat_Reservations (
+    seat_id INT NOT NULL,
+    journey_date DATE NOT NULL,
+    segment TINYINT NOT NULL DEFAULT 0,
+    passenger_id INT NOT NULL,
+    PRIMARY KEY (seat_id, journey_date, segment),
+    KEY (passenger_id),
+    FOREIGN KEY (seat_id) REFERENCES Seats(seat_id),
+    FOREIGN KEY (passenger_id) REFERENCES Passengers(passenger_id)
+);
+
+/*
+ Seat availability index: ticket counts per train, date and class.
+ Updated in the same transaction as every booking and cancellation, so the
+ RAC and WL queue lengths are one primary-key lookup instead of a join over
+ Tickets. Free seats are counted per stretch from Seat_Reservations, since
+ one seat can carry several tickets over different segments.
+ A missing row means nothing is booked yet. Rebuild it from the tables
+ with `flask --app main rebuild-availability`.
+*/
+CREATE TABLE IF NOT EXISTS Seat_Availability (
+    train_number VARCHAR(10) NOT NULL,
+    journey_date DATE NOT NULL,
+    seat_class VARCHAR(20) NOT NULL,
+    cnf_count INT NOT NULL DEFAULT 0,
+    rac_count INT NOT NULL DEFAULT 0,
+    wl_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (train_number, journey_date, seat_class),
+    KEY idx_seat_availability_date (journey_date), /* Upcoming queues for promote-waitlist */
+    FOREIGN KEY (train_number) REFERENCES Trains(train_number)
+);
+
+/*
+ RAC / waitlist queues, one per train, date and class.
+ The primary key keeps each queue clustered in booking order (ticket_id),
+ so promotion reads its head with one range scan. Whether a place is RAC
+ or WL is on the ticket; the queue only holds what promotion needs.
+*/
+CREATE TABLE IF NOT EXISTS Waitlist (
+    train_number VARCHAR(10) NOT NULL,
+    journey_date DATE NOT NULL,
+    seat_class VARCHAR(20) NOT NULL,
+    ticket_id INT NOT NULL,
+    preference VARCHAR(10) NOT NULL DEFAULT 'ANY',
+    from_stop TINYINT NOT NULL DEFAULT 0, /* The journey, as segments [from_stop, to_stop) */
+    to_stop TINYINT NOT NULL DEFAULT 1,
+    PRIMARY KEY (train_number, journey_date, seat_class, ticket_id),
+    FOREIGN KEY (ticket_id) REFERENCES Tickets(ticket_id)
+);
+
+/*
+ Dashboard rollups, one row per day. bookings and confirmed_revenue are
+ counted on the day a booking was made (booked_on), so a later promotion
+ or cancellation adjusts that day; new_users on the day of sign-up. Kept
+ current by the booking, cancellation and register paths; rebuild it from
+ the tables with `flask --app main rebuild-daily-stats`. Users created
+ before created_at existed all count on the day the column was added.
+*/
+CREATE TABLE IF NOT EXISTS Daily_Stats (
+    stat_date DATE PRIMARY KEY,
+    bookings INT NOT NULL DEFAULT 0,
+    confirmed_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    new_users INT NOT NULL DEFAULT 0
+);
+
 USE railway_management_system;
 
 CREATE TABLE IF NOT EXISTS audit_log (
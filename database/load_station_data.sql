@@ -17,18 +17,43 @@ INSERT INTO Stations (station_code, station_name, latitude, longitude) VALUES
 ('PUN', 'Pune', 18.5204, 73.8567),
 ('NAG', 'Nagpur', 21.1458, 79.0882);
 
-/* Populate the 'Routes' table (Edges) with placeholder distances */
-INSERT INTO Routes (station_a_code, station_b_code, distance_km) VALUES
-('DEL', 'AGR', 233),
-('AGR', 'JAI', 241),
-('AGR', 'BHO', 508),
-('BHO', 'NAG', 390),
-('NAG', 'HYD', 500),
-('HYD', 'MUM', 709),
-('MUM', 'PUN', 149),
-('MUM', 'GOA', 590),
-('GOA', 'BAN', 559),
-('BAN', 'COI', 363),
-('COI', 'TRI', 416),
-('HYD', 'CHE', 627),
-('CHE', 'BAN', 347);
\ No newline at end of file
+/* Populate the 'Routes' table (Edges): distances, and a daily timetable at about 60 km/h */
+INSERT INTO Routes (start_station_code, end_station_code, departure_time, arrival_time, distance_km) VALUES
+('DEL', 'AGR', '06:00:00', '09:53:00', 233),
+('AGR', 'JAI', '10:30:00', '14:31:00', 241),
+('AGR', 'BHO', '08:15:00', '16:43:00', 508),
+('BHO', 'NAG', '19:40:00', '02:10:00', 390),
+('NAG', 'HYD', '07:05:00', '15:25:00', 500),
+('HYD', 'MUM', '21:30:00', '09:19:00', 709),
+('MUM', 'PUN', '06:45:00', '09:14:00', 149),
+('MUM', 'GOA', '11:00:00', '20:50:00', 590),
+('GOA', 'BAN', '22:10:00', '07:29:00', 559),
+('BAN', 'COI', '09:20:00', '15:23:00', 363),
+('COI', 'TRI', '14:30:00', '21:26:00', 416),
+('HYD', 'CHE', '17:50:00', '04:17:00', 627),
+('CHE', 'BAN', '08:40:00', '14:27:00', 347);
+
+/* The demo trains (seed_database.py adds their coaches and seats) and their runs, */
+/* which train searches use; the times follow the Routes timetable above */
+INSERT IGNORE INTO Trains (train_number, train_name, base_fare) VALUES
+('12951', 'Mumbai Rajdhani', 1500.00),
+('12001', 'Shatabdi Express', 800.00),
+('12859', 'Gitanjali Express', 650.00);
+
+INSERT IGNORE INTO Train_Stops (train_number, stop_sequence, station_code, arrival_time, departure_time) VALUES
+('12001', 0, 'DEL', NULL, '06:00:00'),
+('12001', 1, 'AGR', '09:53:00', '10:30:00'),
+('12001', 2, 'JAI', '14:31:00', NULL),
+('12951', 0, 'AGR', NULL, '08:15:00'),
+('12951', 1, 'BHO', '16:43:00', '19:40:00'),
+('12951', 2, 'NAG', '02:10:00', '07:05:00'),
+('12951', 3, 'HYD', '15:25:00', '21:30:00'),
+('12951', 4, 'MUM', '09:19:00', NULL),
+('12859', 0, 'MUM', NULL, '11:00:00'),
+('12859', 1, 'GOA', '20:50:00', '22:10:00'),
+('12859', 2, 'BAN', '07:29:00', '09:20:00'),
+('12859', 3, 'COI', '15:23:00', NULL);
+
+/* Running app processes rebuild their route graphs */
+INSERT INTO Route_Graph_Version (id, version) VALUES (1, 1)
+ON DUPLICATE KEY UPDATE version = version + 1;
@@ -0,0 +1,225 @@
+"""Shared MySQL connection pool.
+
+Every route (and seed_database.py) borrows a connection from here instead
+of opening one per call. `connection()` hands out a PooledConnection that
+behaves like a pymysql connection; its close() returns it to the pool
+(after a rollback, so no transaction or read snapshot leaks into the next
+request) instead of closing the socket. Statements, commits and rollbacks
+made through it count towards the current request's DB time (metrics.py).
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import pymysql.cursors
+from dotenv import load_dotenv
+
+from metrics import timed, DB_QUERIES
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': '127.0.0.1',
+    'user': 'root',
+    'password': os.getenv('DB_PASSWORD'),
+    'database': 'railway_management_system',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+# Idle connections older than this are pinged before being handed out
+PING_AFTER_IDLE = 30.0
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+class TimedCursor:
+    """A pymysql cursor whose statements are timed as DB time: execute()
+    and executemany() only, never the fetches. With the default buffered
+    cursors execute() reads the whole result, so that is all of it. With
+    an unbuffered one (SSDictCursor, as the admin exports use) the rows
+    arrive during fetch and iteration, which stay untimed; only the time
+    to the first result is recorded."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        DB_QUERIES.inc()
+        with timed('db'): return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        DB_QUERIES.inc()
+        with timed('db'): return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+class PooledConnection:
+    """A borrowed connection. Use it like a pymysql connection; close() gives it back."""
+    _conn = None
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pymysql.err.InterfaceError("Connection was returned to the pool")
+        return getattr(self._conn, name)
+
+    def cursor(self, *args):
+        return TimedCursor(self.__getattr__('cursor')(*args))
+
+    def commit(self):
+        DB_QUERIES.inc()
+        with timed('db'): self.__getattr__('commit')()
+
+    def rollback(self):
+        DB_QUERIES.inc()
+        with timed('db'): self.__getattr__('rollback')()
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def discard(self):
+        """Closes the socket instead of returning it: for a connection left
+        mid-way through an unbuffered result, which close() would first
+        have to read to the end."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.discard(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # A route that raised before its close(): don't leak the slot
+        self.close()
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of pymysql connections.
+
+    At most `max_size` connections exist at once. A checkout reuses an idle
+    connection (pinging it first if it sat idle for a while), opens a new
+    one if under the limit, or waits up to `timeout` seconds for a return.
+    """
+
+    def __init__(self, config, max_size=POOL_SIZE, timeout=CHECKOUT_TIMEOUT):
+        self.config = config
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle = [] # (connection, returned_at), most recent last
+        self.open_count = 0
+        self.waiters = deque()
+        self.lock = threading.Condition()
+        self.counters = {'checkouts': 0, 'created': 0, 'reused': 0, 'waits': 0,
+                         'timeouts': 0, 'discarded': 0, 'wait_seconds': 0.0}
+
+    def connection(self):
+        deadline = time.monotonic() + self.timeout
+        with self.lock:
+            self.counters['checkouts'] += 1
+            if self.waiters or not self._available():
+                # First come, first served: a thread that just returned a
+                # connection must not jump ahead of the ones already waiting
+                token = object()
+                self.waiters.append(token)
+                self.counters['waits'] += 1
+                started = time.monotonic()
+                try:
+                    while self.waiters[0] is not token or not self._available():
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.counters['timeouts'] += 1
+                            raise PoolTimeout(f"No database connection free after {self.timeout}s (pool size {self.max_size})")
+                        self.lock.wait(remaining)
+                finally:
+                    self.waiters.remove(token)
+                    self.counters['wait_seconds'] += time.monotonic() - started
+                    self.lock.notify_all() # Let the next in line re-check
+            if self.idle:
+                conn, returned_at = self.idle.pop()
+            else:
+                conn, returned_at = None, None
+                self.open_count += 1 # Reserve the slot before connecting outside the lock
+
+        try:
+            if conn is not None and time.monotonic() - returned_at > PING_AFTER_IDLE:
+                conn = self._checked(conn) # A dead one's slot goes to its replacement
+            if conn is None:
+                conn = pymysql.connect(**self.config)
+                with self.lock: self.counters['created'] += 1
+            else:
+                with self.lock: self.counters['reused'] += 1
+        except Exception:
+            with self.lock:
+                self.open_count -= 1
+                self.lock.notify_all()
+            raise
+        return PooledConnection(self, conn)
+
+    def _available(self):
+        return bool(self.idle) or self.open_count < self.max_size
+
+    def _checked(self, conn):
+        """Returns conn if the server still answers, else None (and drops it)."""
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except Exception:
+            self._discard(conn)
+            with self.lock: self.counters['discarded'] += 1
+            return None
+
+    @staticmethod
+    def _discard(conn):
+        try: conn.close()
+        except Exception: pass
+
+    def release(self, conn):
+        healthy = True
+        try:
+            conn.rollback()
+        except Exception:
+            healthy = False
+        with self.lock:
+            if healthy:
+                self.idle.append((conn, time.monotonic()))
+            else:
+                self.open_count -= 1
+                self.counters['discarded'] += 1
+            self.lock.notify_all()
+        if not healthy:
+            self._discard(conn)
+
+    def discard(self, conn):
+        with self.lock:
+            self.open_count -= 1
+            self.counters['discarded'] += 1
+            self.lock.notify_all()
+        self._discard(conn)
+
+    def stats(self):
+        with self.lock:
+            idle = len(self.idle)
+            return dict(self.counters, size=self.max_size, open=self.open_count,
+                        idle=idle, in_use=self.open_count - idle)
+
+db_pool = ConnectionPool(DB_CONFIG)
@@ -1,100 +1,538 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session
+from flask import Flask, render_template, jsonify, request, redirect, url_for, session, g, Response
+from flask.json.provider import DefaultJSONProvider
 import pymysql.cursors
 from datetime import date, datetime, timedelta, time
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-import ctypes
+import csv
+import io
+import json
+import logging
 import os
 import random
+import threading
+from time import monotonic
 from dotenv import load_dotenv
 
 # --- 1. SETUP ---
 load_dotenv()
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+log = logging.getLogger(__name__)
 app = Flask(__name__, template_folder='templates', static_folder='static')
 app.secret_key = 'super_secret_key_for_session_management' 
 
-# --- 2. LOAD C++ BRAIN (DIAGNOSTIC BLOCK) ---
-base_dir = os.path.abspath(os.path.dirname(__file__))
+# --- 2. LOAD C++ BRAIN ---
+# (Loading, signatures and the RouteEngine wrapper live in core_bridge.py)
+from core_bridge import core_lib, RouteEngine, snapshot_stamp
+from seat_inventory import seat_inventory
+from station_index import StationIndex
 
-# Try loading .dll first (Windows), then .so (Linux/Mac)
-lib_path_win = os.path.join(base_dir, "core_logic", "core_logic.dll")
-lib_path_nix = os.path.join(base_dir, "core_logic", "core_logic.so")
+# --- 3. DEFINE C++ INTERFACE ---
+# (see core_bridge.py)
 
-core_lib = None
-try:
-    print(f"DEBUG: Attempting to load C++ module from:")
-    print(f"DEBUG: Win path: {lib_path_win}")
-    print(f"DEBUG: Nix path: {lib_path_nix}")
-    
-    if os.path.exists(lib_path_win):
-        print("DEBUG: Windows file exists. Trying to load...")
-        core_lib = ctypes.CDLL(lib_path_win) # <-- This is where it's failing
-        print(f"SUCCESS: C++ Logic Loaded from {lib_path_win}")
-        
-    elif os.path.exists(lib_path_nix):
-        print("DEBUG: Linux/Mac file exists. Trying to load...")
-        core_lib = ctypes.CDLL(lib_path_nix)
-        print(f"SUCCESS: C++ Logic Loaded from {lib_path_nix}")
-        
-    else:
-        # This is the "Offline" error you *think* you're seeing
-        print(f"---!!! CRITICAL ERROR: FILE NOT FOUND !!!---")
-        print("   os.path.exists() returned FALSE.")
-        print("   The file 'core_logic.dll' or '.so' is not in the 'core_logic' folder.")
-        
-except OSError as e:
-    # This is the "Load Failed" error I *know* you are seeing
-    print(f"---!!! CRITICAL ERROR: FILE LOAD FAILED !!!---")
-    print(f"   The file was FOUND, but Python could not load it.")
-    print(f"   THIS IS THE REAL ERROR: {e}")
-    print("   This is almost always a 32-bit vs. 64-bit mismatch between Python and G++.")
+# --- 4. DATABASE CONFIG ---
+# (DB_CONFIG and the shared connection pool live in db.py)
+from db import db_pool
+from cache import response_cache
+from migrate import explain_full_scans
+import metrics
+from metrics import timed, GRAPH_SIZE
 
-except Exception as e:
-    print(f"---!!! CRITICAL ERROR: UNKNOWN FAILURE !!!---")
-    print(f"   An unexpected error occurred: {e}")
+def get_db_connection():
+    # Borrowed from the pool; conn.close() hands it back
+    try:
+        with timed('db'): return db_pool.connection()
+    except Exception as err: log.error("DB Error: %s", err); return None
 
-# --- 3. DEFINE C++ INTERFACE ---
-class BookingResult(ctypes.Structure):
-    _fields_ = [("seat_id", ctypes.c_int),
-                ("status", ctypes.c_char * 5),
-                ("seat_number", ctypes.c_char * 10),
-                ("berth_type", ctypes.c_char * 15)]
+# --- 4b. RESIDENT ROUTE GRAPH ---
+# The C++ graph is built once and kept between searches as an immutable
+# RouteEngine, tagged with the timetable version it was built from. The
+# version is a row in Route_Graph_Version, so every worker process sees it:
+# each change to Routes bumps it in the same transaction, and each process
+# reads it (one primary-key lookup) at most every ROUTE_CHECK_SECONDS,
+# building a fresh engine and swapping it in when it has moved. Searches
+# themselves take no lock: each one grabs the current engine and queries
+# it, so any number can run at once.
+#
+# With ROUTE_SNAPSHOT set, worker processes share one graph: the engine is
+# opened from that snapshot file (mapped read-only, so the page cache holds
+# the only copy) instead of being built from MySQL in every process. The
+# file records the version it was built from; the first process to see a
+# newer version builds and publishes a new snapshot, the others reopen it.
+# After changing Routes or Train_Stops outside the app, run
+# `flask reload-routes`.
+#
+# The engine also holds every train's run from Train_Stops, which the
+# search uses to list alternative itineraries leg by leg.
+ROUTE_GRAPH = {'version': None, 'engine': None, 'checked_at': 0.0}
+DEFAULT_MAX_TRANSFERS = 3
+ROUTE_SNAPSHOT = os.getenv('ROUTE_SNAPSHOT')
+ROUTE_CHECK_SECONDS = 1.0
+route_graph_lock = threading.Lock() # Held by the one request checking or rebuilding
+
+ROUTE_VERSION_QUERY = "SELECT version FROM Route_Graph_Version WHERE id = 1"
+
+def read_route_version(conn):
+    cursor = conn.cursor()
+    cursor.execute(ROUTE_VERSION_QUERY)
+    row = cursor.fetchone()
+    return row['version'] if row else 0
+
+def bump_route_version(cursor):
+    # In the transaction that changes Routes or Train_Stops
+    cursor.execute("INSERT INTO Route_Graph_Version (id, version) VALUES (1, 1) "
+                   "ON DUPLICATE KEY UPDATE version = version + 1")
+
+def invalidate_route_graph():
+    # After the commit that bumped the version: this process rechecks now
+    ROUTE_GRAPH['checked_at'] = 0.0
+    response_cache.invalidate(ROUTES_TAG) # Cached searches hold old paths
+
+def time_to_minutes(t):
+    # MySQL TIME columns come back from pymysql as `timedelta`
+    return int(t.total_seconds() / 60)
+
+def parse_clock(value):
+    """'HH:MM' -> minutes since midnight, or None if it isn't a valid time."""
+    try: parsed = datetime.strptime(value, '%H:%M')
+    except ValueError: return None
+    return parsed.hour * 60 + parsed.minute
+
+# Station IDs are interned in SQL (row number in station_code order), so the
+# edge columns can be handed to C++ exactly as the cursor returns them.
+ROUTE_EDGES_QUERY = """
+WITH station_ids AS (
+    SELECT station_code, ROW_NUMBER() OVER (ORDER BY station_code) - 1 AS station_id FROM Stations
+)
+SELECT a.station_id, b.station_id,
+       TIME_TO_SEC(r.departure_time) DIV 60, TIME_TO_SEC(r.arrival_time) DIV 60
+FROM Routes r
+JOIN station_ids a ON r.start_station_code = a.station_code
+JOIN station_ids b ON r.end_station_code = b.station_code
+WHERE r.departure_time IS NOT NULL AND r.arrival_time IS NOT NULL
+"""
+
+TRAIN_RUNS_QUERY = """
+WITH station_ids AS (
+    SELECT station_code, ROW_NUMBER() OVER (ORDER BY station_code) - 1 AS station_id FROM Stations
+)
+SELECT ts.train_number, s.station_id,
+       TIME_TO_SEC(ts.arrival_time) DIV 60, TIME_TO_SEC(ts.departure_time) DIV 60
+FROM Train_Stops ts
+JOIN station_ids s ON ts.station_code = s.station_code
+ORDER BY ts.train_number, ts.stop_sequence
+"""
+
+def train_runs(rows):
+    """TRAIN_RUNS_QUERY rows -> (train numbers, legs) for RouteEngine.
+
+    A leg is one hop between consecutive stops. Its times count from
+    midnight of the day the run starts: a stop time earlier than the one
+    before it is the next day. A stop with neither time breaks the run there.
+    """
+    trains = []
+    legs = ([], [], [], [], []) # train ID, from, to, departure, arrival
+    current = None
+    for train_number, station, arrival, departure in rows:
+        if train_number != current:
+            current = train_number
+            trains.append(train_number)
+            day = 0
+            last = None
+            previous = None # (station, departure) of the stop before
+        times = []
+        for t in (arrival, departure):
+            if t is not None:
+                while last is not None and t + day < last: day += 1440
+                last = t + day
+                t = last
+            times.append(t)
+        arrival, departure = times
+        if arrival is None: arrival = departure # First and last stops often have only one
+        if departure is None: departure = arrival
+        if previous and previous[1] is not None and arrival is not None:
+            for column, value in zip(legs, (len(trains) - 1, previous[0], station, previous[1], arrival)):
+                column.append(value)
+        previous = (station, departure)
+    return trains, legs
+
+def build_route_engine(conn, version):
+    """Builds a new RouteEngine from Routes and Train_Stops in one FFI call."""
+    cursor = conn.cursor(pymysql.cursors.Cursor) # plain tuples, no per-row dicts
+    cursor.execute("SELECT station_code FROM Stations ORDER BY station_code")
+    codes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(ROUTE_EDGES_QUERY)
+    rows = cursor.fetchall()
+    from_ids, to_ids, dep_mins, arr_mins = zip(*rows) if rows else ((), (), (), ())
+    cursor.execute(TRAIN_RUNS_QUERY)
+    trains, legs = train_runs(cursor.fetchall())
+    return RouteEngine(codes, from_ids, to_ids, dep_mins, arr_mins, version, trains, legs)
+
+def load_route_graph(conn, version):
+    """A new engine: the published snapshot when another process (or the
+    CLI) has published this version, else built from Routes and published."""
+    engine = None
+    if ROUTE_SNAPSHOT and snapshot_stamp(ROUTE_SNAPSHOT):
+        try:
+            engine = RouteEngine.open_snapshot(ROUTE_SNAPSHOT)
+            if engine.version < version: engine = None # Published before the last change
+        except RuntimeError as e: log.warning("%s; building the route graph from Routes", e)
+    if engine is None:
+        engine = build_route_engine(conn, version)
+        if ROUTE_SNAPSHOT:
+            try: engine.publish_snapshot(ROUTE_SNAPSHOT)
+            except OSError as e: log.error("Route snapshot not published: %s", e)
+    GRAPH_SIZE.set("stations", value=len(engine.codes))
+    GRAPH_SIZE.set("edges", value=engine.edge_count)
+    GRAPH_SIZE.set("trains", value=len(engine.trains))
+    GRAPH_SIZE.set("version", value=engine.version)
+    return engine
+
+def route_graph_checked():
+    return ROUTE_GRAPH['engine'] is not None and monotonic() - ROUTE_GRAPH['checked_at'] < ROUTE_CHECK_SECONDS
+
+def get_route_engine(conn=None):
+    """Returns the current engine. At most every ROUTE_CHECK_SECONDS it
+    first reads the timetable version, rebuilding the engine if another
+    process (or this one) changed Routes, or reopening the snapshot if
+    another process published a new one. Without `conn`, one is borrowed
+    only for that check.
+
+    Only the first search ever waits: while one request checks or
+    rebuilds, the others keep querying the engine they have."""
+    engine = ROUTE_GRAPH['engine']
+    if route_graph_checked(): return engine
+    if not route_graph_lock.acquire(blocking=engine is None):
+        return engine # Someone else is checking it
+    try:
+        if route_graph_checked(): return ROUTE_GRAPH['engine'] # Another request checked while we waited
+        engine = ROUTE_GRAPH['engine']
+        borrowed = get_db_connection() if conn is None else None
+        try:
+            try:
+                version = read_route_version(conn or borrowed)
+            except Exception as e:
+                if engine is None: raise
+                log.warning("Route version check failed, keeping graph version %s: %s", engine.version, e)
+                ROUTE_GRAPH['checked_at'] = monotonic()
+                return engine
+            if (engine is None or engine.version != version
+                    or (ROUTE_SNAPSHOT and snapshot_stamp(ROUTE_SNAPSHOT) != engine.source)):
+                engine = load_route_graph(conn or borrowed, version)
+                ROUTE_GRAPH['engine'] = engine
+            ROUTE_GRAPH['version'] = version
+            ROUTE_GRAPH['checked_at'] = monotonic()
+            return engine
+        finally:
+            if borrowed: borrowed.close()
+    finally:
+        route_graph_lock.release()
+
+@app.cli.command("build-route-snapshot")
+def build_route_snapshot_command():
+    """Compile Routes/Stations into the ROUTE_SNAPSHOT file the workers map."""
+    if not ROUTE_SNAPSHOT:
+        print("Set ROUTE_SNAPSHOT to the snapshot path first.")
+        return
+    conn = get_db_connection()
+    try:
+        engine = build_route_engine(conn, read_route_version(conn))
+        engine.publish_snapshot(ROUTE_SNAPSHOT)
+        print(f"Route snapshot written to {ROUTE_SNAPSHOT}: {len(engine.codes)} stations, "
+              f"{engine.edge_count} edges, {len(engine.trains)} trains (version {engine.version}).")
+    finally:
+        conn.close()
 
+@app.cli.command("reload-routes")
+def reload_routes_command():
+    """Bump the timetable version after editing Routes/Train_Stops by hand; every worker rebuilds."""
+    conn = get_db_connection()
+    try:
+        bump_route_version(conn.cursor())
+        conn.commit()
+        print(f"Route graph version is now {read_route_version(conn)}; workers pick it up within {ROUTE_CHECK_SECONDS:g}s.")
+    finally:
+        conn.close()
+    response_cache.invalidate(ROUTES_TAG)
+
+# Build the graph once at startup so the first search doesn't pay for it
 if core_lib:
-    # --- Seat Allocation Logic ---
-    core_lib.find_best_seat.argtypes = [
-        ctypes.POINTER(ctypes.c_int), 
-        ctypes.c_int, 
-        ctypes.c_int, 
-        ctypes.c_int,
-        ctypes.c_char_p 
-    ]
-    core_lib.find_best_seat.restype = BookingResult
-    
-    # --- Pathfinding Logic (NEW SIGNATURES) ---
-    core_lib.clear_graph.restype = None
-    core_lib.clear_graph.argtypes = []
-
-    core_lib.build_graph_with_time.restype = None
-    core_lib.build_graph_with_time.argtypes = [
-        ctypes.c_char_p, # station_a
-        ctypes.c_char_p, # station_b
-        ctypes.c_int,    # departure_minutes
-        ctypes.c_int     # arrival_minutes
-    ]
-    
-    core_lib.find_fastest_path.restype = ctypes.c_char_p
-    core_lib.find_fastest_path.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+    startup_conn = get_db_connection()
+    if startup_conn:
+        try:
+            get_route_engine(startup_conn)
+        except Exception as e:
+            log.error("C++ Graph Error: %s", e)
+        finally:
+            startup_conn.close()
 
+# --- 4c. SEAT AVAILABILITY INDEX ---
+# Seat_Availability holds CNF/RAC/WL counts per (train, date, class). Every
+# booking and cancellation adjusts it inside its own transaction, so the
+# queue lengths never need Tickets. Free seats are not a ticket count: a
+# seat is sold per segment, so two short journeys can share one seat and a
+# one-hop ticket leaves the rest of the run free. They are counted from
+# Seat_Reservations for the stretch asked about: the seats of the class
+# with no segment sold between the two stops (the whole run without them).
+def record_availability_change(cursor, train_number, journey_date, seat_class, cnf=0, rac=0, wl=0):
+    cursor.execute("""
+    INSERT INTO Seat_Availability (train_number, journey_date, seat_class, cnf_count, rac_count, wl_count)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE cnf_count = cnf_count + VALUES(cnf_count),
+                            rac_count = rac_count + VALUES(rac_count),
+                            wl_count = wl_count + VALUES(wl_count)
+    """, (train_number, journey_date, seat_class, cnf, rac, wl))
 
-# --- 4. DATABASE CONFIG ---
-DB_CONFIG = {
-    'host': '127.0.0.1', 'user': 'root', 'password': os.getenv('DB_PASSWORD'), 
-    'database': 'railway_management_system', 'cursorclass': pymysql.cursors.DictCursor
-}
-def get_db_connection():
-    try: return pymysql.connect(**DB_CONFIG)
-    except Exception as err: print(f"DB Error: {err}"); return None
+def availability_query(stretch_count):
+    """One row per class of each (train, date, from station, to station)
+    stretch; the parameters are availability_params() of the stretches."""
+    stretches = " UNION ALL ".join(
+        ["SELECT %s AS train_number, %s AS journey_date, %s AS from_code, %s AS to_code"] * stretch_count)
+    return f"""
+    SELECT q.train_number, q.journey_date, q.from_code, q.to_code, cap.coach_class, cap.total_seats,
+           (SELECT COUNT(DISTINCT sr.seat_id) FROM Coaches c
+            JOIN Seats s ON s.coach_id = c.coach_id
+            JOIN Seat_Reservations sr ON sr.seat_id = s.seat_id AND sr.journey_date = q.journey_date
+                                     AND sr.segment >= COALESCE(f.stop_sequence, 0)
+                                     AND sr.segment < COALESCE(t.stop_sequence, {MAX_SEGMENTS})
+            WHERE c.train_number = q.train_number AND c.coach_class = cap.coach_class) AS sold_seats,
+           COALESCE(a.rac_count, 0) AS rac_count, COALESCE(a.wl_count, 0) AS wl_count
+    FROM ({stretches}) q
+    JOIN (SELECT train_number, coach_class, SUM(total_berths) AS total_seats FROM Coaches
+          GROUP BY train_number, coach_class) cap ON cap.train_number = q.train_number
+    LEFT JOIN Train_Stops f ON f.train_number = q.train_number AND f.station_code = q.from_code
+    LEFT JOIN Train_Stops t ON t.train_number = q.train_number AND t.station_code = q.to_code
+    LEFT JOIN Seat_Availability a ON a.train_number = q.train_number AND a.seat_class = cap.coach_class
+                                 AND a.journey_date = q.journey_date
+    """
+
+def availability_params(stretches):
+    return [value for stretch in stretches for value in stretch]
+
+def get_availability(cursor, stretches):
+    """Availability for every (train_number, 'YYYY-MM-DD', from_code,
+    to_code) stretch in one query; None for either station means the end
+    of the run.
+
+    Returns {stretch: {class: {"available", "rac", "wl"}}}.
+    """
+    if not stretches: return {}
+    cursor.execute(availability_query(len(stretches)), availability_params(stretches))
+    return availability_from_rows(cursor.fetchall())
+
+def availability_from_rows(rows):
+    availability = {}
+    for row in rows:
+        stretch = (row['train_number'], str(row['journey_date']), row['from_code'], row['to_code'])
+        availability.setdefault(stretch, {})[row['coach_class']] = {
+            "available": max(int(row['total_seats']) - int(row['sold_seats']), 0),
+            "rac": row['rac_count'],
+            "wl": row['wl_count']
+        }
+    return availability
+
+def rebuild_availability(conn):
+    """Recomputes Seat_Availability from Tickets in one transaction."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Seat_Availability")
+    cursor.execute("""
+    INSERT INTO Seat_Availability (train_number, journey_date, seat_class, cnf_count, rac_count, wl_count)
+    SELECT b.train_number, b.journey_date, ti.seat_class,
+           SUM(ti.status = 'CNF'), SUM(ti.status = 'RAC'), SUM(ti.status = 'WL')
+    FROM Tickets ti JOIN Passengers p ON ti.passenger_id = p.passenger_id JOIN Bookings b ON p.pnr_number = b.pnr_number
+    WHERE ti.status IN ('CNF', 'RAC', 'WL')
+    GROUP BY b.train_number, b.journey_date, ti.seat_class
+    """)
+    rows = cursor.rowcount
+    conn.commit()
+    response_cache.invalidate('search')
+    return rows
+
+@app.cli.command("rebuild-availability")
+def rebuild_availability_command():
+    """Recompute the seat availability index from the ticket tables."""
+    conn = get_db_connection()
+    try:
+        print(f"Seat_Availability rebuilt: {rebuild_availability(conn)} rows.")
+    finally:
+        conn.close()
+
+# --- 4d. RESPONSE CACHE ---
+# PNR details and search responses come from cache.py until a write they
+# depend on commits: bookings, cancellations and promotions invalidate their
+# PNRs and the (train, date) availability, route edits every search. The
+# TTLs only bound writes made outside the app (seeding, manual SQL).
+PNR_CACHE_TTL = 300
+SEARCH_CACHE_TTL = 60
+ROUTES_TAG = 'routes'
+
+def pnr_tag(pnr):
+    return f"pnr:{pnr}"
+
+def availability_tag(train_number, journey_date):
+    # Dates arrive as strings from requests and as `date` from the database
+    return f"availability:{train_number}:{journey_date}"
+
+PNR_DETAILS_QUERY = """
+SELECT 
+    b.pnr_number, b.user_id, b.journey_date, b.booking_status, b.total_fare,
+    t.train_number, t.train_name,
+    p.name AS passenger_name, p.age, p.gender, p.seat_class,
+    ti.status AS ticket_status, ti.berth_type, 
+    s.seat_number,
+    c.coach_name
+FROM Bookings b
+JOIN Trains t ON b.train_number = t.train_number
+JOIN Passengers p ON b.pnr_number = p.pnr_number
+LEFT JOIN Tickets ti ON p.passenger_id = ti.passenger_id
+LEFT JOIN Seats s ON ti.seat_id = s.seat_id
+LEFT JOIN Coaches c ON s.coach_id = c.coach_id
+WHERE b.pnr_number = %s
+ORDER BY p.passenger_id
+"""
+
+def get_pnr_details(pnr):
+    """One row per passenger of a PNR ([] if unknown), cached. The rows are
+    copies, so callers may annotate them."""
+    rows = response_cache.get('pnr', pnr)
+    if rows is None:
+        stamp = response_cache.stamp('pnr', pnr_tag(pnr))
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(PNR_DETAILS_QUERY, (pnr,))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        response_cache.put('pnr', pnr, rows, stamp, PNR_CACHE_TTL)
+    return [dict(row) for row in rows]
+
+# --- 4e. DASHBOARD ROLLUPS ---
+# Daily_Stats keeps per-day booking counts, confirmed revenue and sign-ups.
+# The write paths adjust it in their own transactions, so the dashboard
+# reads a handful of rows instead of scanning Bookings and Users.
+DASHBOARD_DAYS = 7
+MAX_DASHBOARD_DAYS = 366
+
+def record_booking_stats(cursor, pnr_numbers, bookings=0, revenue=0):
+    """Adds `bookings` per PNR and `revenue` times its fare (1 when it becomes
+    CONFIRMED, -1 when it stops being) to the day each PNR was booked on."""
+    if not pnr_numbers: return
+    cursor.execute(f"""
+    INSERT INTO Daily_Stats (stat_date, bookings, confirmed_revenue)
+    SELECT DATE(booked_on), COUNT(*) * %s, COALESCE(SUM(total_fare), 0) * %s FROM Bookings
+    WHERE pnr_number IN ({", ".join(["%s"] * len(pnr_numbers))}) GROUP BY DATE(booked_on)
+    ON DUPLICATE KEY UPDATE bookings = bookings + VALUES(bookings),
+                            confirmed_revenue = confirmed_revenue + VALUES(confirmed_revenue)
+    """, (bookings, revenue, *pnr_numbers))
+
+def record_new_user(cursor, user_id):
+    cursor.execute("""
+    INSERT INTO Daily_Stats (stat_date, new_users) SELECT DATE(created_at), 1 FROM Users WHERE user_id = %s
+    ON DUPLICATE KEY UPDATE new_users = new_users + 1
+    """, (user_id,))
+
+def rebuild_daily_stats(conn):
+    """Recomputes Daily_Stats from Bookings and Users in one transaction."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Daily_Stats")
+    cursor.execute("""
+    INSERT INTO Daily_Stats (stat_date, bookings, confirmed_revenue, new_users)
+    SELECT stat_date, SUM(bookings), SUM(revenue), SUM(new_users) FROM (
+        SELECT DATE(booked_on) AS stat_date, COUNT(*) AS bookings,
+               COALESCE(SUM(CASE WHEN booking_status = 'CONFIRMED' THEN total_fare END), 0) AS revenue, 0 AS new_users
+        FROM Bookings GROUP BY DATE(booked_on)
+        UNION ALL
+        SELECT DATE(created_at), 0, 0, COUNT(*) FROM Users GROUP BY DATE(created_at)
+    ) days GROUP BY stat_date
+    """)
+    rows = cursor.rowcount
+    conn.commit()
+    return rows
+
+@app.cli.command("rebuild-daily-stats")
+def rebuild_daily_stats_command():
+    """Backfill the dashboard's daily rollups from the booking and user tables."""
+    conn = get_db_connection()
+    try:
+        print(f"Daily_Stats rebuilt: {rebuild_daily_stats(conn)} days.")
+    finally:
+        conn.close()
+
+# --- 4f. METRICS AND PROFILING ---
+# Every request's time is split into db / ffi / serialize / other (see
+# metrics.py) and served with the pool, cache and engine counters at /metrics.
+class TimedJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        with timed('serialize'): return super().response(*args, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+    g.profile = metrics.should_profile(request.endpoint, request.headers.get('X-Profile'))
+    if g.profile: metrics.start_profile()
+
+@app.after_request
+def finish_request_metrics(response):
+    seconds = metrics.finish_request(request.endpoint, response.status_code)
+    if g.get('profile'):
+        path = metrics.finish_profile(request.endpoint, g.profile, seconds)
+        if path and g.profile == 'requested': response.headers['X-Profile-Capture'] = os.path.basename(path)
+    return response
+
+def pool_metrics():
+    stats = db_pool.stats()
+    counters = [(f"railway_db_pool_{key}_total", "counter", f"Connection pool {key.replace('_', ' ')} since startup",
+                 [({}, stats[key])]) for key in ('checkouts', 'created', 'reused', 'waits', 'timeouts', 'discarded', 'wait_seconds')]
+    gauges = [(f"railway_db_pool_{key}", "gauge", f"Connection pool connections: {key.replace('_', ' ')}", [({}, stats[key])])
+              for key in ('size', 'open', 'idle', 'in_use')]
+    return counters + gauges
+
+def cache_metrics():
+    stats = response_cache.stats()
+    lookups = [({'namespace': namespace, 'result': result}, counts[result])
+               for namespace, counts in stats.items() if namespace != 'invalidations' for result in ('hits', 'misses')]
+    return [("railway_cache_lookups_total", "counter", "Response cache lookups by namespace and result", lookups),
+            ("railway_cache_invalidations_total", "counter", "Response cache tag invalidations", [({}, stats['invalidations'])])]
+
+metrics.register_collector(pool_metrics)
+metrics.register_collector(cache_metrics)
+
+@app.route("/metrics")
+def prometheus_metrics():
+    # Per process: with several workers, scrape each one
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# --- 4g. STATION INDEX ---
+# Autocomplete and nearest-station lookups are answered from memory (see
+# station_index.py). Stations are only edited outside the app (seeding, SQL),
+# so the index is reloaded once it is older than STATION_INDEX_TTL; while one
+# request reloads it, the others keep using the old one.
+STATION_INDEX = {'index': None, 'loaded_at': 0.0}
+STATION_INDEX_TTL = 300
+station_index_lock = threading.Lock()
+
+def get_station_index():
+    index = STATION_INDEX['index']
+    if index is not None and monotonic() - STATION_INDEX['loaded_at'] < STATION_INDEX_TTL:
+        return index
+    if not station_index_lock.acquire(blocking=index is None):
+        return index # Someone else is reloading it
+    try:
+        if STATION_INDEX['index'] is index: # Not reloaded while we waited
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT station_code, station_name, latitude, longitude FROM Stations")
+                STATION_INDEX['index'] = StationIndex(cursor.fetchall())
+                STATION_INDEX['loaded_at'] = monotonic()
+            finally:
+                conn.close()
+        return STATION_INDEX['index']
+    finally:
+        station_index_lock.release()
 
 # --- MIDDLEWARE ---
 def login_required(f):
@@ -108,11 +546,12 @@ def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session: return redirect(url_for('login'))
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT is_admin FROM Users WHERE user_id = %s", (session['user_id'],))
-        user = cursor.fetchone()
-        conn.close()
+        conn = get_db_connection() # A pooled connection, so this check is one round trip
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT is_admin FROM Users WHERE user_id = %s", (session['user_id'],))
+            user = cursor.fetchone()
+        finally: conn.close()
         if not user or not user['is_admin']: return "Access Denied", 403
         return f(*args, **kwargs)
     return decorated_function
@@ -158,27 +597,7 @@ def logout(): session.clear(); return redirect(url_for('index'))
 @login_required
 def seat_booking():
     pnr = request.args.get('pnr')
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = """
-    SELECT 
-        b.pnr_number, b.total_fare, b.train_number, b.booking_status, 
-        t.train_name,
-        p.name AS passenger_name, p.age, p.gender, p.seat_class,
-        ti.status as ticket_status, ti.berth_type, -- Added berth_type
-        s.seat_number, 
-        c.coach_name
-    FROM Bookings b
-    JOIN Passengers p ON b.pnr_number = p.pnr_number
-    JOIN Trains t ON b.train_number = t.train_number
-    LEFT JOIN Tickets ti ON p.passenger_id = ti.passenger_id
-    LEFT JOIN Seats s ON ti.seat_id = s.seat_id
-    LEFT JOIN Coaches c ON s.coach_id = c.coach_id
-    WHERE b.pnr_number = %s AND b.user_id = %s
-    """
-    cursor.execute(query, (pnr, session.get('user_id')))
-    booking_data = cursor.fetchall() 
-    conn.close()
+    booking_data = [row for row in get_pnr_details(pnr) if row['user_id'] == session.get('user_id')] if pnr else []
     
     if not booking_data: return "Booking not found", 404
     
@@ -193,30 +612,256 @@ def seat_booking():
     return render_template("seat-booking.html", booking=first_passenger_data)
 
 
+# Booking history is paged by seeking past the last (journey_date, pnr)
+# shown, newest first, so every page is one range read of
+# idx_bookings_user_date (whose entries end in the primary key) however far
+# back it is. The first condition bounds the range; the second skips the
+# rows of the boundary date already shown.
+BOOKINGS_PAGE_SIZE = 20
+USER_BOOKINGS_QUERY = """
+SELECT b.pnr_number, b.journey_date, b.total_fare, b.booking_status, t.train_name, t.train_number
+FROM Bookings b JOIN Trains t ON b.train_number = t.train_number
+WHERE b.user_id = %s {seek}
+ORDER BY b.journey_date DESC, b.pnr_number DESC LIMIT %s
+"""
+USER_BOOKINGS_SEEK = "AND b.journey_date <= %s AND (b.journey_date < %s OR b.pnr_number < %s)"
+
+def user_bookings_page(cursor, user_id, before=None, page_size=BOOKINGS_PAGE_SIZE):
+    """One page of a user's bookings older than `before` ((journey_date,
+    pnr) of the last one shown, None for the newest), plus the `before` of
+    the page after it, or None if this is the last."""
+    if before is None:
+        cursor.execute(USER_BOOKINGS_QUERY.format(seek=""), (user_id, page_size + 1))
+    else:
+        cursor.execute(USER_BOOKINGS_QUERY.format(seek=USER_BOOKINGS_SEEK),
+                       (user_id, before[0], before[0], before[1], page_size + 1))
+    bookings = cursor.fetchall()
+    if len(bookings) <= page_size: return bookings, None
+    bookings = bookings[:page_size]
+    return bookings, (bookings[-1]['journey_date'], bookings[-1]['pnr_number'])
+
 @app.route("/manage-bookings")
 @login_required
 def manage_bookings():
+    # ?before=YYYY-MM-DD,PNR: the page after the booking shown last
+    before = None
+    if request.args.get('before'):
+        try:
+            day, pnr = request.args['before'].split(',', 1)
+            before = (datetime.strptime(day, '%Y-%m-%d').date(), pnr)
+        except ValueError:
+            return "before must be YYYY-MM-DD,PNR", 400
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT b.pnr_number, b.journey_date, b.total_fare, b.booking_status, t.train_name, t.train_number FROM Bookings b JOIN Trains t ON b.train_number = t.train_number WHERE b.user_id = %s ORDER BY b.journey_date DESC", (session['user_id'],))
-    bookings = cursor.fetchall()
-    conn.close()
-    return render_template("manage-bookings.html", bookings=bookings)
+    try:
+        bookings, next_before = user_bookings_page(conn.cursor(), session['user_id'], before)
+    finally:
+        conn.close()
+    next_page = f"{next_before[0].isoformat()},{next_before[1]}" if next_before else None
+    return render_template("manage-bookings.html", bookings=bookings, next_page=next_page, first_page=before is None)
 
 @app.route("/admin/dashboard")
 @admin_required
 def admin_dashboard():
+    # Optional ?from=YYYY-MM-DD&to=YYYY-MM-DD for the trend table, default the last week
+    today = date.today()
+    try:
+        end_day = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+        start_day = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else end_day - timedelta(days=DASHBOARD_DAYS - 1)
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
+    if start_day > end_day or (end_day - start_day).days >= MAX_DASHBOARD_DAYS:
+        return f"Pick a range of 1 to {MAX_DASHBOARD_DAYS} days", 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(SUM(confirmed_revenue), 0) AS r, COALESCE(SUM(new_users), 0) AS u FROM Daily_Stats")
+        totals = cursor.fetchone()
+        first_day = min(start_day, today - timedelta(days=1))
+        cursor.execute("SELECT stat_date, bookings, confirmed_revenue, new_users FROM Daily_Stats WHERE stat_date BETWEEN %s AND %s",
+                       (first_day, max(end_day, today)))
+        by_day = {row['stat_date']: row for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+    empty = {'bookings': 0, 'confirmed_revenue': 0, 'new_users': 0}
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    trend = [by_day.get(day) or dict(empty, stat_date=day) for day in days]
+    stats = {'bookings_today': by_day.get(today, empty)['bookings'], 'total_revenue': totals['r'],
+             'total_users': int(totals['u']), 'bookings_yesterday': by_day.get(today - timedelta(days=1), empty)['bookings']}
+    return render_template("admin-dashboard.html", stats=stats, trend=trend, range_from=start_day, range_to=end_day,
+                           audit=[], tickets=[])
+
+@app.route("/admin/db_pool")
+@admin_required
+def admin_db_pool():
+    # Checkouts, reuse vs. new connections, waits and timeouts since startup
+    return jsonify(db_pool.stats())
+
+@app.route("/admin/cache")
+@admin_required
+def admin_cache():
+    # Hits and misses per namespace, invalidations since startup
+    return jsonify(response_cache.stats())
+
+# --- ADMIN: EXPORTS ---
+# /admin/export/<dataset>?format=csv|ndjson[&from=YYYY-MM-DD][&to=YYYY-MM-DD]
+# streams a whole table from an unbuffered (server-side) cursor: rows are
+# read, written and sent EXPORT_BATCH at a time, so memory stays the same
+# whatever the size of the table. The dates filter on the dataset's date
+# column, both ends inclusive.
+EXPORT_BATCH = 1000
+EXPORTS = {
+    # dataset: (query, date column)
+    'bookings': ("""SELECT pnr_number, user_id, train_number, journey_date, booking_status, total_fare,
+                           from_station_code, to_station_code, booked_on
+                    FROM Bookings {where} ORDER BY pnr_number""", "journey_date"),
+    'passengers': ("""SELECT p.passenger_id, p.pnr_number, b.train_number, b.journey_date,
+                             p.name, p.age, p.gender, p.seat_class
+                      FROM Passengers p JOIN Bookings b ON p.pnr_number = b.pnr_number
+                      {where} ORDER BY p.passenger_id""", "b.journey_date"),
+    'audit': ("""SELECT log_id, user_id, action_type, details, action_timestamp
+                 FROM audit_log {where} ORDER BY log_id""", "action_timestamp"),
+}
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def export_chunks(conn, query, params, fmt):
+    """Yields the export a batch of rows at a time; owns (and returns) conn."""
+    finished = False
+    try:
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        cursor.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        if fmt == 'csv':
+            out = io.StringIO()
+            csv.writer(out).writerow(columns)
+            yield out.getvalue()
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH)
+            if not rows: break
+            out = io.StringIO()
+            if fmt == 'csv':
+                csv.DictWriter(out, fieldnames=columns).writerows(rows)
+            else:
+                for row in rows: out.write(json.dumps(row, default=str) + "\n")
+            yield out.getvalue()
+        finished = True
+    finally:
+        # A download stopped half-way leaves unread rows on the connection
+        if finished: conn.close()
+        else: conn.discard()
+
+@app.route("/admin/export/<dataset>")
+@admin_required
+def admin_export(dataset):
+    if dataset not in EXPORTS:
+        return jsonify({"success": False, "message": f"dataset must be one of: {', '.join(EXPORTS)}."}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"success": False, "message": "format must be csv or ndjson."}), 400
+    query, date_column = EXPORTS[dataset]
+    conditions, params = [], []
+    try:
+        if request.args.get('from'):
+            conditions.append(f"{date_column} >= %s")
+            params.append(datetime.strptime(request.args['from'], '%Y-%m-%d').date())
+        if request.args.get('to'):
+            conditions.append(f"{date_column} < %s") # Inclusive of a whole day for timestamps too
+            params.append(datetime.strptime(request.args['to'], '%Y-%m-%d').date() + timedelta(days=1))
+    except ValueError:
+        return jsonify({"success": False, "message": "from and to must be YYYY-MM-DD."}), 400
+    query = query.format(where=("WHERE " + " AND ".join(conditions)) if conditions else "")
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"success": False, "message": "Database unavailable."}), 503
+    filename = f"{dataset}-{date.today().isoformat()}.{fmt}"
+    return Response(export_chunks(conn, query, params, fmt),
+                    mimetype=EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+# --- ADMIN: ROUTES ---
+# Every change here bumps the route graph version so searches pick it up.
+def format_time_of_day(t):
+    # TIME (timedelta) -> "HH:MM" for <input type="time">
+    if t is None: return ''
+    mins = time_to_minutes(t)
+    return f"{mins // 60:02d}:{mins % 60:02d}"
+
+def get_station_choices(cursor):
+    cursor.execute("SELECT station_code AS station_id, station_code, station_name FROM Stations ORDER BY station_name")
+    return cursor.fetchall()
+
+@app.route("/admin/routes")
+@admin_required
+def manage_routes():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as c FROM Bookings WHERE DATE(booked_on) = CURDATE()")
-    today = cursor.fetchone()['c']
-    cursor.execute("SELECT SUM(total_fare) as r FROM Bookings WHERE booking_status='CONFIRMED'")
-    rev = cursor.fetchone()['r']
-    cursor.execute("SELECT COUNT(*) as u FROM Users")
-    users = cursor.fetchone()['u']
-    stats = {'bookings_today': today, 'total_revenue': rev, 'total_users': users, 'bookings_yesterday': 0}
+    cursor.execute("""
+    SELECT r.route_id, r.start_station_code AS start_code, s1.station_name AS start_name,
+           r.end_station_code AS end_code, s2.station_name AS end_name,
+           r.departure_time, r.arrival_time, r.distance_km
+    FROM Routes r
+    LEFT JOIN Stations s1 ON r.start_station_code = s1.station_code
+    LEFT JOIN Stations s2 ON r.end_station_code = s2.station_code
+    ORDER BY r.route_id
+    """)
+    routes = cursor.fetchall()
     conn.close()
-    return render_template("admin-dashboard.html", stats=stats, audit=[], tickets=[])
+    for route in routes:
+        route['departure_time'] = format_time_of_day(route['departure_time'])
+        route['arrival_time'] = format_time_of_day(route['arrival_time'])
+    return render_template("admin/manage-routes.html", routes=routes)
+
+@app.route("/admin/routes/add", methods=['GET', 'POST'])
+@admin_required
+def add_route():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if request.method == 'POST':
+            f = request.form
+            cursor.execute("INSERT INTO Routes (start_station_code, end_station_code, departure_time, arrival_time, distance_km) VALUES (%s, %s, %s, %s, %s)", (f['start_station_id'], f['end_station_id'], f['departure_time'], f['arrival_time'], f['distance_km']))
+            bump_route_version(cursor)
+            conn.commit()
+            invalidate_route_graph()
+            return redirect(url_for('manage_routes'))
+        return render_template("admin/edit-route.html", route=None, stations=get_station_choices(cursor))
+    finally: conn.close()
+
+@app.route("/admin/routes/<int:route_id>/edit", methods=['GET', 'POST'])
+@admin_required
+def edit_route(route_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if request.method == 'POST':
+            f = request.form
+            cursor.execute("UPDATE Routes SET start_station_code=%s, end_station_code=%s, departure_time=%s, arrival_time=%s, distance_km=%s WHERE route_id=%s", (f['start_station_id'], f['end_station_id'], f['departure_time'], f['arrival_time'], f['distance_km'], route_id))
+            bump_route_version(cursor)
+            conn.commit()
+            invalidate_route_graph()
+            return redirect(url_for('manage_routes'))
+        cursor.execute("SELECT route_id, start_station_code AS start_station_id, end_station_code AS end_station_id, departure_time, arrival_time, distance_km FROM Routes WHERE route_id = %s", (route_id,))
+        route = cursor.fetchone()
+        if not route: return "Route not found", 404
+        route['departure_time'] = format_time_of_day(route['departure_time'])
+        route['arrival_time'] = format_time_of_day(route['arrival_time'])
+        return render_template("admin/edit-route.html", route=route, stations=get_station_choices(cursor))
+    finally: conn.close()
+
+@app.route("/admin/routes/<int:route_id>/delete", methods=['POST'])
+@admin_required
+def delete_route(route_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM Routes WHERE route_id = %s", (route_id,))
+        bump_route_version(cursor)
+        conn.commit()
+        invalidate_route_graph()
+        return redirect(url_for('manage_routes'))
+    finally: conn.close()
 
 # --- 6. API ROUTES (C++ INTEGRATED) ---
 
@@ -228,6 +873,7 @@ def api_register():
         cursor = conn.cursor()
         hashed = generate_password_hash(data['password'])
         cursor.execute("INSERT INTO Users (username, email, password_hash) VALUES (%s, %s, %s)", (data['username'], data['email'], hashed))
+        record_new_user(cursor, cursor.lastrowid)
         conn.commit()
         return jsonify({"success": True})
     except pymysql.err.IntegrityError as e:
@@ -239,143 +885,459 @@ def api_register():
     finally: 
         conn.close()
 
+def pnr_status_rows(rows):
+    # PNR_DETAILS_QUERY rows (copies) as /api/pnr_status shows them
+    for row in rows:
+        del row['user_id']
+        row['from_station'] = 'Start Station' # Mock data
+        row['to_station'] = 'End Station'     # Mock data
+        row['departure_time'] = '10:00 AM'  # Mock data
+        row['arrival_time'] = '06:00 PM'    # Mock data
+        if isinstance(row.get('journey_date'), date):
+            row['journey_date'] = row['journey_date'].strftime('%Y-%m-%d')
+    return rows
+
 @app.route("/api/pnr_status")
 def api_pnr_status():
     pnr = request.args.get('pnr', '').strip()
     if not pnr:
         return jsonify({"success": False, "message": "PNR number is required."}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = """
-    SELECT 
-        b.pnr_number, b.journey_date, b.booking_status, b.total_fare,
-        t.train_number, t.train_name,
-        p.name AS passenger_name, p.age, p.gender,
-        ti.status AS ticket_status, ti.berth_type, 
-        s.seat_number,
-        c.coach_name
-    FROM Bookings b
-    JOIN Trains t ON b.train_number = t.train_number
-    JOIN Passengers p ON b.pnr_number = p.pnr_number
-    LEFT JOIN Tickets ti ON p.passenger_id = ti.passenger_id
-    LEFT JOIN Seats s ON ti.seat_id = s.seat_id
-    LEFT JOIN Coaches c ON s.coach_id = c.coach_id
-    WHERE b.pnr_number = %s
-    """
-    
     try:
-        cursor.execute(query, (pnr,))
-        results = cursor.fetchall()
-        conn.close()
+        results = pnr_status_rows(get_pnr_details(pnr))
         
         if not results:
             return jsonify({"success": False, "message": "PNR not found."}), 404
-            
-        for row in results:
-            row['from_station'] = 'Start Station' # Mock data
-            row['to_station'] = 'End Station'     # Mock data
-            row['departure_time'] = '10:00 AM'  # Mock data
-            row['arrival_time'] = '06:00 PM'    # Mock data
-            if isinstance(row.get('journey_date'), date):
-                row['journey_date'] = row['journey_date'].strftime('%Y-%m-%d')
         
         return jsonify({"success": True, "details": results})
 
     except Exception as e:
-        print(f"PNR Status Error: {e}")
-        conn.close()
+        log.error("PNR Status Error: %s", e)
         return jsonify({"success": False, "message": "Database error."}), 500
 
+MAX_SEARCH_DATES = 14
+DEFAULT_ALTERNATIVES = 3
+MAX_ALTERNATIVES = 10
+
+def clock_text(minutes):
+    # Minutes from midnight of the search day -> "HH:MM", "+N" on later days
+    text = f"{minutes % 1440 // 60:02d}:{minutes % 60:02d}"
+    return text + (f" +{minutes // 1440}" if minutes >= 1440 else "")
+
+def shift_date(day, days):
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+def parse_search_args(args):
+    """/api/search_trains arguments -> (search, None), or (None, error message)."""
+    depart_after = args.get('depart_after', '').strip()
+    search = {
+        "from": args.get('from', '').strip(),
+        "to": args.get('to', '').strip(),
+        "depart_minutes": 0,
+        "max_transfers": args.get('max_transfers', DEFAULT_MAX_TRANSFERS, type=int),
+        "alternatives": args.get('alternatives', DEFAULT_ALTERNATIVES, type=int),
+    }
+    if depart_after:
+        search['depart_minutes'] = parse_clock(depart_after)
+        if search['depart_minutes'] is None: return None, "depart_after must be HH:MM."
+    if not 1 <= search['alternatives'] <= MAX_ALTERNATIVES:
+        return None, f"alternatives must be 1 to {MAX_ALTERNATIVES}."
+    # Journey date(s) for seat availability: "date=YYYY-MM-DD[,YYYY-MM-DD...]", default today
+    try:
+        search['journey_dates'] = [datetime.strptime(d.strip(), '%Y-%m-%d').date().isoformat()
+                                   for d in args.get('date', '').split(',') if d.strip()] or [date.today().isoformat()]
+    except ValueError:
+        return None, "date must be YYYY-MM-DD."
+    if len(search['journey_dates']) > MAX_SEARCH_DATES:
+        return None, f"At most {MAX_SEARCH_DATES} dates per search."
+    return search, None
+
+def search_cache_key(search, version):
+    # The graph version keeps a worker still on the old timetable from
+    # answering (and caching) under the same key as the new one
+    return (f"v{version}|{search['from']}|{search['to']}|{search['depart_minutes']}|{search['max_transfers']}|"
+            f"{search['alternatives']}|{','.join(search['journey_dates'])}")
+
+def search_itineraries(engine, search):
+    # One profile scan yields every alternative, up to max_transfers changes
+    if engine.trains:
+        return engine.find_itineraries(search['from'], search['to'], search['depart_minutes'],
+                                       search['alternatives'], search['max_transfers'])
+    # No train runs in Train_Stops yet: the one earliest journey over Routes
+    return engine.earliest_journey(search['from'], search['to'], search['depart_minutes'], search['max_transfers'])
+
+def trains_query(train_count):
+    return f"SELECT train_number, train_name, base_fare FROM Trains WHERE train_number IN ({', '.join(['%s'] * train_count)})"
+
+def search_lookups(itineraries, journey_dates):
+    """The trains the itineraries use and the stretches to show
+    availability for: every leg on the first date, the first leg on each."""
+    train_numbers = sorted({leg['train_number'] for it in itineraries for leg in it['legs'] if leg['train_number']})
+    stretches = set()
+    for it in itineraries:
+        for leg in it['legs']:
+            if leg['train_number']: stretches.add(leg_stretch(leg, journey_dates[0]))
+        if it['legs'][0]['train_number']:
+            stretches.update(leg_stretch(it['legs'][0], d) for d in journey_dates)
+    return train_numbers, sorted(stretches)
+
+def leg_stretch(leg, journey_date):
+    # A leg's train started its run on the search date plus its run day
+    return (leg['train_number'], shift_date(journey_date, leg['run_day']), leg['from'], leg['to'])
+
+def search_results(itineraries, trains, availability, journey_dates):
+    """The /api/search_trains response: trains maps train_number to its
+    Trains row, availability is get_availability() for search_lookups().
+    Legs of a Routes-only journey have no train, name or fare."""
+    no_train = {"train_name": None, "base_fare": 0}
+    results = []
+    for it in itineraries:
+        legs = [{
+            "train_number": leg['train_number'],
+            "train_name": trains.get(leg['train_number'], no_train)['train_name'],
+            "from": leg['from'],
+            "to": leg['to'],
+            "departure_time": clock_text(leg['departure_minutes']),
+            "arrival_time": clock_text(leg['arrival_minutes']),
+            "journey_date": shift_date(journey_dates[0], leg['run_day']),
+            "seat_availability": availability.get(leg_stretch(leg, journey_dates[0]), {}),
+        } for leg in it['legs']]
+        first = it['legs'][0]
+        result = {
+            "train_number": first['train_number'],
+            "train_name": legs[0]['train_name'],
+            "departure_time": clock_text(it['departure_minutes']),
+            "arrival_time": clock_text(it['arrival_minutes']),
+            "duration_minutes": it['duration_minutes'],
+            "transfers": it['transfers'],
+            "base_fare": sum(float(trains.get(leg['train_number'], no_train)['base_fare']) for leg in it['legs']),
+            "seat_availability": legs[0]['seat_availability'],
+            "fastest_path_found": " -> ".join([legs[0]['from']] + [leg['to'] for leg in legs]),
+            "legs": legs,
+        }
+        if len(journey_dates) > 1:
+            result["availability_by_date"] = {
+                d: availability.get(leg_stretch(first, d), {}) for d in journey_dates
+            }
+        results.append(result)
+    return results
+
 # ---!!! THIS IS THE FINAL UPDATED SEARCH API !!!---
 @app.route("/api/search_trains")
 def api_search_trains():
-    from_s = request.args.get('from', '').strip()
-    to_s = request.args.get('to', '').strip()
+    """Alternative itineraries, soonest first, each with its legs:
+    /api/search_trains?from=NDLS&to=BCT[&date=YYYY-MM-DD,...][&depart_after=HH:MM]
+    [&alternatives=3][&max_transfers=3]. The train fields at the top of a
+    result describe its first leg."""
+    search, error = parse_search_args(request.args)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+    if not core_lib:
+        return jsonify({"success": False, "message": "C++ Module is OFFLINE"}), 500
+
+    try:
+        engine = get_route_engine()
+    except Exception as e:
+        log.error("C++ Graph Error: %s", e)
+        return jsonify({"success": False, "message": f"C++ Error: {e}"}), 500
+    cache_key = search_cache_key(search, engine.version)
+    cached = response_cache.get('search', cache_key)
+    if cached is not None: return jsonify(cached)
+    stamp = response_cache.stamp('search', ROUTES_TAG)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
-    path_str = "Calculation Error"
-    
-    if core_lib:
+    try:
         try:
-            # 1. DEFINE YOUR REAL COLUMN NAMES
-            # (These are from your 'DESCRIBE Routes' command)
-            STATION_A_COL = "start_station_code"
-            STATION_B_COL = "end_station_code"
-            
-            # 2. Build the query string with new time columns
-            sql_query = f"SELECT {STATION_A_COL}, {STATION_B_COL}, departure_time, arrival_time FROM Routes"
-            
-            cursor.execute(sql_query)
-            
-            # 3. Call C++: Clear the old graph
-            core_lib.clear_graph()
-
-            # 4. Call C++: Build the new graph
-            for r in cursor.fetchall():
-                dep_time = r['departure_time']
-                arr_time = r['arrival_time']
-
-                # --- CRITICAL: Check for NULL data ---
-                if not dep_time or not arr_time:
-                    print(f"Warning: Skipping route {r[STATION_A_COL]} -> {r[STATION_B_COL]} due to missing time data.")
-                    continue
+            itineraries = search_itineraries(engine, search)
+        except Exception as e:
+            log.error("C++ Graph Error: %s", e)
+            return jsonify({"success": False, "message": f"C++ Error: {e}"}), 500
 
-                # Convert Python's `timedelta` (for TIME) to minutes
-                dep_minutes = int(dep_time.total_seconds() / 60)
-                arr_minutes = int(arr_time.total_seconds() / 60)
-
-                core_lib.build_graph_with_time(
-                    r[STATION_A_COL].encode('utf-8'), 
-                    r[STATION_B_COL].encode('utf-8'), 
-                    dep_minutes, 
-                    arr_minutes
-                )
-            
-            # 5. Call C++: Find the fastest path
-            res = core_lib.find_fastest_path(from_s.encode('utf-8'), to_s.encode('utf-8'))
-            path_str = res.decode('utf-8')
+        cursor = conn.cursor()
+        train_numbers, stretches = search_lookups(itineraries, search['journey_dates'])
+        stamp.add(*sorted({availability_tag(t, d) for t, d, _, _ in stretches}))
+        trains = {}
+        if train_numbers:
+            cursor.execute(trains_query(len(train_numbers)), train_numbers)
+            trains = {t['train_number']: t for t in cursor.fetchall()}
+        # Free seats over each leg's stretch, for every leg and date, in one query
+        availability = get_availability(cursor, stretches)
+        results = search_results(itineraries, trains, availability, search['journey_dates'])
+        response_cache.put('search', cache_key, results, stamp, SEARCH_CACHE_TTL)
+        return jsonify(results)
+    finally:
+        conn.close()
 
-        except Exception as e:
-            print(f"C++ Graph Error: {e}")
-            path_str = f"C++ Error: {e}"
+@app.route("/api/paths", methods=['GET', 'POST'])
+def api_paths():
+    """Many answers from one graph traversal.
+
+    GET  /api/paths?from=DEL&to=AGR,JAI,BHO   one origin, many destinations
+    POST /api/paths {"pairs": [["DEL", "AGR"], ["MUM", "GOA"]]}
+    """
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        pairs = [(str(a).strip(), str(b).strip()) for a, b in data.get('pairs', [])]
     else:
-        path_str = "C++ Module is OFFLINE"
+        from_s = request.args.get('from', '').strip()
+        pairs = [(from_s, to_s.strip()) for to_s in request.args.get('to', '').split(',') if to_s.strip()]
+    if not pairs:
+        return jsonify({"success": False, "message": "At least one from/to pair is required."}), 400
+    if not core_lib:
+        return jsonify({"success": False, "message": "C++ Module is OFFLINE"}), 500
 
-    # --- This part is just for mock train results ---
-    cursor.execute("SELECT * FROM Trains LIMIT 3") 
-    trains = cursor.fetchall()
-    results = []
-    for t in trains:
-        results.append({
-            "train_number": t['train_number'],
-            "train_name": t['train_name'],
-            "departure_time": "10:00 AM", # You would get this from the path
-            "arrival_time": "06:00 PM",   # You would get this from the path
-            "base_fare": float(t['base_fare']),
-            "seat_availability": {"Sleeper": {"available": 50, "rac":0, "wl":0}},
-            "fastest_path_found": path_str # <-- Display the real C++ result
-        })
-    conn.close()
-    return jsonify(results)
+    conn = get_db_connection()
+    try:
+        results = get_route_engine(conn).find_paths(pairs)
+        return jsonify({"success": True, "results": results})
+    except Exception as e:
+        log.error("C++ Graph Error: %s", e)
+        return jsonify({"success": False, "message": str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route("/api/stations")
+def api_stations():
+    """Autocomplete: /api/stations?q=new%20del&limit=10 (codes, names, one typo allowed)."""
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', 10, type=int)
+    if not query:
+        return jsonify({"success": False, "message": "q is required."}), 400
+    return jsonify({"success": True, "stations": get_station_index().autocomplete(query, limit)})
+
+@app.route("/api/stations/nearest")
+def api_nearest_stations():
+    """/api/stations/nearest?lat=28.61&lon=77.21&limit=5[&max_km=50], nearest first."""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    limit = request.args.get('limit', 5, type=int)
+    max_km = request.args.get('max_km', type=float)
+    if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return jsonify({"success": False, "message": "lat (-90..90) and lon (-180..180) are required."}), 400
+    if max_km is not None and max_km < 0:
+        return jsonify({"success": False, "message": "max_km must not be negative."}), 400
+    return jsonify({"success": True, "stations": get_station_index().nearest(lat, lon, limit, max_km)})
+
+def parse_check_seats_args(args):
+    """(train, date, from, to) stretch and seat class from the query
+    string, or (None, None, error)."""
+    train_num = args.get('train', '').strip()
+    if not train_num: return None, None, "train is required."
+    try:
+        journey_date = datetime.strptime(args.get('date', '').strip(), '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        return None, None, "date must be YYYY-MM-DD."
+    # Free seats over from -> to when given, else over the whole run
+    stretch = (train_num, journey_date, args.get('from', '').strip() or None, args.get('to', '').strip() or None)
+    return stretch, args.get('class', 'Sleeper'), None
 
 @app.route("/api/check_seats")
 def api_check_seats():
-    train_num = request.args.get('train')
-    journey_date = request.args.get('date')
-    seat_class = request.args.get('class', 'Sleeper')
+    stretch, seat_class, error = parse_check_seats_args(request.args)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT SUM(total_berths) as total FROM Coaches WHERE train_number = %s AND coach_class = %s", (train_num, seat_class))
-        total = cursor.fetchone()['total'] or 0
-        cursor.execute("SELECT COUNT(*) as booked FROM Bookings b JOIN Passengers p ON b.pnr_number = p.pnr_number JOIN Tickets t ON p.passenger_id = t.passenger_id WHERE b.train_number = %s AND b.journey_date = %s AND p.seat_class = %s AND t.status = 'CNF'", (train_num, journey_date, seat_class))
-        booked = cursor.fetchone()['booked']
-        return jsonify({"success": True, "available_seats": (total - booked)})
-    except: return jsonify({"success": False, "message": "Error"}), 500
+        by_class = get_availability(cursor, [stretch]).get(stretch, {})
+        return jsonify({"success": True, "available_seats": by_class.get(seat_class, {}).get("available", 0)})
+    except Exception as e:
+        log.error("Check Seats Error: %s", e)
+        return jsonify({"success": False, "message": "Database error."}), 500
     finally: conn.close()
 
+# --- BOOKING: SEATS, RAC AND WAITLIST ---
+# A booking that loses a seat to another worker process reloads and retries
+MAX_BOOKING_ATTEMPTS = 3
+# When a class is full, passengers queue per (train, date, class) in booking
+# order. The first RAC_PER_COACH places per coach travel as RAC, the next
+# WAITLIST_LIMIT are WL; beyond that the class is closed.
+RAC_PER_COACH = 8
+WAITLIST_LIMIT = 200
+BERTH_PREFERENCES = ('ANY', 'LOWER', 'MIDDLE', 'UPPER', 'SIDE')
+# Seats are sold per stretch between stops, one bit per stretch in a 64-bit mask
+MAX_SEGMENTS = 64
+
+CLASS_COACHES_QUERY = """
+SELECT c.coach_id, c.total_berths, MIN(s.seat_id) AS seat_id_start
+FROM Coaches c LEFT JOIN Seats s ON s.coach_id = c.coach_id
+WHERE c.train_number = %s AND c.coach_class = %s
+GROUP BY c.coach_id, c.total_berths ORDER BY c.coach_id
+"""
+
+def get_class_coaches(cursor, train_num, seat_class):
+    # Every coach of the class, so passengers can be placed anywhere on the train
+    cursor.execute(CLASS_COACHES_QUERY, (train_num, seat_class))
+    coaches = cursor.fetchall()
+    for coach in coaches:
+        coach['seat_id_start'] = coach['seat_id_start'] or 0
+    return coaches
+
+def sold_segments_query(coach_count):
+    return f"""
+    SELECT s.coach_id, s.seat_number, r.segment FROM Seat_Reservations r JOIN Seats s ON r.seat_id = s.seat_id
+    WHERE r.journey_date = %s AND s.coach_id IN ({", ".join(["%s"] * coach_count)})
+    """
+
+def sold_segments_loader(cursor, journey_date):
+    def load_sold_segments(coach_ids):
+        # Only runs for coaches not cached for this date in this process
+        cursor.execute(sold_segments_query(len(coach_ids)), (journey_date, *coach_ids))
+        sold = {}
+        for row in cursor.fetchall():
+            sold.setdefault(row['coach_id'], []).append((int(row['seat_number']), row['segment']))
+        return sold
+    return load_sold_segments
+
+def reload_occupancy(coaches, journey_date, load_sold_segments):
+    # The cache only hears of seats this process frees. Before anyone is
+    # queued for want of a seat, re-read what other workers may have freed
+    seat_inventory.evict([coach['coach_id'] for coach in coaches], journey_date)
+    return seat_inventory.get_many(coaches, journey_date, load_sold_segments)
+
+TRAIN_STOPS_QUERY = "SELECT station_code FROM Train_Stops WHERE train_number = %s ORDER BY stop_sequence"
+
+def get_train_stops(cursor, train_num):
+    # Segment s of the run is stops[s] -> stops[s + 1]
+    cursor.execute(TRAIN_STOPS_QUERY, (train_num,))
+    return [row['station_code'] for row in cursor.fetchall()]
+
+def journey_segments(stops, from_code=None, to_code=None):
+    """(segment_count, from_stop, to_stop) for a journey on a train, or None
+    if the train doesn't run from_code -> to_code. A missing end means the
+    first / last stop; a train without stops on file is one segment."""
+    if len(stops) < 2: return (1, 0, 1)
+    segment_count = min(len(stops) - 1, MAX_SEGMENTS)
+    try:
+        from_stop = stops.index(from_code) if from_code else 0
+        to_stop = stops.index(to_code, from_stop + 1) if to_code else segment_count
+    except ValueError:
+        return None
+    if to_stop > segment_count: return None
+    return (segment_count, from_stop, to_stop)
+
+def reservation_rows(seat_id, journey_date, from_stop, to_stop, passenger_id):
+    return [(seat_id, journey_date, segment, passenger_id) for segment in range(from_stop, to_stop)]
+
+def queue_statuses(first_place, count, rac_capacity):
+    # Places are 0-based from the head of the queue
+    return ['RAC' if first_place + i < rac_capacity else 'WL' for i in range(count)]
+
+WAITLIST_QUEUE_QUERY = """
+SELECT w.ticket_id, w.preference, w.from_stop, w.to_stop, t.passenger_id, t.status, p.pnr_number FROM Waitlist w
+JOIN Tickets t ON w.ticket_id = t.ticket_id JOIN Passengers p ON t.passenger_id = p.passenger_id
+WHERE w.train_number = %s AND w.journey_date = %s AND w.seat_class = %s
+ORDER BY w.ticket_id"""
+
+def queued_count(cursor, train_num, journey_date, seat_class):
+    cursor.execute("SELECT rac_count + wl_count AS queued FROM Seat_Availability WHERE train_number = %s AND journey_date = %s AND seat_class = %s",
+                   (train_num, journey_date, seat_class))
+    row = cursor.fetchone()
+    return int(row['queued']) if row else 0
+
+def promote_waitlist(conn, train_num, journey_date, seat_class):
+    """Moves the head of a train/date/class queue onto free seats in one sweep.
+
+    Runs as its own transaction after cancellations commit. One C++ call
+    walks the queue head first and seats everyone whose journey fits a free
+    stretch; the rest is re-ranked into RAC/WL and the counters follow.
+    Returns the number of passengers confirmed.
+    """
+    cursor = conn.cursor()
+    coaches = get_class_coaches(cursor, train_num, seat_class)
+    if not coaches: return 0
+    rac_capacity = RAC_PER_COACH * len(coaches)
+    segment_count = journey_segments(get_train_stops(cursor, train_num))[0]
+    load_sold_segments = sold_segments_loader(cursor, journey_date)
+    key = (train_num, journey_date, seat_class)
+    reloaded = False
+
+    for attempt in range(MAX_BOOKING_ATTEMPTS):
+        promoted_seats = []
+        try:
+            # Locks the class's counters, so one promotion (or booking commit) at a time
+            cursor.execute("SELECT rac_count, wl_count FROM Seat_Availability WHERE train_number = %s AND journey_date = %s AND seat_class = %s FOR UPDATE", key)
+            counts = cursor.fetchone()
+            if not counts or counts['rac_count'] + counts['wl_count'] == 0:
+                conn.rollback()
+                return 0
+            cursor.execute(WAITLIST_QUEUE_QUERY + " FOR UPDATE", key)
+            queue = cursor.fetchall()
+
+            # C++'s Job: the whole sweep is one call over every coach; a short
+            # hop further back can still take a gap the head doesn't fit
+            journeys, preferences = [(q['from_stop'], q['to_stop']) for q in queue], [q['preference'] for q in queue]
+            occupancy = seat_inventory.get_many(coaches, journey_date, load_sold_segments)
+            results = seat_inventory.allocate_in_order(occupancy, segment_count, journeys, preferences) if queue else []
+            if queue and not any(coach for coach, _ in results) and not reloaded:
+                reloaded = True
+                occupancy = reload_occupancy(coaches, journey_date, load_sold_segments)
+                results = seat_inventory.allocate_in_order(occupancy, segment_count, journeys, preferences)
+            promoted = [(q, coach, res) for q, (coach, res) in zip(queue, results) if coach]
+            promoted_seats = [(coach.coach_id, journey_date, int(res.seat_number), q['from_stop'], q['to_stop']) for q, coach, res in promoted]
+
+            if promoted:
+                cursor.executemany("UPDATE Tickets SET status = 'CNF', seat_id = %s, berth_type = %s WHERE ticket_id = %s",
+                                   [(res.seat_id, res.berth_type.decode('utf-8'), q['ticket_id']) for q, _, res in promoted])
+                cursor.executemany("INSERT INTO Seat_Reservations (seat_id, journey_date, segment, passenger_id) VALUES (%s, %s, %s, %s)",
+                                   [row for q, _, res in promoted
+                                    for row in reservation_rows(res.seat_id, journey_date, q['from_stop'], q['to_stop'], q['passenger_id'])])
+                cursor.executemany("DELETE FROM Waitlist WHERE train_number = %s AND journey_date = %s AND seat_class = %s AND ticket_id = %s",
+                                   [(*key, q['ticket_id']) for q, _, _ in promoted])
+                # Bookings whose last queued passenger just got a seat are confirmed
+                pnrs = sorted({q['pnr_number'] for q, _, _ in promoted})
+                cursor.execute(f"""
+                SELECT b.pnr_number FROM Bookings b
+                WHERE b.pnr_number IN ({", ".join(["%s"] * len(pnrs))}) AND b.booking_status = 'WAITLISTED'
+                AND NOT EXISTS (SELECT 1 FROM Passengers p JOIN Tickets t ON p.passenger_id = t.passenger_id
+                                WHERE p.pnr_number = b.pnr_number AND t.status IN ('RAC', 'WL'))
+                FOR UPDATE
+                """, pnrs)
+                confirmed = [row['pnr_number'] for row in cursor.fetchall()]
+                if confirmed:
+                    cursor.execute(f"UPDATE Bookings SET booking_status = 'CONFIRMED' WHERE pnr_number IN ({', '.join(['%s'] * len(confirmed))})", confirmed)
+                    record_booking_stats(cursor, confirmed, revenue=1)
+
+            # Re-rank whoever is still waiting
+            promoted_ids = {q['ticket_id'] for q, _, _ in promoted}
+            remaining = [q for q in queue if q['ticket_id'] not in promoted_ids]
+            statuses = queue_statuses(0, len(remaining), rac_capacity)
+            changed = [(status, q['ticket_id']) for q, status in zip(remaining, statuses) if q['status'] != status]
+            if changed:
+                cursor.executemany("UPDATE Tickets SET status = %s WHERE ticket_id = %s", changed)
+            rac_now = statuses.count('RAC')
+            record_availability_change(cursor, *key, cnf=len(promoted), rac=rac_now - counts['rac_count'],
+                                       wl=(len(remaining) - rac_now) - counts['wl_count'])
+            conn.commit()
+            changed_ids = promoted_ids | {ticket_id for _, ticket_id in changed}
+            response_cache.invalidate(availability_tag(train_num, journey_date),
+                                      *[pnr_tag(q['pnr_number']) for q in queue if q['ticket_id'] in changed_ids])
+            return len(promoted)
+        except pymysql.err.IntegrityError as e:
+            if 1062 not in e.args: raise
+            conn.rollback()
+            seat_inventory.evict([coach['coach_id'] for coach in coaches], journey_date)
+            log.warning("Promotion retry %d: %s", attempt + 1, e)
+        except Exception:
+            conn.rollback()
+            for seat in promoted_seats: seat_inventory.release(*seat)
+            raise
+    return 0
+
+@app.cli.command("promote-waitlist")
+def promote_waitlist_command():
+    """Promote queued passengers onto free seats for every upcoming train/date/class."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT train_number, journey_date, seat_class FROM Seat_Availability WHERE rac_count + wl_count > 0 AND journey_date >= CURDATE()")
+        queues = cursor.fetchall()
+        conn.rollback()
+        total = sum(promote_waitlist(conn, q['train_number'], q['journey_date'], q['seat_class']) for q in queues)
+        print(f"Promoted {total} passenger(s) across {len(queues)} queue(s).")
+    finally:
+        conn.close()
+
 @app.route("/api/book_ticket", methods=['POST'])
 @login_required
 def api_book_ticket():
@@ -387,67 +1349,128 @@ def api_book_ticket():
     train_num = data['train_number']
     journey_date = data['journey_date']
     seat_class = data['seat_class']
-    preference = data.get('preference', 'ANY') 
+    # A party as "passengers": [{name, age, gender, preference}, ...], or the
+    # single-passenger fields at the top level (the booking page sends these)
+    passengers = data.get('passengers') or [{
+        "name": data['name'], "age": data['age'], "gender": data['gender'],
+        "preference": data.get('preference', 'ANY')
+    }]
+    # Anything the C++ allocator doesn't know is treated as ANY
+    preferences = [str(p.get('preference') or 'ANY').strip().upper() for p in passengers]
+    preferences = [pref if pref in BERTH_PREFERENCES else 'ANY' for pref in preferences]
+    
+    # Optional boarding / alighting stations; without them it's the whole run
+    from_code = (data.get('from_station') or '').strip() or None
+    to_code = (data.get('to_station') or '').strip() or None
     
     conn = get_db_connection()
     cursor = conn.cursor()
+    allocated_seats = []
     try:
         # 1. DATA GATHERING
-        cursor.execute("SELECT coach_id, total_berths FROM Coaches WHERE train_number = %s AND coach_class = %s LIMIT 1", (train_num, seat_class))
-        coach = cursor.fetchone()
-        if not coach: return jsonify({"success": False, "message": "No coaches for this class."})
-        
-        coach_id = coach['coach_id']
-        total_seats = coach['total_berths']
-        cursor.execute("SELECT seat_id FROM Seats WHERE coach_id = %s ORDER BY seat_id ASC LIMIT 1", (coach_id,))
-        first_seat = cursor.fetchone()
-        start_id = first_seat['seat_id'] if first_seat else 0
+        coaches = get_class_coaches(cursor, train_num, seat_class)
+        if not coaches: return jsonify({"success": False, "message": "No coaches for this class."})
+        journey = journey_segments(get_train_stops(cursor, train_num), from_code, to_code)
+        if journey is None:
+            return jsonify({"success": False, "message": f"Train {train_num} does not run from {from_code or 'its origin'} to {to_code or 'its terminus'}."}), 400
+        segment_count, from_stop, to_stop = journey
+        load_sold_segments = sold_segments_loader(cursor, journey_date)
+        rac_capacity = RAC_PER_COACH * len(coaches)
 
-        cursor.execute("""
-        SELECT s.seat_number FROM Tickets ti JOIN Seats s ON ti.seat_id = s.seat_id JOIN Passengers p ON ti.passenger_id = p.passenger_id JOIN Bookings b ON p.pnr_number = b.pnr_number
-        WHERE b.train_number = %s AND b.journey_date = %s AND s.coach_id = %s AND ti.status = 'CNF'
-        """, (train_num, journey_date, coach_id))
-        booked_seats = [int(row['seat_number']) for row in cursor.fetchall()]
-
-        # 2. COMPLEX LOGIC (C++'s Job: Algorithm)
-        ArrType = ctypes.c_int * len(booked_seats)
-        c_occ = ArrType(*booked_seats)
-        
-        res = core_lib.find_best_seat(
-            c_occ, 
-            ctypes.c_int(len(booked_seats)), 
-            ctypes.c_int(total_seats), 
-            ctypes.c_int(start_id),
-            preference.encode('utf-8')
-        )
-        
-        status = res.status.decode('utf-8')
-        berth_type = res.berth_type.decode('utf-8') 
-        
-        if status == "WL":
-            return jsonify({"success": False, "message": "Train is Full (Waitlist Assigned)"})
-
-        # 3. DATA PERSISTENCE
-        pnr = f"PNR{random.randint(10000,99999)}"
+        # 2. + 3. ALLOCATE AND PERSIST, RETRYING IF ANOTHER PROCESS WON A SEAT
         fare = float(data['total_fare'])
+        reloaded = False
+        for attempt in range(MAX_BOOKING_ATTEMPTS):
+            queued = queued_count(cursor, train_num, journey_date, seat_class)
+            # Freed seats go to the queue first. The sweep seats everyone who
+            # fits a free stretch, so whatever is still free after it is fair
+            # game for this party
+            if queued and promote_waitlist(conn, train_num, journey_date, seat_class):
+                queued = queued_count(cursor, train_num, journey_date, seat_class)
+
+            # C++'s Job: seats the whole party in one call, each on the seat
+            # whose free stretch fits this journey best, and marks it sold
+            occupancy = seat_inventory.get_many(coaches, journey_date, load_sold_segments)
+            results = seat_inventory.allocate_group(occupancy, segment_count, from_stop, to_stop, preferences)
+            if not reloaded and not all(coach for coach, _ in results):
+                reloaded = True
+                occupancy = reload_occupancy(coaches, journey_date, load_sold_segments)
+                results = seat_inventory.allocate_group(occupancy, segment_count, from_stop, to_stop, preferences)
+            allocated_seats = [(coach.coach_id, journey_date, int(res.seat_number), from_stop, to_stop) for coach, res in results if coach]
+
+            # Whoever didn't get a seat joins the RAC/WL queue, if it has room
+            waiting = len(passengers) - len(allocated_seats)
+            if waiting and queued + waiting > rac_capacity + WAITLIST_LIMIT:
+                for seat in allocated_seats: seat_inventory.release(*seat)
+                allocated_seats = []
+                return jsonify({"success": False, "message": "Train is Full (Waitlist closed)"})
+            queue_status = iter(queue_statuses(queued, waiting, rac_capacity))
+            statuses = ['CNF' if coach else next(queue_status) for coach, _ in results]
+
+            pnr = f"PNR{random.randint(10000,99999)}"
+            try:
+                # One transaction, batched writes
+                cursor.execute("INSERT INTO Bookings (pnr_number, user_id, train_number, journey_date, booking_status, total_fare, from_station_code, to_station_code) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                               (pnr, user_id, train_num, journey_date, 'WAITLISTED' if waiting else 'CONFIRMED', fare, from_code, to_code))
+                record_booking_stats(cursor, [pnr], bookings=1, revenue=0 if waiting else 1)
+                cursor.executemany("INSERT INTO Passengers (pnr_number, name, age, gender, seat_class) VALUES (%s, %s, %s, %s, %s)",
+                                   [(pnr, p['name'], p['age'], p['gender'], seat_class) for p in passengers])
+                # lastrowid only covers the first row of a batch; read the IDs back in insert order
+                cursor.execute("SELECT passenger_id FROM Passengers WHERE pnr_number = %s ORDER BY passenger_id", (pnr,))
+                passenger_ids = [row['passenger_id'] for row in cursor.fetchall()]
+                
+                cursor.executemany("INSERT INTO Tickets (passenger_id, seat_id, status, seat_class, berth_type) VALUES (%s, %s, %s, %s, %s)",
+                                   [(pass_id, res.seat_id if coach else None, status, seat_class, res.berth_type.decode('utf-8') if coach else None)
+                                    for pass_id, (coach, res), status in zip(passenger_ids, results, statuses)])
+                # Fails with a duplicate key if any seat segment was sold for this date in the meantime
+                cursor.executemany("INSERT INTO Seat_Reservations (seat_id, journey_date, segment, passenger_id) VALUES (%s, %s, %s, %s)",
+                                   [row for pass_id, (coach, res) in zip(passenger_ids, results) if coach
+                                    for row in reservation_rows(res.seat_id, journey_date, from_stop, to_stop, pass_id)])
+                if waiting:
+                    cursor.execute("SELECT t.ticket_id, t.passenger_id FROM Tickets t JOIN Passengers p ON t.passenger_id = p.passenger_id WHERE p.pnr_number = %s", (pnr,))
+                    ticket_ids = {row['passenger_id']: row['ticket_id'] for row in cursor.fetchall()}
+                    cursor.executemany("INSERT INTO Waitlist (train_number, journey_date, seat_class, ticket_id, preference, from_stop, to_stop) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                                       [(train_num, journey_date, seat_class, ticket_ids[pass_id], pref, from_stop, to_stop)
+                                        for pass_id, (coach, _), pref in zip(passenger_ids, results, preferences) if not coach])
+                record_availability_change(cursor, train_num, journey_date, seat_class, cnf=len(allocated_seats),
+                                           rac=statuses.count('RAC'), wl=statuses.count('WL'))
+                conn.commit()
+                response_cache.invalidate(pnr_tag(pnr), availability_tag(train_num, journey_date))
+                break
+            except pymysql.err.IntegrityError as e:
+                if 1062 not in e.args: raise
+                # A seat (or, rarely, the PNR) was taken by another booking: our
+                # cached seat masks are stale, so reload them and pick again
+                conn.rollback()
+                seat_inventory.evict({seat[0] for seat in allocated_seats}, journey_date)
+                allocated_seats = []
+                log.warning("Booking retry %d: %s", attempt + 1, e)
+        else:
+            return jsonify({"success": False, "message": "Seats are selling fast, please try again."}), 409
         
-        cursor.execute("INSERT INTO Bookings (pnr_number, user_id, train_number, journey_date, booking_status, total_fare) VALUES (%s, %s, %s, %s, 'CONFIRMED', %s)", (pnr, user_id, train_num, journey_date, fare))
-        cursor.execute("INSERT INTO Passengers (pnr_number, name, age, gender, seat_class) VALUES (%s, %s, %s, %s, %s)", (pnr, data['name'], data['age'], data['gender'], seat_class))
-        pass_id = cursor.lastrowid
-        
-        # We now have the 'berth_type' column from the SQL fix
-        cursor.execute("INSERT INTO Tickets (passenger_id, seat_id, status, seat_class, berth_type) VALUES (%s, %s, 'CNF', %s, %s)", (pass_id, res.seat_id, seat_class, berth_type))
-        conn.commit()
-        
-        return jsonify({"success": True, "pnr": pnr, "total_fare": fare})
+        seats = []
+        for (coach, res), status in zip(results, statuses):
+            if coach:
+                seats.append({"status": status, "coach_id": coach.coach_id, "seat_number": res.seat_number.decode('utf-8'), "berth_type": res.berth_type.decode('utf-8')})
+            else:
+                seats.append({"status": status})
+        return jsonify({"success": True, "pnr": pnr, "total_fare": fare, "seats": seats})
 
     except Exception as e:
         conn.rollback()
-        print(f"Booking Failed: {e}")
+        for seat in allocated_seats: seat_inventory.release(*seat) # Give the seats back
+        log.error("Booking Failed: %s", e)
         return jsonify({"success": False, "message": str(e)}), 500
     finally:
         conn.close()
 
+LIVE_TICKETS_QUERY = """
+SELECT ti.ticket_id, ti.status, ti.seat_class, s.coach_id, s.seat_number, b.journey_date, b.train_number,
+       b.from_station_code, b.to_station_code FROM Bookings b
+JOIN Passengers p ON b.pnr_number = p.pnr_number JOIN Tickets ti ON p.passenger_id = ti.passenger_id LEFT JOIN Seats s ON ti.seat_id = s.seat_id
+WHERE b.pnr_number = %s AND b.user_id = %s AND ti.status IN ('CNF', 'RAC', 'WL')
+"""
+
 @app.route("/api/cancel_ticket", methods=['POST'])
 @login_required
 def api_cancel():
@@ -455,12 +1478,104 @@ def api_cancel():
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
+        # Locks the booking first, so a promotion can't confirm it mid-cancel
+        cursor.execute("SELECT booking_status FROM Bookings WHERE pnr_number=%s AND user_id=%s FOR UPDATE", (data['pnr_number'], session['user_id']))
+        booking = cursor.fetchone()
+        if booking and booking['booking_status'] == 'CONFIRMED':
+            record_booking_stats(cursor, [data['pnr_number']], revenue=-1)
+        # Live tickets of this PNR: seats to free in the seat cache, queue places to drop
+        cursor.execute(LIVE_TICKETS_QUERY, (data['pnr_number'], session['user_id']))
+        tickets = cursor.fetchall()
         cursor.execute("UPDATE Bookings SET booking_status='CANCELLED' WHERE pnr_number=%s AND user_id=%s", (data['pnr_number'], session['user_id']))
-        cursor.execute("UPDATE Tickets SET status='CANCELLED' WHERE passenger_id IN (SELECT passenger_id FROM Passengers WHERE pnr_number=%s)", (data['pnr_number'],))
+        cursor.execute("""
+        UPDATE Tickets SET status='CANCELLED' WHERE passenger_id IN
+        (SELECT p.passenger_id FROM Passengers p JOIN Bookings b ON p.pnr_number = b.pnr_number WHERE b.pnr_number = %s AND b.user_id = %s)
+        """, (data['pnr_number'], session['user_id']))
+        cancelled = {}
+        for ticket in tickets:
+            key = (ticket['train_number'], ticket['journey_date'], ticket['seat_class'])
+            counts = cancelled.setdefault(key, {'CNF': 0, 'RAC': 0, 'WL': 0})
+            counts[ticket['status']] += 1
+        for (train_number, journey_date, seat_class), counts in cancelled.items():
+            record_availability_change(cursor, train_number, journey_date, seat_class,
+                                       cnf=-counts['CNF'], rac=-counts['RAC'], wl=-counts['WL'])
+        cursor.execute("""
+        DELETE FROM Seat_Reservations WHERE passenger_id IN
+        (SELECT p.passenger_id FROM Passengers p JOIN Bookings b ON p.pnr_number = b.pnr_number WHERE b.pnr_number = %s AND b.user_id = %s)
+        """, (data['pnr_number'], session['user_id']))
+        queued = [t for t in tickets if t['status'] != 'CNF']
+        if queued:
+            cursor.executemany("DELETE FROM Waitlist WHERE train_number = %s AND journey_date = %s AND seat_class = %s AND ticket_id = %s",
+                               [(t['train_number'], t['journey_date'], t['seat_class'], t['ticket_id']) for t in queued])
         conn.commit()
-        return jsonify({"success": True})
-    except: return jsonify({"success": False})
+        response_cache.invalidate(pnr_tag(data['pnr_number']),
+                                  *[availability_tag(train_number, journey_date) for train_number, journey_date, _ in cancelled])
+        stops = {}
+        for ticket in tickets:
+            if ticket['status'] == 'CNF':
+                if ticket['train_number'] not in stops:
+                    stops[ticket['train_number']] = get_train_stops(cursor, ticket['train_number'])
+                journey = journey_segments(stops[ticket['train_number']], ticket['from_station_code'], ticket['to_station_code'])
+                if journey is None: # The train's stops changed since; reload from the database instead
+                    seat_inventory.evict([ticket['coach_id']], ticket['journey_date'])
+                    continue
+                seat_inventory.release(ticket['coach_id'], ticket['journey_date'], ticket['seat_number'], journey[1], journey[2])
+
+        # Hand the freed seats (and RAC places) to the queue, one sweep per class
+        promoted = 0
+        for train_number, journey_date, seat_class in cancelled:
+            try:
+                promoted += promote_waitlist(conn, train_number, journey_date, seat_class)
+            except Exception as e:
+                # The cancellation stands; `flask promote-waitlist` will catch up
+                log.error("Waitlist promotion failed for %s %s %s: %s", train_number, journey_date, seat_class, e)
+        return jsonify({"success": True, "promoted": promoted})
+    except Exception as e:
+        conn.rollback()
+        log.error("Cancellation Failed: %s", e)
+        return jsonify({"success": False, "message": "Database error."}), 500
     finally: conn.close()
 
+# --- SCHEMA CHECKS ---
+# The per-request queries, with sample parameters for EXPLAIN. Each must be
+# answerable from an index; full scans of whole tables (route graph loads,
+# rebuilds, the admin route list) are deliberate and not listed.
+def hot_queries():
+    today = date.today()
+    return [
+        ("pnr details", PNR_DETAILS_QUERY, ("PNR00000",)),
+        ("user bookings", USER_BOOKINGS_QUERY.format(seek=""), (1, BOOKINGS_PAGE_SIZE + 1)),
+        ("user bookings page", USER_BOOKINGS_QUERY.format(seek=USER_BOOKINGS_SEEK),
+         (1, today, today, "PNR00000", BOOKINGS_PAGE_SIZE + 1)),
+        ("class coaches", CLASS_COACHES_QUERY, ("00000", "Sleeper")),
+        ("sold segments", sold_segments_query(2), (today, 1, 2)),
+        ("train stops", TRAIN_STOPS_QUERY, ("00000",)),
+        ("route version", ROUTE_VERSION_QUERY, ()),
+        ("waitlist queue", WAITLIST_QUEUE_QUERY, ("00000", today, "Sleeper")),
+        ("live tickets", LIVE_TICKETS_QUERY, ("PNR00000", 1)),
+        ("availability", availability_query(2), availability_params([("00000", today, "AAA", "BBB"), ("00001", today, None, None)])),
+        ("dashboard range", "SELECT stat_date, bookings, confirmed_revenue, new_users FROM Daily_Stats WHERE stat_date BETWEEN %s AND %s",
+         (today - timedelta(days=6), today)),
+    ]
+
+# Scans check-indexes accepts although an index exists, by query and table.
+# Keep it short: each entry is a table that stays small in production too.
+ALLOWED_SCANS = {
+    "dashboard range": {"Daily_Stats"}, # One row per day
+    "route version": {"Route_Graph_Version"}, # One row
+}
+
+@app.cli.command("check-indexes")
+def check_indexes_command():
+    """EXPLAIN the hot queries; exit 1 if any would scan a table outside ALLOWED_SCANS."""
+    conn = get_db_connection()
+    try:
+        problems = explain_full_scans(conn, hot_queries(), ALLOWED_SCANS)
+    finally:
+        conn.close()
+    for problem in problems: print(f"FAIL {problem}")
+    if problems: raise SystemExit(1)
+    print(f"OK: all {len(hot_queries())} hot queries use an index.")
+
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
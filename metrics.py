@@ -0,0 +1,262 @@
+"""Prometheus-style metrics, per-request phase timing and an opt-in profiler.
+
+Counters, gauges and histograms live in one in-process registry; render()
+produces the Prometheus text format that main.py serves at /metrics. With
+several worker processes each reports its own numbers, so scrape them per
+process (or run one).
+
+Request timing: main.py calls start_request() / finish_request() around
+every request. In between, `with timed('db')` (db.py, around every query
+and commit), ffi_call() (core_bridge.py and seat_inventory.py, around every
+C++ call) and `with timed('serialize')` (JSON responses) add to the current
+request's phases. finish_request() records them, plus the total, in
+railway_request_phase_seconds{route, phase}; "other" is what's left (Python
+work, templates, waiting on locks). async_api.py keeps its phases per
+request instead of per thread and records them with record_phases().
+
+Profiling is off unless configured:
+  PROFILE_TOKEN=secret       a request with header "X-Profile: secret" is profiled
+  PROFILE_SAMPLE_RATE=0.01   this fraction of PROFILED_ROUTES requests is
+  PROFILE_SLOW_MS=500        profiled, and kept only if slower than this
+  PROFILE_DIR=/tmp/...       where captures go (collapsed stacks, one per
+                             line with a sample count: flamegraph.pl input)
+"""
+import bisect
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('db', 'ffi', 'serialize')
+
+# --- 1. REGISTRY ---
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_text(names, values):
+    if not names: return ""
+    return "{" + ",".join(f'{n}="{escape_label(v)}"' for n, v in zip(names, values)) + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values = defaultdict(float)
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] += amount
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [f"{self.name}{label_text(self.labels, k)} {v:g}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *label_values, value):
+        with self.lock:
+            self.values[label_values] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.series = {} # label values -> [bucket counts..., sum, count]
+
+    def observe(self, *label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.setdefault(label_values, [0] * (len(self.buckets) + 2))
+            if index < len(self.buckets): series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self.lock:
+            items = sorted((k, list(v)) for k, v in self.series.items())
+        lines = self.header()
+        for key, series in items:
+            running = 0
+            for bound, count in zip(self.buckets, series):
+                running += count
+                lines.append(f"{self.name}_bucket{label_text(self.labels + ('le',), key + (f'{bound:g}',))} {running}")
+            lines.append(f"{self.name}_bucket{label_text(self.labels + ('le',), key + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{label_text(self.labels, key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{label_text(self.labels, key)} {series[-1]}")
+        return lines
+
+REGISTRY = []
+COLLECTORS = []
+
+def register_collector(collect):
+    """For numbers kept elsewhere (the pool's and the cache's own stats):
+    collect() is called at scrape time and returns
+    [(name, "counter" | "gauge", help, [({label: value}, number), ...]), ...]."""
+    COLLECTORS.append(collect)
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collect in COLLECTORS:
+        try:
+            for name, kind, help_text, samples in collect():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{label_text(tuple(labels), tuple(labels.values()))} {value:g}" for labels, value in samples]
+        except Exception as e:
+            log.warning("Metrics collector failed: %s", e)
+    return "\n".join(lines) + "\n"
+
+# --- 2. APP METRICS ---
+REQUEST_SECONDS = Histogram("railway_request_phase_seconds",
+                            "Time per request by route and phase (total, db, ffi, serialize, other)", ("route", "phase"))
+REQUESTS = Counter("railway_requests_total", "Requests by route and status code", ("route", "status"))
+FFI_CALLS = Counter("railway_ffi_calls_total", "Calls into the C++ core by function", ("function",))
+FFI_SECONDS = Counter("railway_ffi_seconds_total", "Time spent in the C++ core by function", ("function",))
+DB_QUERIES = Counter("railway_db_queries_total", "SQL statements, commits and rollbacks sent", ())
+GRAPH_SIZE = Gauge("railway_route_graph_size", "Resident route graph: stations, edges, trains and version", ("dimension",))
+PROFILES = Counter("railway_profiles_total", "Profiled requests by outcome (kept, discarded)", ("outcome",))
+
+# --- 3. REQUEST TIMING ---
+_state = threading.local()
+
+def start_request():
+    _state.phases = defaultdict(float)
+    _state.started = time.perf_counter()
+
+def finish_request(route, status):
+    """Records the current request's phases; returns its total seconds."""
+    phases = getattr(_state, 'phases', None)
+    if phases is None: return 0.0
+    total = time.perf_counter() - _state.started
+    _state.phases = None
+    record_phases(route, status, total, phases)
+    return total
+
+def record_phases(route, status, total, phases):
+    """Records one request's total and {phase: seconds}, for servers that
+    keep the phases somewhere other than this thread (async_api.py)."""
+    route = route or "unmatched"
+    REQUESTS.inc(route, status)
+    REQUEST_SECONDS.observe(route, "total", value=total)
+    for phase in PHASES:
+        REQUEST_SECONDS.observe(route, phase, value=phases.get(phase, 0.0))
+    REQUEST_SECONDS.observe(route, "other", value=max(0.0, total - sum(phases.values())))
+
+def run_timed(phases, call, *args):
+    """call(*args) on this thread with the timers inside it (db, ffi_call)
+    adding to `phases`: for work handed to a thread pool mid-request."""
+    saved = getattr(_state, 'phases', None)
+    _state.phases = phases
+    try:
+        return call(*args)
+    finally:
+        _state.phases = saved
+
+@contextmanager
+def timed(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = getattr(_state, 'phases', None)
+        if phases is not None: phases[phase] += time.perf_counter() - started
+
+@contextmanager
+def ffi_call(function):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        FFI_CALLS.inc(function)
+        FFI_SECONDS.inc(function, amount=elapsed)
+        phases = getattr(_state, 'phases', None)
+        if phases is not None: phases['ffi'] += elapsed
+
+# --- 4. SAMPLING PROFILER ---
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '500'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'railway-profiles'))
+PROFILE_INTERVAL = 0.005
+PROFILED_ROUTES = ('api_search_trains', 'api_book_ticket')
+
+class StackSampler:
+    """Samples one thread's Python stack every PROFILE_INTERVAL seconds from
+    a helper thread, counting identical stacks."""
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.stacks = defaultdict(int)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(PROFILE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack: self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.stacks
+
+def should_profile(route, header_token):
+    if PROFILE_TOKEN and header_token == PROFILE_TOKEN: return 'requested'
+    if PROFILE_SAMPLE_RATE and route in PROFILED_ROUTES and random.random() < PROFILE_SAMPLE_RATE: return 'sampled'
+    return None
+
+def start_profile():
+    _state.sampler = StackSampler(threading.get_ident())
+
+def finish_profile(route, reason, seconds):
+    """Stops the sampler; writes the capture if it was asked for or the
+    request was slow. Returns the file written, or None."""
+    sampler = getattr(_state, 'sampler', None)
+    if sampler is None: return None
+    _state.sampler = None
+    stacks = sampler.stop()
+    if reason != 'requested' and seconds * 1000 < PROFILE_SLOW_MS:
+        PROFILES.inc("discarded")
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{route}-{int(seconds * 1000)}ms-{os.getpid()}.txt")
+    with open(path, "w") as f:
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+            f.write(f"{stack} {count}\n")
+    PROFILES.inc("kept")
+    log.info("Profile of %s (%.0f ms, %s) written to %s", route, seconds * 1000, reason, path)
+    return path
@@ -0,0 +1,228 @@
+"""Versioned schema migrations.
+
+Brings an existing database up to the schema the code uses:
+
+    python migrate.py           # create missing tables, apply pending migrations
+    python migrate.py --status  # list migrations and whether they're applied
+
+First every CREATE TABLE IF NOT EXISTS in database/create_tables.sql runs,
+so tables the database has never had are created in their current shape.
+Then each migration in MIGRATIONS not yet recorded in Schema_Migrations is
+applied in order and recorded. Steps check information_schema before
+changing anything, so a migration also applies cleanly to a database that
+already has some of its columns or indexes (a fresh install, or one patched
+by hand).
+
+explain_full_scans() is the other half: main.py's `flask check-indexes`
+runs EXPLAIN on its hot queries and fails if one scans a whole table.
+"""
+import os
+import re
+import sys
+
+from db import db_pool
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "create_tables.sql")
+
+# --- STEPS ---
+# Each step is (description, function(cursor) -> True if it changed anything)
+
+def column_exists(cursor, table, column):
+    cursor.execute("""
+    SELECT 1 FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+def index_exists(cursor, table, index):
+    cursor.execute("""
+    SELECT 1 FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+def primary_key_columns(cursor, table):
+    cursor.execute("""
+    SELECT COLUMN_NAME FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY' ORDER BY SEQ_IN_INDEX
+    """, (table,))
+    return [row['COLUMN_NAME'] for row in cursor.fetchall()]
+
+def add_column(table, column, definition, backfill=None):
+    """ADD COLUMN unless it exists; `backfill` SQL runs only if it was added."""
+    def step(cursor):
+        if column_exists(cursor, table, column): return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        if backfill: cursor.execute(backfill)
+        return True
+    return (f"{table}.{column}", step)
+
+def rename_column(table, old, new):
+    def step(cursor):
+        if column_exists(cursor, table, new) or not column_exists(cursor, table, old): return False
+        cursor.execute(f"ALTER TABLE {table} RENAME COLUMN {old} TO {new}")
+        return True
+    return (f"{table}.{old} -> {new}", step)
+
+def add_index(table, index, columns):
+    def step(cursor):
+        if index_exists(cursor, table, index): return False
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({', '.join(columns)})")
+        return True
+    return (f"{table}.{index} ({', '.join(columns)})", step)
+
+def set_primary_key(table, columns):
+    def step(cursor):
+        if primary_key_columns(cursor, table) == list(columns): return False
+        cursor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY ({', '.join(columns)})")
+        return True
+    return (f"{table} PRIMARY KEY ({', '.join(columns)})", step)
+
+def run_sql(name, *statements):
+    """Data steps: safe to re-run (INSERT IGNORE and the like)."""
+    def step(cursor):
+        return sum(cursor.execute(statement) for statement in statements) > 0
+    return (name, step)
+
+# Every segment each confirmed ticket rides, from its boarding stop to its
+# alighting stop (the whole run without them); 64 is main.MAX_SEGMENTS.
+# Trains with no stops on file are one segment.
+RESERVATION_SEGMENTS_BACKFILL = """
+INSERT IGNORE INTO Seat_Reservations (seat_id, journey_date, segment, passenger_id)
+SELECT ti.seat_id, b.journey_date, seg.stop_sequence, ti.passenger_id
+FROM Tickets ti JOIN Passengers p ON ti.passenger_id = p.passenger_id JOIN Bookings b ON p.pnr_number = b.pnr_number
+JOIN (SELECT train_number, MAX(stop_sequence) AS last_stop FROM Train_Stops GROUP BY train_number) run
+    ON run.train_number = b.train_number
+LEFT JOIN Train_Stops f ON f.train_number = b.train_number AND f.station_code = b.from_station_code
+LEFT JOIN Train_Stops t ON t.train_number = b.train_number AND t.station_code = b.to_station_code
+JOIN Train_Stops seg ON seg.train_number = b.train_number
+    AND seg.stop_sequence >= COALESCE(f.stop_sequence, 0)
+    AND seg.stop_sequence < LEAST(COALESCE(t.stop_sequence, run.last_stop), 64)
+WHERE ti.status = 'CNF' AND ti.seat_id IS NOT NULL
+"""
+RESERVATION_UNSTOPPED_BACKFILL = """
+INSERT IGNORE INTO Seat_Reservations (seat_id, journey_date, segment, passenger_id)
+SELECT ti.seat_id, b.journey_date, 0, ti.passenger_id
+FROM Tickets ti JOIN Passengers p ON ti.passenger_id = p.passenger_id JOIN Bookings b ON p.pnr_number = b.pnr_number
+WHERE ti.status = 'CNF' AND ti.seat_id IS NOT NULL
+AND NOT EXISTS (SELECT 1 FROM Train_Stops ts WHERE ts.train_number = b.train_number AND ts.stop_sequence > 0)
+"""
+
+# --- MIGRATIONS ---
+# Append only; a released migration never changes. Fresh installs get the
+# same result from create_tables.sql, so keep the two in step.
+MIGRATIONS = [
+    ("0001", "Align the schema with the columns main.py and seed_database.py use", [
+        rename_column("Routes", "station_a_code", "start_station_code"),
+        rename_column("Routes", "station_b_code", "end_station_code"),
+        add_column("Routes", "departure_time", "TIME"),
+        add_column("Routes", "arrival_time", "TIME"),
+        add_column("Trains", "base_fare", "DECIMAL(10, 2) NOT NULL DEFAULT 0"),
+        add_column("Coaches", "total_berths", "INT NOT NULL DEFAULT 0",
+                   "UPDATE Coaches c SET total_berths = (SELECT COUNT(*) FROM Seats s WHERE s.coach_id = c.coach_id)"),
+        add_column("Passengers", "seat_class", "VARCHAR(20)",
+                   "UPDATE Passengers p JOIN Tickets t ON t.passenger_id = p.passenger_id SET p.seat_class = t.seat_class"),
+        add_column("Tickets", "berth_type", "VARCHAR(20)",
+                   "UPDATE Tickets t JOIN Seats s ON t.seat_id = s.seat_id SET t.berth_type = s.berth_type"),
+        add_column("Users", "created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
+        add_column("Bookings", "from_station_code", "VARCHAR(10)"),
+        add_column("Bookings", "to_station_code", "VARCHAR(10)"),
+        add_column("Waitlist", "from_stop", "TINYINT NOT NULL DEFAULT 0"),
+        add_column("Waitlist", "to_stop", "TINYINT NOT NULL DEFAULT 1"),
+        add_column("Seat_Reservations", "segment", "TINYINT NOT NULL DEFAULT 0 AFTER journey_date"),
+        set_primary_key("Seat_Reservations", ("seat_id", "journey_date", "segment")),
+    ]),
+    ("0002", "Indexes for the hot query paths (see `flask check-indexes`)", [
+        add_index("Bookings", "idx_bookings_user_date", ("user_id", "journey_date")),
+        add_index("Bookings", "idx_bookings_train_date", ("train_number", "journey_date")),
+        add_index("Passengers", "idx_passengers_pnr", ("pnr_number",)),
+        add_index("Tickets", "idx_tickets_passenger_status", ("passenger_id", "status")),
+        add_index("Coaches", "idx_coaches_train_class", ("train_number", "coach_class", "total_berths")),
+        add_index("Seats", "idx_seats_coach", ("coach_id", "seat_number")),
+        add_index("Seat_Availability", "idx_seat_availability_date", ("journey_date",)),
+    ]),
+    ("0003", "Reserve every segment of tickets confirmed before segments existed", [
+        run_sql("Seat_Reservations segments", RESERVATION_SEGMENTS_BACKFILL, RESERVATION_UNSTOPPED_BACKFILL),
+    ]),
+]
+
+# --- RUNNER ---
+
+def schema_statements(path=SCHEMA_FILE):
+    """The CREATE TABLE IF NOT EXISTS statements of create_tables.sql."""
+    with open(path) as f:
+        sql = re.sub(r"/\*.*?\*/", "", f.read(), flags=re.S)
+    statements = [s.strip() for s in sql.split(";")]
+    return [s for s in statements if s.upper().startswith("CREATE TABLE IF NOT EXISTS")]
+
+def applied_versions(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS Schema_Migrations (
+        version VARCHAR(10) PRIMARY KEY,
+        description VARCHAR(200) NOT NULL,
+        applied_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("SELECT version FROM Schema_Migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+def migrate(conn):
+    """Applies every pending migration; returns the versions applied."""
+    cursor = conn.cursor()
+    for statement in schema_statements():
+        cursor.execute(statement)
+    done = applied_versions(cursor)
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version in done: continue
+        print(f"Applying {version}: {description}")
+        # MySQL commits DDL as it goes, so a failed step leaves the earlier
+        # ones in place; every step is safe to re-run, so just run it again
+        for name, step in steps:
+            print(f"  {'changed' if step(cursor) else 'already done'}: {name}")
+        cursor.execute("INSERT INTO Schema_Migrations (version, description) VALUES (%s, %s)", (version, description))
+        conn.commit()
+        applied.append(version)
+    return applied
+
+def explain_full_scans(conn, queries, allowed_scans=None):
+    """EXPLAINs each (name, sql, params) and returns a problem per table that
+    is read with a full scan.
+
+    `allowed_scans` maps a query name to the tables it may scan although an
+    index could serve: on a small table the optimizer rightly prefers the
+    scan. Those are printed, not failed; everything else fails, with or
+    without a usable index.
+    """
+    allowed_scans = allowed_scans or {}
+    problems = []
+    cursor = conn.cursor()
+    for name, sql, params in queries:
+        cursor.execute("EXPLAIN " + sql, params)
+        for row in cursor.fetchall():
+            table = row.get('table') or ''
+            if row.get('type') not in ('ALL', 'index') or table.startswith('<'):
+                continue # Index lookups, and derived/union tables built by the query itself
+            if not row.get('possible_keys'):
+                problems.append(f"{name}: full scan of {table} ({row.get('rows')} rows), no usable index")
+            elif table in allowed_scans.get(name, ()):
+                print(f"  allowed: {name}: {table} scanned although {row['possible_keys']} could serve")
+            else:
+                problems.append(f"{name}: full scan of {table} ({row.get('rows')} rows) although {row['possible_keys']} could serve")
+    return problems
+
+def main():
+    conn = db_pool.connection()
+    try:
+        if "--status" in sys.argv:
+            done = applied_versions(conn.cursor())
+            for version, description, _ in MIGRATIONS:
+                print(f"{version} {'applied' if version in done else 'pending'}  {description}")
+            return
+        applied = migrate(conn)
+        print(f"Applied {len(applied)} migration(s)." if applied else "Schema is up to date.")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
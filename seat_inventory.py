@@ -0,0 +1,144 @@
+"""In-process cache of seat occupancy.
+
+Each (coach, journey date) is held as a C array with one 64-bit mask per
+seat over the train's route segments (see the SEGMENT OCCUPANCY section of
+core_logic.h): bit s set means the seat is sold from stop s to stop s + 1.
+A seat freed at an intermediate stop can be sold again from there on. The
+masks are loaded from the database the first time a coach/date is booked and
+then kept up to date by the booking and cancellation paths, so a booking is
+one C++ call over a few hundred words instead of a query for every booked
+seat.
+
+The cache belongs to one process: bookings and cancellations made by
+another worker process are not seen until the entry is evicted. The masks
+are only a fast first guess, and both ways it can be wrong are corrected:
+the Seat_Reservations primary key in the database is what guarantees a seat
+segment is sold once, and a booking that loses that race evicts its stale
+entries and tries again; before a passenger is queued for want of a seat
+(or a promotion seats nobody), the class is evicted and reloaded, so seats
+freed elsewhere are found.
+"""
+import ctypes
+import threading
+from collections import OrderedDict
+
+from core_bridge import core_lib, BookingResult
+from metrics import ffi_call
+
+MAX_CACHED_COACH_DAYS = 20000
+
+class CoachOccupancy:
+    """Sold segments of every seat of one coach on one journey date."""
+
+    def __init__(self, coach_id, total_seats, seat_id_start, sold_segments):
+        self.coach_id = coach_id
+        self.total_seats = total_seats
+        self.seat_id_start = seat_id_start
+        self.seat_masks = (ctypes.c_uint64 * total_seats)()
+        for seat, segment in sold_segments:
+            if 1 <= seat <= total_seats and 0 <= segment < 64:
+                self.seat_masks[seat - 1] |= 1 << segment
+
+    def free_seats(self, from_stop, to_stop):
+        with ffi_call('count_free_seats_segments'):
+            return core_lib.count_free_seats_segments(self.seat_masks, self.total_seats, from_stop, to_stop)
+
+class SeatInventory:
+    """LRU of CoachOccupancy keyed by (coach_id, journey_date).
+
+    One lock guards every entry; an allocation only holds it for the C++
+    call.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_COACH_DAYS):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(coach_id, journey_date):
+        # Dates arrive as 'YYYY-MM-DD' strings from requests and as `date`
+        # objects from the database; both print the same way
+        return (int(coach_id), str(journey_date))
+
+    def get_many(self, coaches, journey_date, load_sold_segments):
+        """Occupancy for several coaches of one date, in the order given.
+
+        `coaches` are dicts with coach_id, total_berths and seat_id_start.
+        `load_sold_segments(coach_ids)` is called once with every coach that
+        missed and returns {coach_id: [(seat_number, segment), ...]}.
+        """
+        entries, missing = {}, []
+        with self.lock:
+            for coach in coaches:
+                key = self.key(coach['coach_id'], journey_date)
+                entry = self.entries.get(key)
+                if entry is None:
+                    missing.append(coach)
+                    continue
+                self.entries.move_to_end(key)
+                entries[key] = entry
+        if missing:
+            # Load outside the lock; if two requests race, the first one in wins
+            sold = load_sold_segments([coach['coach_id'] for coach in missing])
+            for coach in missing:
+                loaded = CoachOccupancy(coach['coach_id'], coach['total_berths'], coach['seat_id_start'],
+                                        sold.get(coach['coach_id'], []))
+                with self.lock:
+                    key = self.key(coach['coach_id'], journey_date)
+                    entries[key] = self.entries.setdefault(key, loaded)
+                    self.entries.move_to_end(key)
+            with self.lock:
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return [entries[self.key(coach['coach_id'], journey_date)] for coach in coaches]
+
+    def allocate_group(self, coaches, segment_count, from_stop, to_stop, preferences):
+        """Seats a party travelling from_stop -> to_stop in one C++ call.
+
+        Returns one (coach, BookingResult) per preference, in order; coach
+        is None where the passenger could not be seated (status "WL").
+        """
+        args = self._coach_args(coaches, segment_count)
+        return self._call(core_lib.allocate_group, coaches, args + [from_stop, to_stop], preferences)
+
+    def allocate_in_order(self, coaches, segment_count, journeys, preferences):
+        """Seats a queue head first; journeys[i] is passenger i's (from_stop, to_stop)."""
+        args = self._coach_args(coaches, segment_count)
+        from_stops = (ctypes.c_int * len(journeys))(*[a for a, _ in journeys])
+        to_stops = (ctypes.c_int * len(journeys))(*[b for _, b in journeys])
+        return self._call(core_lib.allocate_in_order, coaches, args + [from_stops, to_stops], preferences)
+
+    @staticmethod
+    def _coach_args(coaches, segment_count):
+        count = len(coaches)
+        seat_masks = (ctypes.POINTER(ctypes.c_uint64) * count)(
+            *[ctypes.cast(c.seat_masks, ctypes.POINTER(ctypes.c_uint64)) for c in coaches])
+        total_seats = (ctypes.c_int * count)(*[c.total_seats for c in coaches])
+        seat_id_starts = (ctypes.c_int * count)(*[c.seat_id_start for c in coaches])
+        return [seat_masks, total_seats, seat_id_starts, count, segment_count]
+
+    def _call(self, allocator, coaches, args, preferences):
+        passengers = len(preferences)
+        results = (BookingResult * passengers)()
+        coach_index = (ctypes.c_int * passengers)()
+        with self.lock, ffi_call(allocator.__name__):
+            allocator(*args, "\n".join(preferences).encode('utf-8'), passengers, results, coach_index)
+        return [(coaches[coach_index[i]] if coach_index[i] >= 0 else None, results[i]) for i in range(passengers)]
+
+    def evict(self, coach_ids, journey_date):
+        """Drops cached entries that turned out to be stale (another process
+        sold one of their seats); the next booking reloads them."""
+        with self.lock:
+            for coach_id in coach_ids:
+                self.entries.pop(self.key(coach_id, journey_date), None)
+
+    def release(self, coach_id, journey_date, seat_number, from_stop, to_stop):
+        """Frees a seat's segments in the cache, if that coach/date is cached."""
+        with self.lock:
+            entry = self.entries.get(self.key(coach_id, journey_date))
+            if entry is not None:
+                with ffi_call('release_seat_segments'):
+                    core_lib.release_seat_segments(entry.seat_masks, entry.total_seats, int(seat_number), from_stop, to_stop)
+
+seat_inventory = SeatInventory()
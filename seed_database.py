@@ -1,23 +1,20 @@
-import pymysql.cursors
+import argparse
+import csv
+import math
 import os
-from dotenv import load_dotenv
 import random
+from datetime import date, datetime, timedelta
 
-# --- 1. CONNECT TO THE DATABASE ---
-# (This is the same logic as your new main.py)
-load_dotenv()
-
-DB_CONFIG = {
-    'host': '127.0.0.1',           
-    'user': 'root',                
-    'password': os.getenv('DB_PASSWORD'),
-    'database': 'railway_management_system',
-    'cursorclass': pymysql.cursors.DictCursor
-}
+import pymysql
+from werkzeug.security import generate_password_hash
+
+from db import db_pool, DB_CONFIG
 
+# --- 1. CONNECT TO THE DATABASE ---
+# (The same pool and config as main.py, from db.py)
 def get_db_connection():
     try:
-        conn = pymysql.connect(**DB_CONFIG)
+        conn = db_pool.connection()
         return conn
     except Exception as err:
         print(f"FATAL: Error connecting to MySQL: {err}")
@@ -32,6 +29,15 @@ TRAINS_TO_CREATE = [
     ('12859', 'Gitanjali Express', 650.00)
 ]
 
+# Their runs, for train searches: (station, arrival, departure) per stop.
+# Same as database/load_station_data.sql, which has the stations
+DEMO_TRAIN_STOPS = {
+    '12001': [('DEL', None, '06:00'), ('AGR', '09:53', '10:30'), ('JAI', '14:31', None)],
+    '12951': [('AGR', None, '08:15'), ('BHO', '16:43', '19:40'), ('NAG', '02:10', '07:05'),
+              ('HYD', '15:25', '21:30'), ('MUM', '09:19', None)],
+    '12859': [('MUM', None, '11:00'), ('GOA', '20:50', '22:10'), ('BAN', '07:29', '09:20'), ('COI', '15:23', None)],
+}
+
 # Define the coaches for EACH train
 # (Coach Name, Class, Total Berths)
 COACH_LAYOUT = [
@@ -84,9 +90,14 @@ def clear_inventory_tables(cursor):
     # We must delete in reverse order of creation
     # to avoid foreign key constraint errors.
     cursor.execute("SET FOREIGN_KEY_CHECKS=0;")
+    # Seat IDs restart at 1: nothing may still point at the old seats
+    cursor.execute("TRUNCATE TABLE Waitlist;")
+    cursor.execute("TRUNCATE TABLE Seat_Reservations;")
+    cursor.execute("TRUNCATE TABLE Seat_Availability;")
     cursor.execute("TRUNCATE TABLE Tickets;")
     cursor.execute("TRUNCATE TABLE Seats;")
     cursor.execute("TRUNCATE TABLE Coaches;")
+    cursor.execute("TRUNCATE TABLE Train_Stops;")
     cursor.execute("TRUNCATE TABLE Trains;")
     cursor.execute("SET FOREIGN_KEY_CHECKS=1;")
     print("Old data cleared.")
@@ -137,6 +148,21 @@ def generate_inventory_data():
             seat_query = "INSERT INTO Seats (coach_id, seat_number, berth_type) VALUES (%s, %s, %s)"
             cursor.executemany(seat_query, seat_data_to_insert)
 
+            # --- 5. TRAIN RUNS ---
+            # Without them train searches find nothing. The stations may be
+            # loaded afterwards (load_station_data.sql), hence no FK checks
+            print("Inserting the trains' stops...")
+            cursor.execute("SET FOREIGN_KEY_CHECKS=0;")
+            cursor.executemany(
+                "INSERT INTO Train_Stops (train_number, stop_sequence, station_code, arrival_time, departure_time) VALUES (%s, %s, %s, %s, %s)",
+                [(train_num, seq, station, arrival, departure)
+                 for train_num, stops in DEMO_TRAIN_STOPS.items() for seq, (station, arrival, departure) in enumerate(stops)]
+            )
+            cursor.execute("SET FOREIGN_KEY_CHECKS=1;")
+            # Running app processes rebuild their route graphs
+            cursor.execute("INSERT INTO Route_Graph_Version (id, version) VALUES (1, 1) "
+                           "ON DUPLICATE KEY UPDATE version = version + 1")
+
             # Commit all changes
             conn.commit()
             print("Database seeding complete!")
@@ -148,8 +174,287 @@ def generate_inventory_data():
         if conn:
             conn.close()
 
+# --- 3b. LARGE-SCALE GENERATOR ---
+# `python seed_database.py --generate ...` builds a capacity-test database:
+# a station grid, trains running timed routes over it, every coach and
+# seat, and bookings with their passengers, tickets and seat reservations.
+# Rows are streamed to the database in batches (or to CSV files loaded with
+# LOAD DATA LOCAL INFILE), so memory stays flat however large the scale.
+# The same --seed and --start-date always produce the same rows.
+#
+# It REPLACES all stations, routes, trains, bookings and generated users.
+
+GENERATED_EMAIL = "gen{}@example.test"
+GENERATED_PASSWORD = "password"
+DEFAULT_START_DATE = date(2027, 1, 1)
+# Same names the C++ allocator writes to Tickets.berth_type
+BERTH_BY_MOD8 = ("SIDE_UPPER", "LOWER", "MIDDLE", "UPPER", "LOWER", "MIDDLE", "UPPER", "SIDE_LOWER")
+CLASS_FARE_MULTIPLIER = {'Sleeper': 1.0, 'AC3': 2.5, 'AC2': 3.5, 'AC1': 6.0}
+TRAIN_SPEED_KMH = 70
+DWELL_MINUTES = 5
+KM_PER_GRID_STEP = 60
+
+class TableWriter:
+    """Streams rows into one table.
+
+    Batched multi-row INSERTs committed every `batch_size` rows, or with
+    `bulk_dir` a CSV file loaded in one LOAD DATA LOCAL INFILE at close().
+    """
+
+    def __init__(self, conn, table, columns, batch_size, bulk_dir=None):
+        self.conn = conn
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+        self.path = None
+        if bulk_dir:
+            self.path = os.path.join(bulk_dir, f"{table}.csv")
+            self.file = open(self.path, "w", newline="")
+            self.csv = csv.writer(self.file, lineterminator="\n")
+
+    def add(self, row):
+        self.count += 1
+        if self.path:
+            self.csv.writerow([r"\N" if value is None else value for value in row])
+            return
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size: self.flush()
+
+    def flush(self):
+        if not self.rows: return
+        with self.conn.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({', '.join(['%s'] * len(self.columns))})", self.rows)
+        self.conn.commit()
+        self.rows = []
+
+    def close(self):
+        if self.path:
+            self.file.close()
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"""
+                LOAD DATA LOCAL INFILE %s INTO TABLE {self.table}
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' LINES TERMINATED BY '\\n'
+                ({', '.join(self.columns)})
+                """, (self.path,))
+            self.conn.commit()
+        else:
+            self.flush()
+        print(f"  {self.table}: {self.count:,} rows")
+
+def clear_generated_tables(conn):
+    print("Clearing stations, routes, trains and bookings...")
+    with conn.cursor() as cursor:
+        cursor.execute("SET FOREIGN_KEY_CHECKS=0;")
+        for table in ("Waitlist", "Seat_Reservations", "Seat_Availability", "Daily_Stats", "Tickets", "Passengers", "Bookings",
+                      "Seats", "Coaches", "Train_Stops", "Routes", "Trains", "Stations"):
+            cursor.execute(f"TRUNCATE TABLE {table};")
+        cursor.execute("DELETE FROM Users WHERE email LIKE %s", (GENERATED_EMAIL.format("%"),))
+        cursor.execute("SET FOREIGN_KEY_CHECKS=1;")
+    conn.commit()
+
+def station_grid(count, rng):
+    """Stations on a jittered square grid, each linked to its grid neighbours.
+
+    Returns (stations, neighbours): stations are (code, name, lat, lon),
+    neighbours[i] the indices reachable from station i.
+    """
+    side = math.ceil(math.sqrt(count))
+    stations, neighbours = [], []
+    for i in range(count):
+        row, col = divmod(i, side)
+        lat = 8.0 + row * 0.5 + rng.uniform(-0.2, 0.2)
+        lon = 68.0 + col * 0.5 + rng.uniform(-0.2, 0.2)
+        stations.append((f"S{i:05d}", f"Station {i}", round(lat, 6), round(lon, 6)))
+        links = [j for j in (i - side, i + side, i - 1 if col else -1, i + 1 if col + 1 < side else -1) if 0 <= j < count]
+        neighbours.append(links)
+    return stations, neighbours
+
+def grid_distance_km(a, b):
+    return max(1, round(math.hypot(a[2] - b[2], a[3] - b[3]) / 0.5 * KM_PER_GRID_STEP))
+
+def train_run(stations, neighbours, stop_count, rng):
+    """A random walk without repeats: the stop indices of one train."""
+    stops = [rng.randrange(len(stations))]
+    while len(stops) < stop_count:
+        options = [j for j in neighbours[stops[-1]] if j not in stops]
+        if not options: break
+        stops.append(rng.choice(options))
+    return stops
+
+def clock(minutes):
+    minutes %= 24 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+def generate_scale_data(args):
+    rng = random.Random(args.seed)
+    conn = db_pool.connection()
+    bulk_conn = pymysql.connect(**DB_CONFIG, local_infile=True) if args.bulk_dir else None
+    if args.bulk_dir: os.makedirs(args.bulk_dir, exist_ok=True)
+    load_conn = bulk_conn or conn
+    def writer(table, columns):
+        return TableWriter(load_conn, table, columns, args.batch_size, args.bulk_dir)
+
+    try:
+        clear_generated_tables(conn)
+        with load_conn.cursor() as cursor:
+            # Only affects this session; every row written is consistent anyway
+            cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+            cursor.execute("SET UNIQUE_CHECKS=0")
+
+        # --- Users ---
+        print(f"Generating {args.users:,} users...")
+        password_hash = generate_password_hash(GENERATED_PASSWORD)
+        users = writer("Users", ("username", "email", "password_hash"))
+        for i in range(args.users):
+            users.add((f"gen{i}", GENERATED_EMAIL.format(i), password_hash))
+        users.close()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT user_id FROM Users WHERE email LIKE %s ORDER BY user_id", (GENERATED_EMAIL.format("%"),))
+            user_ids = [row['user_id'] for row in cursor.fetchall()]
+        conn.commit()
+
+        # --- Stations ---
+        print(f"Generating {args.stations:,} stations...")
+        stations, neighbours = station_grid(args.stations, rng)
+        station_rows = writer("Stations", ("station_code", "station_name", "latitude", "longitude"))
+        for station in stations: station_rows.add(station)
+        station_rows.close()
+
+        # --- Trains, their stops and timed routes, coaches and seats ---
+        print(f"Generating {args.trains:,} trains...")
+        trains = writer("Trains", ("train_number", "train_name", "base_fare"))
+        stops_rows = writer("Train_Stops", ("train_number", "stop_sequence", "station_code", "arrival_time", "departure_time"))
+        routes = writer("Routes", ("start_station_code", "end_station_code", "departure_time", "arrival_time", "distance_km"))
+        coaches = writer("Coaches", ("coach_id", "train_number", "coach_name", "coach_class", "total_berths"))
+        seats = writer("Seats", ("seat_id", "coach_id", "seat_number", "berth_type"))
+        # train_number -> (segment_count, base_fare, {class: [(seat_id_start, total_berths), ...]})
+        inventory = {}
+        coach_id = seat_id = 0
+        for t in range(args.trains):
+            train_number = f"{10000 + t}"
+            run = train_run(stations, neighbours, rng.randint(args.min_stops, args.max_stops), rng)
+            distance = sum(grid_distance_km(stations[a], stations[b]) for a, b in zip(run, run[1:]))
+            base_fare = round(100 + distance * 0.6, 2)
+            trains.add((train_number, f"Express {train_number}", base_fare))
+
+            minutes = rng.randrange(24 * 60)
+            for seq, station in enumerate(run):
+                arrival = clock(minutes) if seq else None
+                if seq: minutes += DWELL_MINUTES
+                departure = clock(minutes) if seq + 1 < len(run) else None
+                stops_rows.add((train_number, seq, stations[station][0], arrival, departure))
+                if seq + 1 < len(run):
+                    km = grid_distance_km(stations[station], stations[run[seq + 1]])
+                    leave = minutes
+                    minutes += max(1, round(km * 60 / TRAIN_SPEED_KMH))
+                    routes.add((stations[station][0], stations[run[seq + 1]][0], clock(leave), clock(minutes), km))
+
+            by_class = {}
+            for coach_name, coach_class, total_berths in COACH_LAYOUT:
+                coach_id += 1
+                coaches.add((coach_id, train_number, coach_name, coach_class, total_berths))
+                # Seat IDs of a coach are contiguous; the booking code relies on it
+                by_class.setdefault(coach_class, []).append((seat_id + 1, total_berths))
+                for number in range(1, total_berths + 1):
+                    seat_id += 1
+                    seats.add((seat_id, coach_id, str(number), get_berth_type(number, coach_class)))
+            inventory[train_number] = (max(1, min(len(run) - 1, 64)), base_fare, by_class)
+        for table in (trains, stops_rows, routes, coaches, seats): table.close()
+        with conn.cursor() as cursor:
+            # Running app processes rebuild their route graphs
+            cursor.execute("INSERT INTO Route_Graph_Version (id, version) VALUES (1, 1) "
+                           "ON DUPLICATE KEY UPDATE version = version + 1")
+        conn.commit()
+
+        # --- Bookings ---
+        # Every booking is a whole-run journey; seats of a train/date/class are
+        # handed out in order, so no seat is ever sold twice
+        print(f"Generating {args.bookings:,} bookings over {args.days} days...")
+        bookings = writer("Bookings", ("pnr_number", "user_id", "train_number", "journey_date", "booking_status", "total_fare", "booked_on"))
+        passengers = writer("Passengers", ("passenger_id", "pnr_number", "name", "age", "gender", "seat_class"))
+        tickets = writer("Tickets", ("ticket_id", "passenger_id", "seat_id", "status", "seat_class", "berth_type"))
+        reservations = writer("Seat_Reservations", ("seat_id", "journey_date", "segment", "passenger_id"))
+        # Every date derives from --start-date, so a seed gives the same rows on any day
+        first_day = args.start_date
+        booking_window_end = datetime.combine(first_day - timedelta(days=1), datetime.min.time())
+        train_numbers = list(inventory)
+        sold = {} # (train, day, class) -> seats sold so far
+        passenger_id = skipped = 0
+        for b in range(args.bookings):
+            train_number = rng.choice(train_numbers)
+            journey_date = first_day + timedelta(days=rng.randrange(args.days))
+            segment_count, base_fare, by_class = inventory[train_number]
+            seat_class = rng.choice(list(by_class))
+            party = rng.randint(1, args.max_party)
+            key = (train_number, journey_date, seat_class)
+            start = sold.get(key, 0)
+            capacity = sum(berths for _, berths in by_class[seat_class])
+            if start + party > capacity:
+                skipped += 1
+                continue
+            sold[key] = start + party
+
+            pnr = f"PNR{b:010d}"
+            booked_on = booking_window_end - timedelta(minutes=rng.randrange(60 * 24 * 60)) # Some time in the 60 days before
+            fare = round(base_fare * CLASS_FARE_MULTIPLIER.get(seat_class, 1.0) * party, 2)
+            bookings.add((pnr, rng.choice(user_ids), train_number, journey_date.isoformat(), 'CONFIRMED', fare,
+                          booked_on.strftime('%Y-%m-%d %H:%M:%S')))
+            for n in range(start, start + party):
+                passenger_id += 1
+                # n-th seat of the class -> (coach, seat number)
+                for seat_id_start, berths in by_class[seat_class]:
+                    if n < berths: break
+                    n -= berths
+                seat = seat_id_start + n
+                passengers.add((passenger_id, pnr, f"Passenger {passenger_id}", rng.randint(5, 80),
+                                rng.choice(("Male", "Female")), seat_class))
+                tickets.add((passenger_id, passenger_id, seat, 'CNF', seat_class, BERTH_BY_MOD8[(n + 1) % 8]))
+                for segment in range(segment_count):
+                    reservations.add((seat, journey_date.isoformat(), segment, passenger_id))
+        for table in (bookings, passengers, tickets, reservations): table.close()
+        if skipped: print(f"  ({skipped:,} bookings skipped: class already full)")
+
+        print("Done. Rebuild the derived tables with:\n"
+              "  flask --app main rebuild-availability\n"
+              "  flask --app main rebuild-daily-stats")
+    except Exception as e:
+        print(f"\nAn error occurred: {e}")
+        load_conn.rollback()
+        raise
+    finally:
+        with load_conn.cursor() as cursor:
+            cursor.execute("SET UNIQUE_CHECKS=1")
+            cursor.execute("SET FOREIGN_KEY_CHECKS=1")
+        conn.close()
+        if bulk_conn: bulk_conn.close()
+
 # --- 5. RUN THE SCRIPT ---
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed the railway database.")
+    parser.add_argument("--generate", action="store_true", help="build a large synthetic dataset instead of the 3 demo trains")
+    parser.add_argument("--seed", type=int, default=42, help="random seed; the same seed gives the same data")
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--trains", type=int, default=2000, help=f"each has {sum(c[2] for c in COACH_LAYOUT)} seats")
+    parser.add_argument("--min-stops", type=int, default=5)
+    parser.add_argument("--max-stops", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--bookings", type=int, default=500000)
+    parser.add_argument("--start-date", type=date.fromisoformat, default=DEFAULT_START_DATE,
+                        help="first journey date, YYYY-MM-DD; bookings are made in the 60 days before it")
+    parser.add_argument("--days", type=int, default=30, help="journey dates start on --start-date and span this many days")
+    parser.add_argument("--max-party", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT batch")
+    parser.add_argument("--bulk-dir", help="write CSV files here and load them with LOAD DATA LOCAL INFILE "
+                                           "(the server needs local_infile=ON)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     print("Starting database seed script...")
-    generate_inventory_data()
+    if args.generate:
+        generate_scale_data(args)
+    else:
+        generate_inventory_data()
     print("Script finished.")
\ No newline at end of file
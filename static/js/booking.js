@@ -6,6 +6,9 @@ document.addEventListener("DOMContentLoaded", () => {
     const journeyDate = urlParams.get('date');
     const baseFare = parseFloat(urlParams.get('base_fare'));
     const seatClass = urlParams.get('class');
+    // Boarding / alighting stations: seats are sold per stretch of the run
+    const fromStation = urlParams.get('from');
+    const toStation = urlParams.get('to');
 
     // Populate the summary box
     document.getElementById('summary-train-name').innerText = `${trainNumber} - ${trainName}`;
@@ -35,6 +38,8 @@ document.addEventListener("DOMContentLoaded", () => {
                 train_name: trainName,
                 journey_date: journeyDate,
                 seat_class: seatClass,
+                from_station: fromStation,
+                to_station: toStation,
                 total_fare: baseFare,
                 name: passengerName,
                 age: passengerAge,
@@ -62,7 +62,12 @@ document.addEventListener("DOMContentLoaded", () => {
                 localStorage.removeItem("pendingBooking");
                 
                 // Show success message and redirect to the ticket page
-                showMessage("Payment Successful! Booking Confirmed.", "success");
+                const queued = (result.seats || []).filter(seat => seat.status !== "CNF");
+                if (queued.length > 0) {
+                    showMessage(`Payment Successful! Booked as ${queued.map(seat => seat.status).join(", ")}; you'll be moved up as seats free.`, "success");
+                } else {
+                    showMessage("Payment Successful! Booking Confirmed.", "success");
+                }
                 payNowBtn.innerText = "Success!";
                 payNowBtn.classList.remove("bg-green-600", "hover:bg-green-700");
                 payNowBtn.classList.add("bg-blue-600");
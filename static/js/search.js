@@ -11,11 +11,13 @@ document.addEventListener("DOMContentLoaded", () => {
     // --- 1. Fetch Train Search Results ---
     async function fetchTrainResults() {
         try {
-            const response = await fetch(`/api/search_trains?from=${fromStation}&to=${toStation}`);
+            const response = await fetch(`/api/search_trains?from=${fromStation}&to=${toStation}${searchDate ? `&date=${searchDate}` : ''}`);
             const results = await response.json();
 
             loadingSpinner.classList.add("hidden");
-            if (results && results.length > 0) {
+            if (!response.ok) {
+                resultsContainer.innerHTML = `<p class="text-center text-red-600">${results.message || "Error loading results."}</p>`;
+            } else if (results && results.length > 0) {
                 displayResults(results);
             } else {
                 resultsContainer.innerHTML = `<p class="text-center text-gray-600">No trains found for this route.</p>`;
@@ -27,11 +29,50 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
+    function sleeperAvailability(train) {
+        const sleeper = (train.seat_availability || {})["Sleeper"];
+        if (!sleeper) return "";
+        if (sleeper.available > 0) return `Sleeper: ${sleeper.available} available`;
+        return `Sleeper: RAC ${sleeper.rac} / WL ${sleeper.wl}`;
+    }
+
+    function durationText(minutes) {
+        return `${Math.floor(minutes / 60)}h ${minutes % 60}m`;
+    }
+
+    function changesText(train) {
+        if (!train.transfers) return "Direct Route";
+        const stations = train.legs.slice(1).map(leg => leg.from).join(", ");
+        return `${train.transfers} change${train.transfers > 1 ? "s" : ""} at ${stations}`;
+    }
+
+    // Routes-only timetables (no train runs on file) give journeys without trains
+    function trainLabel(leg) {
+        return leg.train_number ? `<strong>${leg.train_name}</strong> (${leg.train_number})` : "Timetable route";
+    }
+
+    // One line per leg for itineraries with changes, each bookable on its own
+    function legsList(train) {
+        if (!train.transfers) return "";
+        return `
+            <div class="px-6 pb-4 space-y-2">
+                ${train.legs.map(leg => `
+                    <div class="flex justify-between items-center text-sm text-gray-700 border-t pt-2">
+                        <span>${trainLabel(leg)}</span>
+                        <span>${leg.from} ${leg.departure_time} &rarr; ${leg.to} ${leg.arrival_time}</span>
+                        <span>${sleeperAvailability(leg)}</span>
+                        ${leg.train_number ? `
+                        <a href="/book-ticket?train=${leg.train_number}&train_name=${leg.train_name}&date=${leg.journey_date}&class=Sleeper&from=${leg.from}&to=${leg.to}"
+                           class="text-blue-600 hover:underline">Book leg</a>` : ""}
+                    </div>`).join("")}
+            </div>`;
+    }
+
     function displayResults(results) {
         resultsContainer.innerHTML = ""; // Clear
         results.forEach(train => {
-            // The C++ result is in 'fastest_path_found'
-            const pathInfo = train.fastest_path_found; 
+            // Stations the itinerary passes through, from the C++ search
+            const pathInfo = train.fastest_path_found;
 
             const trainCard = `
                 <div class="bg-white shadow-lg rounded-xl overflow-hidden transition-all duration-300 hover:shadow-2xl">
@@ -39,8 +80,8 @@ document.addEventListener("DOMContentLoaded", () => {
                         <div class="grid grid-cols-1 md:grid-cols-5 gap-4 items-center">
                             <!-- Train Name -->
                             <div class="md:col-span-2">
-                                <h2 class="text-2xl font-bold text-blue-600">${train.train_name}</h2>
-                                <p class="text-sm text-gray-500">(${train.train_number})</p>
+                                <h2 class="text-2xl font-bold text-blue-600">${train.train_name || "Timetable route"}</h2>
+                                <p class="text-sm text-gray-500">${train.train_number ? `(${train.train_number})` : ""}</p>
                             </div>
                             <!-- Times -->
                             <div class="text-center">
@@ -51,7 +92,7 @@ document.addEventListener("DOMContentLoaded", () => {
                                 <!-- Path info from C++ -->
                                 <p class="text-sm font-medium">${pathInfo}</p>
                                 <div class="w-full h-0.5 bg-gray-300 my-1"></div>
-                                <p class="text-xs">Direct Route</p>
+                                <p class="text-xs">${changesText(train)} &middot; ${durationText(train.duration_minutes)}</p>
                             </div>
                             <div class="text-center">
                                 <p class="text-xl font-semibold text-gray-800">${train.arrival_time}</p>
@@ -59,16 +100,19 @@ document.addEventListener("DOMContentLoaded", () => {
                             </div>
                         </div>
                     </div>
+                    ${legsList(train)}
                     <!-- Footer with Price and Book Button -->
                     <div class="bg-gray-50 p-4 flex justify-between items-center">
                         <div>
                             <p class="text-sm text-gray-600">Starting from</p>
                             <p class="text-2xl font-bold text-green-600">₹${train.base_fare.toFixed(2)}</p>
+                            <p class="text-sm text-gray-600">${sleeperAvailability(train)}</p>
                         </div>
-                        <a href="/book-ticket?train=${train.train_number}&train_name=${train.train_name}&date=${searchDate}&base_fare=${train.base_fare}&class=Sleeper"
+                        ${train.transfers || !train.train_number ? "" : `
+                        <a href="/book-ticket?train=${train.train_number}&train_name=${train.train_name}&date=${train.legs[0].journey_date}&base_fare=${train.base_fare}&class=Sleeper&from=${fromStation}&to=${toStation}"
                            class="px-6 py-3 bg-blue-600 text-white font-medium rounded-lg shadow-md hover:bg-blue-700 transition-all">
                             Book Now
-                        </a>
+                        </a>`}
                     </div>
                 </div>
             `;
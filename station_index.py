@@ -0,0 +1,164 @@
+"""In-memory station lookup: autocomplete by code or name, nearest by coordinates.
+
+A StationIndex is built once from the Stations rows and never changes, so
+any number of threads can query it without a lock; main.py swaps in a new
+one when the stations are reloaded.
+
+Autocomplete works on one sorted array of normalised keys (the code, the
+full name and every word of the name), so a prefix is a range found with
+two binary searches. If a query matches fewer stations than were asked
+for, keys one typo away (a character dropped, added, changed or two
+swapped) are tried too; the candidate characters come from the keys
+themselves, so this only walks branches that exist.
+
+Nearest-station queries use a k-d tree over the stations' positions as
+unit vectors. Straight-line distance between unit vectors grows with
+great-circle distance, so the tree's nearest points are the nearest on
+the globe, with no special cases at the poles or the date line.
+"""
+import bisect
+import heapq
+import math
+import re
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_RESULTS = 50
+
+# Match tiers, best first
+EXACT_CODE, CODE_PREFIX, NAME_PREFIX, WORD_PREFIX, FUZZY = range(5)
+MATCH_NAMES = {EXACT_CODE: "code", CODE_PREFIX: "code_prefix", NAME_PREFIX: "name_prefix",
+               WORD_PREFIX: "word_prefix", FUZZY: "fuzzy"}
+
+def normalize(text):
+    """Casefolded, punctuation turned into single spaces."""
+    return " ".join(re.sub(r"[^\w]+", " ", str(text).casefold()).split())
+
+def unit_vector(latitude, longitude):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+def chord_to_km(chord_squared):
+    return 2 * math.asin(min(1.0, math.sqrt(chord_squared) / 2)) * EARTH_RADIUS_KM
+
+class StationIndex:
+    def __init__(self, rows):
+        """rows: dicts with station_code, station_name, latitude, longitude
+        (coordinates may be None)."""
+        self.stations = [{
+            "station_code": row['station_code'],
+            "station_name": row['station_name'],
+            "latitude": float(row['latitude']) if row.get('latitude') is not None else None,
+            "longitude": float(row['longitude']) if row.get('longitude') is not None else None,
+        } for row in rows]
+        self.build_keys()
+        self.build_tree()
+
+    # --- AUTOCOMPLETE ---
+    def build_keys(self):
+        entries = set()
+        for i, s in enumerate(self.stations):
+            entries.add((normalize(s['station_code']), CODE_PREFIX, i))
+            name = normalize(s['station_name'])
+            entries.add((name, NAME_PREFIX, i))
+            for word in name.split()[1:]:
+                entries.add((word, WORD_PREFIX, i))
+        entries = sorted(entries)
+        self.keys = [key for key, _, _ in entries]
+        self.key_owners = [(tier, i) for _, tier, i in entries]
+
+    def prefix_range(self, prefix, lo=0, hi=None):
+        hi = len(self.keys) if hi is None else hi
+        start = bisect.bisect_left(self.keys, prefix, lo, hi)
+        return start, bisect.bisect_left(self.keys, prefix + "\U0010ffff", start, hi)
+
+    def next_chars(self, prefix):
+        """Distinct characters that follow `prefix` in some key."""
+        lo, hi = self.prefix_range(prefix)
+        n = len(prefix)
+        while lo < hi:
+            key = self.keys[lo]
+            if len(key) <= n:
+                lo += 1
+                continue
+            yield key[n]
+            lo = self.prefix_range(prefix + key[n], lo, hi)[1]
+
+    def typo_variants(self, query):
+        """Prefixes one edit away from `query` that some key starts with."""
+        variants = set()
+        for i in range(len(query)):
+            variants.add(query[:i] + query[i + 1:]) # dropped
+            if i + 1 < len(query):
+                variants.add(query[:i] + query[i + 1] + query[i] + query[i + 2:]) # swapped
+            for c in self.next_chars(query[:i]):
+                variants.add(query[:i] + c + query[i + 1:]) # changed
+                variants.add(query[:i] + c + query[i:]) # added
+        variants.discard(query)
+        variants.discard("")
+        return variants
+
+    def autocomplete(self, query, limit=10):
+        """Best stations for a partial code or name, each with the tier it
+        matched on (exact code, code prefix, name prefix, word prefix, fuzzy)."""
+        query = normalize(query)
+        limit = max(1, min(limit, MAX_RESULTS))
+        if not query: return []
+        best = {} # station -> tier
+        lo, hi = self.prefix_range(query)
+        for k in range(lo, hi):
+            tier, i = self.key_owners[k]
+            if tier == CODE_PREFIX and self.keys[k] == query: tier = EXACT_CODE
+            if tier < best.get(i, FUZZY + 1): best[i] = tier
+        # A one-letter typo in a one- or two-letter query matches nearly everything
+        if len(best) < limit and len(query) >= 3:
+            for variant in self.typo_variants(query):
+                lo, hi = self.prefix_range(variant)
+                for k in range(lo, hi):
+                    best.setdefault(self.key_owners[k][1], FUZZY)
+        ranked = heapq.nsmallest(limit, best.items(),
+                                 key=lambda item: (item[1], len(self.stations[item[0]]['station_name']), item[0]))
+        return [dict(self.stations[i], match=MATCH_NAMES[tier]) for i, tier in ranked]
+
+    # --- NEAREST ---
+    def build_tree(self):
+        # Implicit balanced k-d tree: node of [lo, hi) is at the middle, split
+        # on axis depth % 3; its halves are the subtrees
+        points = [(*unit_vector(s['latitude'], s['longitude']), i) for i, s in enumerate(self.stations)
+                  if s['latitude'] is not None and s['longitude'] is not None]
+
+        def build(lo, hi, axis):
+            if hi - lo <= 1: return
+            points[lo:hi] = sorted(points[lo:hi], key=lambda p: p[axis])
+            mid = (lo + hi) // 2
+            build(lo, mid, (axis + 1) % 3)
+            build(mid + 1, hi, (axis + 1) % 3)
+
+        build(0, len(points), 0)
+        self.tree = points
+
+    def nearest(self, latitude, longitude, limit=5, max_km=None):
+        """The `limit` stations closest to a point, nearest first, each with
+        distance_km; only those within max_km, if given."""
+        limit = max(1, min(limit, MAX_RESULTS))
+        target = unit_vector(latitude, longitude)
+        tree = self.tree
+        heap = [] # (-chord², station): the worst of the best `limit` on top
+        bound = [math.inf if max_km is None else (2 * math.sin(min(max_km / EARTH_RADIUS_KM, math.pi) / 2)) ** 2]
+
+        def search(lo, hi, axis):
+            if lo >= hi: return
+            mid = (lo + hi) // 2
+            point = tree[mid]
+            d2 = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2 + (point[2] - target[2]) ** 2
+            if d2 <= bound[0]:
+                heapq.heappush(heap, (-d2, point[3]))
+                if len(heap) > limit: heapq.heappop(heap)
+                if len(heap) == limit: bound[0] = min(bound[0], -heap[0][0])
+            diff = target[axis] - point[axis]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            search(*near, (axis + 1) % 3)
+            if diff * diff <= bound[0]: search(*far, (axis + 1) % 3)
+
+        search(0, len(tree), 0)
+        return [dict(self.stations[i], distance_km=round(chord_to_km(-neg_d2), 3))
+                for neg_d2, i in sorted(heap, reverse=True)]